@@ -0,0 +1,135 @@
+"""
+Benchmarks of the hot paths of the solver over problem sizes from 10**3 to
+10**6 points: eigensolver, normalization, expectation values, interpolation,
+reading the input file, writing the output and reading it for plotting. The
+potentials are taken from the application examples.
+"""
+
+import os.path
+import numpy as np
+import pytest
+from modules import grid, in_and_out, interpolator, plot, potentials, solver
+
+_EXAMPLES = os.path.join(os.path.dirname(__file__), '..',
+                         'application_examples')
+NPOINTS = (10**3, 10**4, 10**5, 10**6)
+STATES = (5, 20)
+
+
+def _example(name, npoint):
+    """Parameters and grid of an application example with npoint points."""
+    parameter = in_and_out.read_inp(os.path.join(_EXAMPLES, name))
+    disc = grid.Grid(parameter['xMin'], parameter['xMax'], npoint,
+                     potentials.potential(parameter))
+    return parameter, disc
+
+
+def _wavefunctions(npoint, states):
+    """Reproducible wavefunctions of the given size."""
+    return np.random.default_rng(0).standard_normal((npoint, states))
+
+
+@pytest.mark.parametrize("states", STATES)
+@pytest.mark.parametrize("npoint", NPOINTS)
+@pytest.mark.parametrize("example", ["harmonic_potential_well",
+                                     "asym_potential_well"])
+def test_solv(bench, example, npoint, states):
+    """Eigensolver with the automatic choice of the method."""
+    parameter, disc = _example(example, npoint)
+    bench(solver.solv, disc, parameter['mass'], 1, states)
+
+
+@pytest.mark.parametrize("npoint", NPOINTS)
+def test_solv_sliced(bench, npoint):
+    """Spectrum slicing of many states on the double well."""
+    parameter, disc = _example("double_linear", npoint)
+    bench(solver.solv, disc, parameter['mass'], 1, 400, "sliced",
+          symmetric=False)
+
+
+@pytest.mark.parametrize("states", STATES)
+@pytest.mark.parametrize("npoint", NPOINTS)
+def test_norm(bench, npoint, states):
+    """Normalization of the wavefunctions."""
+    disc = _example("harmonic_potential_well", npoint)[1]
+    bench(solver.norm, _wavefunctions(npoint, states), disc)
+
+
+@pytest.mark.parametrize("states", STATES)
+@pytest.mark.parametrize("npoint", NPOINTS)
+def test_exp_val(bench, npoint, states):
+    """Expectation values and uncertainties of the position."""
+    disc = _example("harmonic_potential_well", npoint)[1]
+    w_func = solver.norm(_wavefunctions(npoint, states), disc)
+    bench(solver.exp_val, w_func, disc)
+
+
+@pytest.mark.parametrize("npoint", NPOINTS)
+@pytest.mark.parametrize("method", interpolator.METHODS)
+def test_interpolator(bench, method, npoint):
+    """Construction and evaluation of the interpolated potential."""
+    parameter = in_and_out.read_inp(os.path.join(_EXAMPLES,
+                                                 "double_cubic_spline"))
+    x_sup, y_sup = parameter['x_decl'], parameter['y_decl']
+    if method == "chebyshev":
+        spline = interpolator.interpolator(x_sup, y_sup, "cspline")
+        x_sup = interpolator.chebyshev_nodes(x_sup[0], x_sup[-1], 50)
+        y_sup = spline(x_sup)
+    x_points = np.linspace(parameter['xMin'], parameter['xMax'], npoint)
+
+    def interpolate():
+        return interpolator.interpolator(x_sup, y_sup, method)(x_points)
+
+    bench(interpolate)
+
+
+@pytest.mark.parametrize("example", sorted(os.listdir(_EXAMPLES)))
+def test_read_inp(bench, example):
+    """Reading the input files of the application examples."""
+    bench(in_and_out.read_inp, os.path.join(_EXAMPLES, example))
+
+
+@pytest.mark.parametrize("npoint", NPOINTS)
+@pytest.mark.parametrize("table", ["inline", "npy"])
+def test_read_inp_table(bench, tmp_path, table, npoint):
+    """Reading input files with large tables of xy declarations."""
+    x_sup = np.linspace(-5.0, 5.0, npoint)
+    decl = np.column_stack((x_sup, 0.5 * x_sup**2))
+    header = "1.0\n-5.0 5.0 1999\n1 5\nlinear\n"
+    with open(str(tmp_path / "schrodinger.inp"), "w") as fp:
+        if table == "npy":
+            np.save(str(tmp_path / "potential.npy"), decl)
+            fp.write(header + "potential.npy\n")
+        else:
+            fp.write(header + "{}\n".format(npoint))
+            np.savetxt(fp, decl)
+    bench(in_and_out.read_inp, str(tmp_path))
+
+
+@pytest.mark.parametrize("npoint", NPOINTS)
+@pytest.mark.parametrize("fmt", in_and_out.FORMATS)
+def test_output_storage(bench, tmp_path, fmt, npoint):
+    """Writing all output files (as output_storage in the given format)."""
+    disc = _example("harmonic_potential_well", npoint)[1]
+    energy = np.arange(STATES[0], dtype=float)
+    w_func = solver.norm(_wavefunctions(npoint, STATES[0]), disc)
+    exp_x, unc_x = solver.exp_val(w_func, disc)
+
+    def store():
+        data = in_and_out.output_data(disc, energy, w_func, exp_x, unc_x)
+        in_and_out.data_storage(data, str(tmp_path), fmt)
+
+    bench(store)
+
+
+@pytest.mark.parametrize("npoint", NPOINTS)
+@pytest.mark.parametrize("fmt", in_and_out.FORMATS)
+def test_readplotdata(bench, tmp_path, fmt, npoint):
+    """Reading the output files for plotting."""
+    x_points = np.linspace(-5.0, 5.0, npoint)
+    data = {"x_points": x_points, "v_points": 0.5 * x_points**2,
+            "energy": np.arange(STATES[0], dtype=float),
+            "w_func": _wavefunctions(npoint, STATES[0]),
+            "exp_x": np.zeros(STATES[0]), "unc_x": np.ones(STATES[0])}
+    in_and_out.data_storage(data, str(tmp_path), fmt)
+    bench(plot.readplotdata, str(tmp_path))
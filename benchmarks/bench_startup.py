@@ -0,0 +1,34 @@
+"""
+Benchmarks of the startup time of the command line programs: a run of
+main_solver on a small application example is dominated by importing the
+modules, so its wall time guards against imports of unused heavy modules.
+"""
+
+import os.path
+import subprocess
+import sys
+import pytest
+
+_ROOT = os.path.join(os.path.dirname(__file__), '..')
+_EXAMPLES = os.path.join(_ROOT, 'application_examples')
+
+
+def _run(*args):
+    """Runs a Python process in the root directory of the project."""
+    subprocess.run((sys.executable,) + args, cwd=_ROOT, check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+@pytest.mark.parametrize("module", ["modules", "modules.solver",
+                                    "modules.in_and_out", "modules.plot"])
+def test_import(bench, module):
+    """Importing the package and its heaviest modules."""
+    bench(_run, "-c", "import " + module)
+
+
+@pytest.mark.parametrize("example", ["double_linear",
+                                     "harmonic_potential_well"])
+def test_main_solver(bench, tmp_path, example):
+    """Complete run of main_solver on a small application example."""
+    bench(_run, "main_solver", "-i", os.path.join(_EXAMPLES, example), "-o",
+          str(tmp_path))
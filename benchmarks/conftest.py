@@ -0,0 +1,152 @@
+"""
+Fixtures of the benchmark suite: timing of the benchmarks, comparison with
+the stored baselines and the summary of all timings.
+
+Run from the root directory of the project:
+
+    python3 -m pytest benchmarks [--save-baseline] [--max-slowdown 1.5]
+"""
+
+import json
+import os.path
+import platform
+import sys
+import time
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# shortest duration of a round, fast functions are called several times per
+# round, so the timings are not dominated by the resolution of the clock
+_MIN_ROUND_TIME = 0.05
+
+# best wall time of every benchmark of this session
+_TIMINGS = {}
+
+
+def pytest_addoption(parser):
+    """Options of the benchmark suite."""
+    group = parser.getgroup("benchmark")
+    group.addoption("--baseline", default=_BASELINE,
+                    help="File of the baseline timings (default: "
+                    "benchmarks/baseline.json)")
+    group.addoption("--save-baseline", action="store_true",
+                    help="Store the timings of this run as baseline")
+    group.addoption("--max-slowdown", type=float, default=1.5,
+                    help="Fail a benchmark, which is slower than this "
+                    "factor times its baseline (default: 1.5)")
+    group.addoption("--rounds", type=int, default=3,
+                    help="Number of repetitions, the best one counts "
+                    "(default: 3)")
+    group.addoption("--max-points", type=int, default=10**6,
+                    help="Skip the problem sizes with more points "
+                    "(default: 1000000)")
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skips the benchmarks above the size limit."""
+    limit = config.getoption("max_points")
+    skip = pytest.mark.skip(reason="more than {} points".format(limit))
+    for item in items:
+        callspec = getattr(item, "callspec", None)
+        if callspec is not None and callspec.params.get("npoint", 0) > limit:
+            item.add_marker(skip)
+
+
+def pytest_sessionstart(session):
+    """Stops the suite, if there is no baseline to compare with."""
+    config = session.config
+    path = config.getoption("baseline")
+    if not config.getoption("save_baseline") and not os.path.isfile(path):
+        raise pytest.UsageError("No baseline timings in {}, store them first "
+                                "with --save-baseline.".format(path))
+
+
+def _read_baseline(path):
+    """Baseline timings of all benchmarks."""
+    try:
+        with open(path) as fp:
+            return json.load(fp)["timings"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+@pytest.fixture(scope="session")
+def baseline(request):
+    """Baseline timings of all benchmarks, empty if none are stored."""
+    return _read_baseline(request.config.getoption("baseline"))
+
+
+@pytest.fixture
+def bench(request, baseline):
+    """
+    Times a function. The function is called repeatedly, the best wall time
+    per call is compared with the baseline of the benchmark and the
+    benchmark fails, if it is slower than the allowed factor. A benchmark
+    without baseline is skipped after the timing. Returns the result of the
+    last call.
+    """
+    config = request.config
+
+    def run(func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        times = [time.perf_counter() - start]
+        number = max(1, int(_MIN_ROUND_TIME / max(times[0], 1e-9)))
+        for _ in range(max(1, config.getoption("rounds")) - 1):
+            start = time.perf_counter()
+            for _ in range(number):
+                result = func(*args, **kwargs)
+            times.append((time.perf_counter() - start) / number)
+        best = min(times)
+        _TIMINGS[request.node.nodeid] = best
+        if config.getoption("save_baseline"):
+            return result
+        reference = baseline.get(request.node.nodeid)
+        if reference is None:
+            pytest.skip("no baseline timing, store it with --save-baseline")
+        limit = config.getoption("max_slowdown")
+        if best > limit * reference:
+            pytest.fail("{:.3g} s is {:.2f} times the baseline of {:.3g} s "
+                        "(limit {})".format(best, best / reference, reference,
+                                            limit))
+        return result
+
+    return run
+
+
+def pytest_sessionfinish(session):
+    """Stores the timings as baseline, if requested."""
+    config = session.config
+    if not config.getoption("save_baseline") or not _TIMINGS:
+        return
+    path = config.getoption("baseline")
+    timings = _read_baseline(path)
+    timings.update(_TIMINGS)
+    with open(path, "w") as fp:
+        json.dump({"machine": {"node": platform.node(),
+                               "processor": platform.processor(),
+                               "python": platform.python_version()},
+                   "timings": timings}, fp, indent=1, sort_keys=True)
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    """Prints the timings and their ratio to the baseline."""
+    if not _TIMINGS:
+        return
+    baseline = _read_baseline(config.getoption("baseline"))
+    terminalreporter.section("benchmark timings")
+    width = max(len(name) for name in _TIMINGS)
+    terminalreporter.write_line("{:<{}} {:>10} {:>10} {:>7}".format(
+        "benchmark", width, "best/s", "baseline/s", "ratio"))
+    for name, best in sorted(_TIMINGS.items()):
+        reference = baseline.get(name)
+        if reference is None or config.getoption("save_baseline"):
+            terminalreporter.write_line("{:<{}} {:>10.3e}".format(
+                name, width, best))
+        else:
+            terminalreporter.write_line("{:<{}} {:>10.3e} {:>10.3e} {:>7.2f}"
+                                        .format(name, width, best, reference,
+                                                best / reference))
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark comparing the construction and evaluation cost of the
+interpolation methods against the number of support points. The Runge
+function 1/(1 + 25 x**2) is tabulated on Chebyshev points (for the
+polynomial methods) and on equidistant points (for the piecewise methods),
+interpolated and evaluated on a grid of 1999 points. The wall times and the
+maximal interpolation error are printed and plotted for every method.
+
+The monomial form of scipy.interpolate.lagrange is included for comparison
+up to 40 support points, beyond it is numerically useless.
+
+Run from the root directory of the project:
+
+    python3 benchmarks/interpolation_cost.py [-o interpolation.pdf]
+"""
+
+import argparse
+import os.path
+import sys
+import time
+import numpy as np
+import matplotlib.pyplot as plt
+from scipy.interpolate import lagrange
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from modules import interpolator  # noqa: E402
+
+_DESCRIPTION = "Construction and evaluation cost of the interpolation methods."
+_NSUPPORTS = (10, 20, 40, 100, 300, 1000, 3000, 10000)
+_NPOINT = 1999
+_REPEAT = 3
+_MAX_LAGRANGE = 40
+_POLYNOMIAL = ("barycentric", "chebyshev")
+_METHODS = ("lagrange",) + _POLYNOMIAL + ("linear", "cspline", "pchip",
+                                          "akima")
+
+
+def _runge(x_points):
+    """Test function with a pole close to the interval."""
+    return 1 / (1 + 25 * x_points**2)
+
+
+def benchmark(method):
+    """
+    Interpolates the test function for all numbers of support points.
+
+    Args:
+        method (string): interpolation method, "lagrange" for the monomial
+        form of scipy.
+
+    Returns:
+        nsupport (1d-array): numbers of support points
+        build (1d-array): best wall time of the construction
+        evaluate (1d-array): best wall time of the evaluation
+        error (1d-array): maximal absolute interpolation error
+    """
+    x_points = np.linspace(-1.0, 1.0, _NPOINT)
+    nsupport = np.array([nn for nn in _NSUPPORTS
+                         if method != "lagrange" or nn <= _MAX_LAGRANGE])
+    build = np.zeros(len(nsupport))
+    evaluate = np.zeros(len(nsupport))
+    error = np.zeros(len(nsupport))
+    for ii, number in enumerate(nsupport):
+        if method == "lagrange" or method in _POLYNOMIAL:
+            x_sup = interpolator.chebyshev_nodes(-1.0, 1.0, number)
+        else:
+            x_sup = np.linspace(-1.0, 1.0, number)
+        y_sup = _runge(x_sup)
+        build_times, eval_times = [], []
+        for _ in range(_REPEAT):
+            start = time.perf_counter()
+            if method == "lagrange":
+                intfunc = lagrange(x_sup, y_sup)
+            else:
+                intfunc = interpolator.interpolator(x_sup, y_sup, method)
+            build_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            values = intfunc(x_points)
+            eval_times.append(time.perf_counter() - start)
+        build[ii] = min(build_times)
+        evaluate[ii] = min(eval_times)
+        error[ii] = np.amax(np.abs(values - _runge(x_points)))
+    return nsupport, build, evaluate, error
+
+
+def main():
+    """Main function of the interpolation benchmark."""
+
+    parser = argparse.ArgumentParser(description=_DESCRIPTION)
+    msg = 'Save the plot into this file instead of showing it'
+    parser.add_argument('-o', '--output', type=str, default=None, help=msg)
+    args = parser.parse_args()
+
+    plt.figure(figsize=(15, 4.5))
+    header = ("method", "n", "build/s", "evaluate/s", "error")
+    print("{:>11} {:>6} {:>10} {:>10} {:>10}".format(*header))
+    for method in _METHODS:
+        nsupport, build, evaluate, error = benchmark(method)
+        for row in zip(nsupport, build, evaluate, error):
+            print("{:>11} {:>6} {:>10.2e} {:>10.2e} {:>10.2e}"
+                  .format(method, *row))
+        for ip, values in enumerate((build, evaluate, error)):
+            plt.subplot(1, 3, ip + 1)
+            plt.loglog(nsupport, values, "o-", label=method)
+
+    labels = ("construction [s]", "evaluation [s]", "max. error")
+    for ip, label in enumerate(labels):
+        plt.subplot(1, 3, ip + 1)
+        plt.xlabel("support points", fontsize=12)
+        plt.ylabel(label, fontsize=12)
+    plt.legend()
+    plt.tight_layout()
+    if args.output is None:
+        plt.show()
+    else:
+        plt.savefig(args.output)
+
+
+if __name__ == '__main__':
+    main()
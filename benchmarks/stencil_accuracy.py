@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark comparing the accuracy of the kinetic energy stencils against the
+wall time of the solver. The harmonic oscillator and the infinite potential
+well of the application examples are solved on grids of increasing size and
+the maximal error of the eigenvalues with respect to the analytic values is
+plotted against the wall time for every stencil.
+
+Run from the root directory of the project:
+
+    python3 benchmarks/stencil_accuracy.py [-o accuracy.pdf]
+"""
+
+import argparse
+import os.path
+import sys
+import time
+import numpy as np
+import matplotlib.pyplot as plt
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from modules import grid, in_and_out, interpolator, solver  # noqa: E402
+
+_DESCRIPTION = "Accuracy against wall time of the kinetic energy stencils."
+_EXAMPLES = os.path.join(os.path.dirname(__file__), '..', 'application_examples')
+_NPOINTS = (51, 101, 201, 401, 801, 1601, 3201)
+_REPEAT = 3
+
+
+def _harmonic(npoint):
+    """Grid, mass and analytic eigenvalues of the harmonic oscillator."""
+    parameter = in_and_out.read_inp(os.path.join(_EXAMPLES,
+                                                 'harmonic_potential_well'))
+    int_pot = interpolator.interpolator(parameter['x_decl'],
+                                        parameter['y_decl'],
+                                        parameter['interpol_method'])
+    disc = grid.Grid(parameter['xMin'], parameter['xMax'], npoint, int_pot)
+    omega = 1 / np.sqrt(parameter['mass'])
+    ref = omega * (np.arange(parameter['last']) + 0.5)
+    return disc, parameter['mass'], ref
+
+
+def _infinite(npoint):
+    """Grid, mass and analytic eigenvalues of the infinite potential well."""
+    parameter = in_and_out.read_inp(os.path.join(_EXAMPLES,
+                                                 'infinite_potential_well'))
+    int_pot = interpolator.interpolator(parameter['x_decl'],
+                                        parameter['y_decl'],
+                                        parameter['interpol_method'])
+    disc = grid.Grid(parameter['xMin'], parameter['xMax'], npoint, int_pot)
+    # the hard walls are located one grid spacing outside of the grid
+    length = parameter['xMax'] - parameter['xMin'] + 2 * disc.delta
+    nn = np.arange(1, parameter['last'] + 1)
+    ref = (nn * np.pi)**2 / (2 * parameter['mass'] * length**2)
+    return disc, parameter['mass'], ref
+
+
+def benchmark(problem, stencil):
+    """
+    Solves the problem for all grid sizes with the given stencil.
+
+    Args:
+        problem (function): returns grid, mass and reference eigenvalues for
+        a given number of points.
+        stencil (string): kinetic energy stencil.
+
+    Returns:
+        walltime (1d-array): best wall time of the solver for every grid size
+        error (1d-array): maximal absolute error of the eigenvalues
+    """
+    walltime = np.zeros(len(_NPOINTS))
+    error = np.zeros(len(_NPOINTS))
+    for ii, npoint in enumerate(_NPOINTS):
+        disc, mass, ref = problem(npoint)
+        times = []
+        for _ in range(_REPEAT):
+            start = time.perf_counter()
+            energy = solver.solv(disc, mass, 1, len(ref), stencil=stencil)[0]
+            times.append(time.perf_counter() - start)
+        walltime[ii] = min(times)
+        error[ii] = np.amax(np.abs(energy - ref))
+    return walltime, error
+
+
+def main():
+    """Main function of the stencil benchmark."""
+
+    parser = argparse.ArgumentParser(description=_DESCRIPTION)
+    msg = 'Save the plot into this file instead of showing it'
+    parser.add_argument('-o', '--output', type=str, default=None, help=msg)
+    args = parser.parse_args()
+
+    problems = (("harmonic oscillator", _harmonic),
+                ("infinite potential well", _infinite))
+    plt.figure(figsize=(10, 4.5))
+    for ip, (title, problem) in enumerate(problems):
+        plt.subplot(1, 2, ip + 1)
+        print(title)
+        header = ("stencil", "nPoint", "wall time/s", "error")
+        print("{:>8} {:>6} {:>12} {:>10}".format(*header))
+        for stencil in solver.STENCILS:
+            walltime, error = benchmark(problem, stencil)
+            for npoint, wtime, err in zip(_NPOINTS, walltime, error):
+                row = (stencil, npoint, wtime, err)
+                print("{:>8} {:>6} {:>12.2e} {:>10.2e}".format(*row))
+            plt.loglog(walltime, error, "o-", label=stencil)
+        plt.title(title, fontsize=14)
+        plt.xlabel("wall time [s]", fontsize=12)
+        plt.ylabel("max. error [Hartree]", fontsize=12)
+        plt.legend()
+
+    plt.tight_layout()
+    if args.output is None:
+        plt.show()
+    else:
+        plt.savefig(args.output)
+
+
+if __name__ == '__main__':
+    main()
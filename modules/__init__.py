@@ -1,4 +1,21 @@
-import modules.in_and_out as in_and_out
-import modules.interpolator as interpolator
-import modules.plot as plot
-import modules.solver as solver
+import importlib
+
+__version__ = "0.1"
+
+# submodules of the package, which are imported on first access (PEP 562),
+# so e.g. the solver does not import matplotlib through the plot module
+__all__ = ["bands", "cache", "continuation", "convergence", "grid",
+           "in_and_out", "interpolator", "observables", "options", "parallel",
+           "pipeline", "plot", "potentials", "profiling", "propagate",
+           "service", "solver", "sweep"]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module("modules." + name)
+    raise AttributeError("module 'modules' has no attribute '{}'"
+                         .format(name))
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -6,11 +6,12 @@ oscillator.
 
 import os.path
 import numpy as np
+from modules import potentials
 
 
 def _potential_inifinite_potwell():
     """Calcultes the potential for the infinite potential well"""
-    potential = np.zeros(1999)
+    potential = potentials.infinite_well(np.linspace(-2, 2, 1999))
     directory = './../application_examples/infinite_potential_well/'
     file = 'potential.ref'
     np.savetxt(os.path.join(directory, file), potential)
@@ -20,10 +21,7 @@ def _potential_inifinite_potwell():
 
 def _potential_fininite_potwell():
     """Calculates the potential for the finite potential well."""
-    pot_1 = np.zeros((750,), dtype=float)
-    pot_2 = -10 * np.ones((499,), dtype=float)
-    pot_3 = np.zeros((750, ), dtype=float)
-    potential = np.concatenate((pot_1, pot_2, pot_3), axis=0)
+    potential = potentials.finite_well(np.linspace(-2, 2, 1999), depth=10.0)
     directory = './../application_examples/finite_potential_well/'
     file = 'potential.ref'
     np.savetxt(os.path.join(directory, file), potential)
@@ -34,7 +32,7 @@ def _potential_fininite_potwell():
 def _potential_harmonic_potwell():
     """Calculates the potential for a harmonic oscillator."""
     x_points = np.linspace(-5, 5, 1999)
-    potential = 0.5 * x_points**2
+    potential = potentials.harmonic(x_points)
     directory = './../application_examples/harmonic_potential_well/'
     file = 'potential.ref'
     np.savetxt(os.path.join(directory, file), potential)
@@ -0,0 +1,128 @@
+"""
+Module containing the band structure of periodic potentials: the energies of
+the Bloch states are calculated for a mesh of wavevectors, whose batches are
+solved on a pool of worker processes.
+"""
+
+import copy
+import os
+import numpy as np
+from scipy import linalg
+from modules import grid, parallel, solver
+
+# number of batches of wavevectors per worker, so the workers stay busy
+# until the end of the mesh
+_BATCHES_PER_WORKER = 4
+
+
+def periodic_grid(xmin, xmax, npoint, potential):
+    """
+    Creates the grid of one period [xmin, xmax) of a periodic potential:
+    npoint equidistant points from xmin, the point xmax is the first point
+    of the next period.
+
+    Args:
+        xmin (float): begin of the period.
+        xmax (float): end of the period.
+        npoint (int): number of discretization points per period.
+        potential (function): interpolated function of one period.
+
+    Returns:
+        grid (Grid): discretization points and potential
+    """
+    delta = (xmax - xmin) / npoint
+    return grid.Grid(xmin, xmax - delta, npoint, potential)
+
+
+def k_mesh(period, nkpoint):
+    """
+    Creates an equidistant mesh of wavevectors from the center (k = 0) to the
+    boundary (k = pi/L) of the first Brillouin zone. The bands of a real
+    potential are symmetric, E(-k) = E(k), so this half of the zone holds
+    the whole band structure.
+
+    Args:
+        period (float): length of the period.
+        nkpoint (int): number of wavevectors.
+
+    Returns:
+        kpoints ((K,)array): wavevectors
+    """
+    return np.linspace(0.0, np.pi / period, nkpoint)
+
+
+def band_energies(disc, mass, k, first, last, stencil="fd2"):
+    """
+    Calculates the energies of the bands first to last at one wavevector.
+    Only the eigenvalues of the banded Bloch Hamiltonian are calculated (see
+    solver.bloch_bands), which costs O(N) per band after the reduction of
+    the band to tridiagonal form.
+
+    Args:
+        disc (Grid): discretization points and potential of one period.
+        mass (float): particle mass.
+        k (float): wavevector.
+        first (int): first band to calculate (counting from 1).
+        last (int): last band to calculate.
+        stencil (string): "fd2", "fd4" or "fd6".
+
+    Returns:
+        energy ((M,)array): energies of the bands
+    """
+    bands = solver.bloch_bands(disc, mass, k, stencil)[0]
+    a_band = np.zeros((len(bands), disc.npoint),
+                      dtype=np.result_type(*bands))
+    for kk, band in enumerate(bands):
+        a_band[kk, :disc.npoint - kk] = band
+    return linalg.eigvals_banded(a_band, lower=True, select='i',
+                                 select_range=(first - 1, last - 1))
+
+
+def _run_batch(task):
+    """Worker function, returns the band energies of a batch."""
+    disc, mass, kpoints, first, last, stencil = task
+    return np.array([band_energies(disc, mass, k, first, last, stencil)
+                     for k in kpoints])
+
+
+def band_structure(disc, mass, kpoints, first, last, stencil="fd2",
+                   workers=None, blas_threads=1):
+    """
+    Calculates the band structure over a mesh of wavevectors. The mesh is
+    split into batches, which are solved on a pool of worker processes,
+    started fresh (spawn) with the BLAS thread limit set in their
+    environment.
+
+    Args:
+        disc (Grid): discretization points and potential of one period (see
+        periodic_grid).
+        mass (float): particle mass.
+        kpoints ((K,)array): wavevectors (see k_mesh).
+        first (int): first band to calculate (counting from 1).
+        last (int): last band to calculate.
+        stencil (string): "fd2", "fd4" or "fd6".
+        workers (int): number of worker processes (default: number of cores),
+        a single worker solves all wavevectors in the calling process.
+        blas_threads (int): number of BLAS threads per worker.
+
+    Returns:
+        energy ((K, M)array): energies of the bands first to last for every
+        wavevector
+    """
+    kpoints = np.asarray(kpoints, dtype=float)
+    # the interpolated potential can not be sent to the workers
+    disc = copy.copy(disc)
+    disc.potential = None
+    if workers is None:
+        workers = os.cpu_count()
+    if workers == 1 or len(kpoints) <= 1:
+        return _run_batch((disc, mass, kpoints, first, last, stencil))
+
+    nbatch = min(len(kpoints), workers * _BATCHES_PER_WORKER)
+    tasks = [(disc, mass, batch, first, last, stencil)
+             for batch in np.array_split(kpoints, nbatch)]
+    with parallel.pool(min(workers, nbatch)) as pool:
+        # the workers are started on demand, while the tasks are submitted
+        with parallel.blas_threads(blas_threads):
+            results = pool.map(_run_batch, tasks)
+        return np.concatenate(list(results))
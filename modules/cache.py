@@ -0,0 +1,222 @@
+"""
+Module containing a content-addressed on-disk cache for the results of
+solver runs, shared by several processes.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+import modules
+
+try:
+    import fcntl
+except ImportError:  # no file locking available (Windows)
+    fcntl = None
+
+# default size limit of the cache in bytes
+MAX_BYTES = 512 * 2**20
+
+_SUFFIX = ".npz"
+_LOCK_FILE = "cache.lock"
+_STATS_FILE = "stats.json"
+
+
+def cache_key(parameter, options=None):
+    """
+    Calculates the key of a solver run: the SHA-256 hash of the parameters of
+    the input file, the options of the run and the version of the solver.
+    Floats enter with their exact value, so equal inputs always give the same
+    key and every change of the input gives a new one. Arrays, e.g. the
+    tables of the potential, are hashed by their type, shape and raw bytes.
+
+    Args:
+        parameter (dictionary): parameters of the input file (see
+        in_and_out.read_inp).
+        options (dictionary): further options of the run, which change the
+        results.
+
+    Returns:
+        key (string): hexadecimal hash of the run
+    """
+    arrays = []
+    content = {"parameter": _canonical(parameter, arrays),
+               "options": _canonical(options or {}, arrays),
+               "version": modules.__version__}
+    sha = hashlib.sha256(json.dumps(content, sort_keys=True).encode("utf-8"))
+    for array in arrays:
+        sha.update(np.ascontiguousarray(array).tobytes())
+    return sha.hexdigest()
+
+
+def _canonical(value, arrays):
+    """
+    Converts a value into a JSON representation with exact floats. Arrays
+    are replaced by their type and shape and appended to arrays, in the
+    order of the sorted dictionary keys.
+    """
+    if isinstance(value, dict):
+        return {str(name): _canonical(value[name], arrays)
+                for name in sorted(value, key=str)}
+    if isinstance(value, np.ndarray):
+        arrays.append(value)
+        return {"array": len(arrays) - 1, "dtype": value.dtype.str,
+                "shape": list(value.shape)}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item, arrays) for item in value]
+    if isinstance(value, (float, np.floating)):
+        return float(value).hex()
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+class Cache:
+    """
+    Cache of solver results in a directory, with one binary .npz file per
+    result named by its key (see cache_key). The total size is limited, the
+    least recently used results are removed first.
+
+    Several processes can share the directory: results are written to a
+    temporary file and renamed, so a result is either complete or missing,
+    and the bookkeeping is protected by a lock file. Hits and misses are
+    counted over all processes in the file stats.json.
+
+    Args:
+        directory (string): location of the cache, created if needed.
+        max_bytes (int): size limit of all results in bytes.
+
+    Attributes:
+        directory (string): location of the cache.
+        max_bytes (int): size limit of all results in bytes.
+    """
+
+    def __init__(self, directory, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    @contextlib.contextmanager
+    def _lock(self):
+        """Exclusive lock of the cache directory for all processes."""
+        with open(os.path.join(self.directory, _LOCK_FILE), "a") as fp:
+            if fcntl is not None:
+                fcntl.flock(fp, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fp, fcntl.LOCK_UN)
+
+    def get(self, key):
+        """
+        Looks up a result. A hit marks the result as recently used.
+
+        Args:
+            key (string): key of the run.
+
+        Returns:
+            data (dictionary): arrays of the result, None on a miss
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as archive:
+                data = {name: archive[name] for name in archive.files}
+            os.utime(path)
+        except (OSError, ValueError):
+            # missing, just evicted by another process or unreadable
+            data = None
+        self._count("hits" if data is not None else "misses")
+        return data
+
+    def put(self, key, data):
+        """
+        Stores a result and removes the least recently used results, until
+        the size limit is kept.
+
+        Args:
+            key (string): key of the run.
+            data (dictionary): arrays of the result.
+        """
+        handle, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(handle, "wb") as fp:
+                np.savez(fp, **data)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        with self._lock():
+            self._evict()
+
+    def _entries(self):
+        """Size and time of last use of all results, oldest first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(_SUFFIX):
+                try:
+                    info = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((info.st_mtime, info.st_size, name))
+        return sorted(entries)
+
+    def _evict(self):
+        """Removes the least recently used results above the size limit."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            with contextlib.suppress(OSError):
+                os.remove(os.path.join(self.directory, name))
+            total -= size
+
+    def _count(self, name):
+        """Increments a counter of the statistics file."""
+        path = os.path.join(self.directory, _STATS_FILE)
+        with self._lock():
+            counts = self._read_counts(path)
+            counts[name] += 1
+            with open(path, "w") as fp:
+                json.dump(counts, fp)
+
+    @staticmethod
+    def _read_counts(path):
+        try:
+            with open(path) as fp:
+                counts = json.load(fp)
+        except (OSError, ValueError):
+            counts = {}
+        return {"hits": counts.get("hits", 0),
+                "misses": counts.get("misses", 0)}
+
+    def stats(self):
+        """
+        Statistics of the cache.
+
+        Returns:
+            stats (dictionary): number of hits and misses over all processes,
+            number of stored results and their size in bytes
+        """
+        with self._lock():
+            counts = self._read_counts(os.path.join(self.directory,
+                                                    _STATS_FILE))
+            entries = self._entries()
+        counts["entries"] = len(entries)
+        counts["bytes"] = sum(size for _, size, _ in entries)
+        return counts
+
+    def clear(self):
+        """Removes all results and resets the statistics."""
+        with self._lock():
+            for _, _, name in self._entries():
+                with contextlib.suppress(OSError):
+                    os.remove(os.path.join(self.directory, name))
+            with contextlib.suppress(OSError):
+                os.remove(os.path.join(self.directory, _STATS_FILE))
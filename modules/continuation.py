@@ -0,0 +1,139 @@
+"""
+Module containing a warm-started continuation solver for scans of a slowly
+varying parameter, e.g. the barrier height of a potential or the mass.
+"""
+
+import numpy as np
+from scipy import linalg
+from scipy.optimize import linear_sum_assignment
+from modules import solver
+
+# number of additional states carried along as guard vectors, which keep the
+# convergence of the last requested state fast and allow following a state
+# across an avoided crossing with the states above
+_GUARD_STATES = 4
+
+# tolerance for the residual norms relative to the largest eigenvalue and
+# maximal number of iterations before falling back to a full diagonalization
+_TOLERANCE = 1e-6
+_MAX_ITER = 20
+
+
+def continuation(steps, first, last, stencil="fd2", tol=_TOLERANCE,
+                 maxiter=_MAX_ITER):
+    """
+    Solves a sequence of problems, which differ only slightly from step to
+    step. The first step is diagonalized by solver.solv, every following step
+    starts from the eigenpairs of the previous step, which are refined by a
+    block Rayleigh quotient iteration on the new Hamiltonian (a Davidson
+    iteration with exactly shifted preconditioner). A small step of the scan
+    converges within one or two iterations, each costing one banded solve per
+    state and a few sparse matrix products.
+
+    The states are tracked by the overlap of their eigenvectors with the
+    previous step, so every column keeps describing the same state, also
+    across avoided crossings, where the energetic order of the states
+    changes. Eigenvalues and eigenvectors are therefore returned in the order
+    of the first step, and the sign of every eigenvector follows the previous
+    step. All states from the lowest one to the last one are iterated.
+
+    Args:
+        steps (iterable): grid (Grid) and mass (float) of every step, all
+        grids with the same number of points.
+        first (int): first eigenvalue to calculate (counting from 1).
+        last (int): last eigenvalue to calculate.
+        stencil (string): kinetic energy stencil, one of "fd2", "fd4", "fd6".
+        tol (float): tolerance for the residual norms relative to the largest
+        eigenvalue.
+        maxiter (int): number of iterations, after which a step is solved by
+        solver.solv instead.
+
+    Yields:
+        eigen_val ((M,)array): eigenvalues of the tracked states first to last
+        eigen_vec ((N, M)array): corresponding eigenvectors, normalized like
+        the eigenvectors of solver.solv
+    """
+    if stencil == "numerov":
+        raise ValueError("The continuation is not available for the Numerov "
+                         "stencil.")
+    nstate = last + _GUARD_STATES
+    eigen_val, eigen_vec, order = None, None, np.arange(last)
+    for disc, mass in steps:
+        # the iteration works on the orthonormal eigenvectors of the
+        # symmetrized problem, which solv back transforms on non-uniform grids
+        sqrt_weights = np.sqrt(disc.weights)[:, np.newaxis]
+        if disc.uniform:
+            sqrt_weights = np.ones_like(sqrt_weights)
+        nstate = min(nstate, disc.npoint)
+        bands = solver.hamiltonian(disc, mass, stencil)
+        result = None
+        if eigen_vec is not None:
+            result = _refine(bands, eigen_val, eigen_vec, last, tol, maxiter)
+        if result is None:
+            result = solver.solv(disc, mass, 1, nstate, stencil=stencil)
+            result[1][...] *= sqrt_weights
+        new_val, new_vec = result
+
+        if eigen_vec is not None:
+            overlap = eigen_vec[:, order].T @ new_vec
+            rows, columns = linear_sum_assignment(-np.abs(overlap))
+            order = columns[np.argsort(rows)]
+            signs = np.sign(overlap[np.arange(last), order])
+            new_vec[:, order] *= np.where(signs == 0, 1.0, signs)
+        eigen_val, eigen_vec = new_val, new_vec
+
+        tracked = order[first - 1:]
+        yield eigen_val[tracked], eigen_vec[:, tracked] / sqrt_weights
+
+
+def _refine(bands, eigen_val, eigen_vec, nconv, tol, maxiter):
+    """
+    Refines approximate eigenpairs of a banded Hamiltonian by a block Rayleigh
+    quotient iteration. Every iteration adds the vectors
+    (H - theta_i)^-1 x_i to the current Ritz vectors x_i and extracts the new
+    Ritz pairs by the Rayleigh-Ritz procedure in this subspace.
+
+    Args:
+        bands (list): main diagonal ((N,)array) and lower diagonals
+        ((N-k,)array) of the symmetric Hamiltonian.
+        eigen_val ((M,)array): approximate eigenvalues.
+        eigen_vec ((N, M)array): approximate orthonormal eigenvectors.
+        nconv (int): number of the lowest states, which have to converge.
+        tol (float): tolerance for the residual norms relative to the largest
+        eigenvalue.
+        maxiter (int): maximal number of iterations.
+
+    Returns:
+        eigen_val ((M,)array): lowest eigenvalues of the subspace
+        eigen_vec ((N, M)array): corresponding eigenvectors
+        (None, if the iteration did not converge)
+    """
+    npoint, nstate = eigen_vec.shape
+    width = len(bands) - 1
+    hamiltonian = solver.band_matrix(bands, "csr")
+    # general band storage of H for the shifted solves
+    banded = np.zeros((2 * width + 1, npoint))
+    for kk, band in enumerate(bands):
+        banded[width - kk, kk:] = band
+        banded[width + kk, :npoint - kk] = band
+
+    for _ in range(maxiter):
+        shifted = np.empty_like(eigen_vec)
+        for ii in range(nstate):
+            banded[width] = bands[0] - eigen_val[ii]
+            shifted[:, ii] = linalg.solve_banded((width, width), banded,
+                                                 eigen_vec[:, ii],
+                                                 check_finite=False)
+        # the new vectors are almost parallel to the old ones, so the basis
+        # is orthonormalized by a Householder QR decomposition
+        basis = np.linalg.qr(np.hstack((eigen_vec, shifted)))[0]
+        h_basis = hamiltonian @ basis
+        ritz_val, ritz_vec = linalg.eigh(basis.T @ h_basis)
+        eigen_val = ritz_val[:nstate]
+        eigen_vec = basis @ ritz_vec[:, :nstate]
+        residual = h_basis @ ritz_vec[:, :nconv] - eigen_vec[:, :nconv] * \
+            eigen_val[:nconv]
+        scale = max(1.0, np.amax(np.abs(eigen_val[:nconv])))
+        if np.amax(np.linalg.norm(residual, axis=0)) < tol * scale:
+            return eigen_val, eigen_vec
+    return None
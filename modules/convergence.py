@@ -0,0 +1,94 @@
+"""
+Module containing an automatic grid convergence of the eigenvalues with
+Richardson extrapolation.
+"""
+
+import warnings
+import numpy as np
+from modules import grid, solver
+
+# order of the discretization error of the stencils
+ORDERS = {"fd2": 2, "fd4": 4, "fd6": 6, "numerov": 4}
+
+# smallest and largest number of discretization points used
+_START_POINTS = 101
+_MAX_POINTS = 2**20 + 1
+
+
+class ConvergenceWarning(UserWarning):
+    """Warning for a grid convergence stopped before reaching the tolerance."""
+
+
+def converge(xmin, xmax, mass, potential, first, last, tol, method="auto",
+             stencil="fd2", npoint=None, max_points=_MAX_POINTS):
+    """
+    Solves the problem on a sequence of grids with halved spacing until the
+    Richardson extrapolated eigenvalues change by less than the tolerance.
+    The interpolated potential is reused on every grid.
+
+    The hard walls are kept at xmin and xmax on every grid, so the points
+    are located at xmin + delta, ..., xmax - delta. A grid of the solver with
+    the points xmin, ..., xmax has its walls one spacing further out, which
+    changes the box on every refinement and limits the error to O(delta).
+
+    With the order p of the stencil, the eigenvalues E_k on the grid with
+    spacing delta_k are extrapolated by
+
+        E_extr = E_k + (E_k - E_k-1) / (2**p - 1),
+
+    and the change of E_extr between two refinements is taken as error
+    estimate. If max_points is reached before the tolerance, a
+    ConvergenceWarning is issued and the last estimates are returned.
+
+    Args:
+        xmin (float): position of the left wall.
+        xmax (float): position of the right wall.
+        mass (float): particle mass.
+        potential (function): interpolated function.
+        first (int): first eigenvalue to calculate (counting from 1).
+        last (int): last eigenvalue to calculate.
+        tol (float): tolerance for the error estimate of every eigenvalue.
+        method (string): eigensolver to use (see solver.solv).
+        stencil (string): kinetic energy stencil (see solver.solv).
+        npoint (int): number of points of the coarsest grid (default: enough
+        points for resolving the last state).
+        max_points (int): largest number of points to use.
+
+    Returns:
+        disc (Grid): finest grid used
+        eigen_val ((M,)array): eigenvalues on the finest grid
+        eigen_vec ((N, M)array): corresponding eigenvectors
+        extrapolated ((M,)array): extrapolated eigenvalues
+        error ((M,)array): error estimate of the extrapolated eigenvalues
+    """
+    if npoint is None:
+        npoint = max(_START_POINTS, 10 * last + 1)
+    factor = 2**ORDERS[stencil] - 1
+
+    previous = None
+    extrapolated = None
+    error = np.full(last - first + 1, np.inf)
+    while True:
+        delta = (xmax - xmin) / (npoint + 1)
+        disc = grid.Grid(xmin + delta, xmax - delta, npoint, potential)
+        eigen_val, eigen_vec = solver.solv(disc, mass, first, last, method,
+                                           stencil=stencil)
+        if previous is not None:
+            new_extrapolated = eigen_val + (eigen_val - previous) / factor
+            if extrapolated is not None:
+                error = np.abs(new_extrapolated - extrapolated)
+            extrapolated = new_extrapolated
+        if np.all(error < tol):
+            break
+        if 2 * npoint + 1 > max_points:
+            warnings.warn("The grid convergence stopped at {} points with an "
+                          "error estimate of {:.3g} above the tolerance {:.3g}."
+                          .format(npoint, np.max(error), tol),
+                          ConvergenceWarning, stacklevel=2)
+            break
+        previous = eigen_val
+        npoint = 2 * npoint + 1
+
+    if extrapolated is None:
+        extrapolated = eigen_val
+    return disc, eigen_val, eigen_vec, extrapolated, error
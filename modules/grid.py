@@ -0,0 +1,142 @@
+"""Module containing the discretization of the x-axis shared by all routines"""
+
+import numpy as np
+
+# number of points of the auxiliary grid for building a mapped grid per
+# point of the mapped grid, and its minimal size
+_MAP_OVERSAMPLING = 8
+_MAP_MIN_POINTS = 2001
+
+# width of the smoothing window of the point density, relative to the
+# length of the x-axis
+_MAP_SMOOTHING = 0.02
+
+# energy margin relative to the distance to the potential minimum and
+# minimal point density relative to the mean density of a mapped grid
+_MAP_MARGIN = 0.5
+_MAP_FLOOR = 0.2
+
+
+class Grid:
+    """
+    Discretization of the x-axis together with the potential sampled on it.
+    Coordinates, spacing, quadrature weights and potential values are
+    calculated once and used by the solver, the expectation values and the
+    output.
+
+    By default the grid is equidistant. Non-uniform grids are given by their
+    discretization points (see from_nodes and mapped). The hard walls of the
+    problem are located one spacing outside of the first and last point.
+
+    Args:
+        xmin (float): left value on x-axis.
+        xmax (float): right value on x-axis.
+        npoint (int): number of discretization points for x-axis.
+        potential (function): interpolated function, evaluated on all
+        discretization points in a single call.
+        x_points (1d-array): increasing discretization points from xmin to
+        xmax for a non-uniform grid.
+
+    Attributes:
+        xmin (float): left value on x-axis.
+        xmax (float): right value on x-axis.
+        npoint (int): number of discretization points for x-axis.
+        potential (function): interpolated function.
+        uniform (bool): True for an equidistant grid
+        x_points (1d-array): coordinates for discretization points
+        delta (float): distance between two discretization points (None for
+        non-uniform grids)
+        spacing (1d-array): distances between neighbouring points, including
+        the distances to the walls (N+1 values)
+        weights (1d-array): quadrature weights of the points
+        v_points (1d-array): potential at the discretization points
+    """
+
+    def __init__(self, xmin, xmax, npoint, potential, x_points=None):
+        self.xmin = xmin
+        self.xmax = xmax
+        self.npoint = npoint
+        self.potential = potential
+        if x_points is None:
+            self.uniform = True
+            self.x_points = np.linspace(xmin, xmax, npoint)
+            self.delta = np.abs(self.x_points[1] - self.x_points[0])
+            self.spacing = np.full(npoint + 1, self.delta)
+            self.weights = np.full(npoint, self.delta)
+        else:
+            self.uniform = False
+            self.x_points = np.asarray(x_points, dtype=float)
+            if (len(self.x_points) != npoint
+                    or np.any(np.diff(self.x_points) <= 0)):
+                raise ValueError("The points of a grid must be increasing.")
+            self.delta = None
+            inner = np.diff(self.x_points)
+            self.spacing = np.concatenate(([inner[0]], inner, [inner[-1]]))
+            self.weights = 0.5 * (self.spacing[:-1] + self.spacing[1:])
+        self.v_points = np.asarray(potential(self.x_points), dtype=float)
+
+
+def from_nodes(nodes, potential):
+    """
+    Creates a non-uniform grid from given discretization points.
+
+    Args:
+        nodes (1d-array): increasing discretization points.
+        potential (function): interpolated function.
+
+    Returns:
+        disc (Grid): non-uniform grid
+    """
+    nodes = np.asarray(nodes, dtype=float)
+    return Grid(nodes[0], nodes[-1], len(nodes), potential, nodes)
+
+
+def mapped(xmin, xmax, npoint, potential, mass, energy, strength=1.0):
+    """
+    Creates a non-uniform grid by a smooth coordinate mapping, which
+    concentrates the points where the wavefunctions oscillate fast and where
+    the curvature of the interpolated potential is large.
+
+    With the local wavenumber k(x) = sqrt(2m (E - V(x))) of the classically
+    allowed region up to the energy E, the point density is
+
+        rho(x) = k(x) + strength * (2m |V''(x)|)**(1/4) + floor,
+
+    smoothed over a few percent of the x-axis. The floor keeps a fifth of the
+    mean density in the classically forbidden regions. The points are placed
+    at equal steps of the integral of rho, so neighbouring spacings only
+    change slowly.
+
+    Args:
+        xmin (float): left value on x-axis.
+        xmax (float): right value on x-axis.
+        npoint (int): number of discretization points for x-axis.
+        potential (function): interpolated function.
+        mass (float): particle mass.
+        energy (float): highest energy of the states to resolve, a margin of
+        half the distance to the potential minimum is added.
+        strength (float): weight of the curvature in the point density.
+
+    Returns:
+        disc (Grid): non-uniform grid
+    """
+    naux = max(_MAP_OVERSAMPLING * npoint, _MAP_MIN_POINTS)
+    x_aux = np.linspace(xmin, xmax, naux)
+    v_aux = np.asarray(potential(x_aux), dtype=float)
+    energy = energy + _MAP_MARGIN * (energy - np.amin(v_aux))
+
+    wavenumber = np.sqrt(2 * mass * np.clip(energy - v_aux, 0.0, None))
+    curvature = np.abs(np.gradient(np.gradient(v_aux, x_aux), x_aux))
+    density = wavenumber + strength * (2 * mass * curvature)**0.25
+    density += _MAP_FLOOR * np.mean(density) + np.finfo(float).tiny
+    width = max(1, int(_MAP_SMOOTHING * naux))
+    density = np.convolve(np.pad(density, width, mode='edge'),
+                          np.ones(2 * width + 1) / (2 * width + 1), 'valid')
+
+    # inverting the normalized integral of the density
+    cumulative = np.concatenate(([0.0], np.cumsum(0.5 * (density[1:]
+                                                         + density[:-1]))))
+    cumulative /= cumulative[-1]
+    nodes = np.interp(np.linspace(0.0, 1.0, npoint), cumulative, x_aux)
+    nodes[0], nodes[-1] = xmin, xmax
+    return from_nodes(nodes, potential)
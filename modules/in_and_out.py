@@ -1,79 +1,719 @@
 """Module containing functions for reading input data and saving output data"""
 
-import os.path
-import sys
+import contextlib
+import json
+import os
+import struct
 import numpy as np
+from modules import interpolator, potentials
 
+# formats of the output files and their file name suffixes
+FORMATS = ('text', 'npy')
+_SUFFIXES = {'text': '.dat', 'npy': '.npy'}
 
-def read_inp(path):
+# size of the blocks of rows written at once to the output files
+_BLOCK_BYTES = 2**20
+
+# size of the header of the snapshot file, which is rewritten with the final
+# number of snapshots when the propagation ends
+_NPY_HEADER_BYTES = 128
+
+
+class InputError(ValueError):
+    """Error in the format or the content of an input file."""
+
+
+def read_inp(path, confined=False):
     """
     Reads an input file called "schrodinger.inp"
 
+    The xy declarations are given either as table of interpol_num lines
+    after the fifth line, or in a separate file, whose name replaces
+    interpol_num on the fifth line. A binary .npy file with an (n, 2) array is
+    memory-mapped, any other file is read as text table with two columns.
+    Relative file names refer to the directory of the input file.
+
+    With the interpolation type "expression" the fifth line contains a
+    closed-form potential instead, e.g. "0.5*x**2" or "morse(x, depth=10)"
+    (see potentials.compile_expression), and no xy declarations follow.
+
     Args:
         path (string): path to the input file.
+        confined (bool): accept only file names inside the directory of the
+        input file, i.e. no absolute paths and no "..", for input files from
+        untrusted sources.
 
     Returns:
         data (dictionary): all parameters from the input file. Parameters are:
         mass, xMin, xMax, nPoint, first, last, interpol_method, interpol_num,
-        x_decl and y_decl
+        x_decl, y_decl, expression (None for xy declarations) and the
+        optional keywords (see _read_options)
+
+    Raises:
+        InputError: if the input file can not be read or has not the correct
+        format.
     """
 
     data = {}
 
     try:
-        fp = open(os.path.join(path, 'schrodinger.inp'), 'r')
+        with open(os.path.join(path, 'schrodinger.inp'), 'r') as fp:
+            lines = fp.read().splitlines()
     except OSError:
-        print("Input file can not be read.")
-        print("Please check location and permission rights.")
-        sys.exit(1)
+        raise InputError("Input file can not be read. Please check location "
+                         "and permission rights.") from None
     try:
-        line = fp.readline()
-        data['mass'] = float(line.split()[0])
-        line = fp.readline()
-        data['xMin'] = float(line.split()[0])
-        data['xMax'] = float(line.split()[1])
-        data['nPoint'] = int(line.split()[2])
-        line = fp.readline()
-        data['first'] = int(line.split()[0])
-        data['last'] = int(line.split()[1])
-        line = fp.readline()
-        data['interpol_method'] = line.split()[0]
-        line = fp.readline()
-        data['interpol_num'] = int(line.split()[0])
-        lines = np.loadtxt(fp.readlines()[0:])
-        data['x_decl'] = lines[:, 0]
-        data['y_decl'] = lines[:, 1]
-        fp.close()
-    except IndexError:
-        print("schrodinger.inp do not have the correct format.")
-        print("Please check your input file.")
-        sys.exit(1)
+        data['mass'] = float(lines[0].split()[0])
+        data['xMin'] = float(lines[1].split()[0])
+        data['xMax'] = float(lines[1].split()[1])
+        data['nPoint'] = int(lines[1].split()[2])
+        data['first'] = int(lines[2].split()[0])
+        data['last'] = int(lines[2].split()[1])
+        data['interpol_method'] = lines[3].split()[0]
+        declaration = lines[4].split('#')[0].strip()
+        if not declaration:
+            raise ValueError
+    except (IndexError, ValueError):
+        raise InputError("schrodinger.inp do not have the correct format. "
+                         "Please check your input file.") from None
+
+    if (data['interpol_method'] != 'expression'
+            and data['interpol_method'] not in interpolator.METHODS):
+        raise InputError("Unknown interpolation method '{}', it has to be one "
+                         "of {} or expression."
+                         .format(data['interpol_method'],
+                                 ", ".join(interpolator.METHODS)))
+    data['expression'] = None
+    if data['interpol_method'] == 'expression':
+        try:
+            potentials.compile_expression(declaration)
+        except ValueError as error:
+            raise InputError(str(error)) from None
+        data['expression'] = declaration
+        decl = np.empty((0, 2))
+        options = lines[5:]
+    else:
+        declaration = declaration.split()[0]
+        try:
+            data['interpol_num'] = int(declaration)
+        except ValueError:
+            decl = _read_table(_input_path(path, declaration, confined))
+            options = lines[5:]
+        else:
+            decl, options = _read_declarations(lines[5:],
+                                               data['interpol_num'])
+    data['interpol_num'] = len(decl)
+    data['x_decl'] = decl[:, 0]
+    data['y_decl'] = decl[:, 1]
+
+    _read_options(options, data)
+    if data['grid'] is not None and data['grid'][0] == 'nodes':
+        nodes_path = _input_path(path, data['grid'][1], confined)
+        try:
+            nodes = np.loadtxt(nodes_path, ndmin=1)
+        except (OSError, ValueError) as error:
+            raise InputError("The grid nodes can not be read: {}"
+                             .format(error)) from None
+        data['grid'] = ('nodes', nodes)
     return data
 
 
-def output_storage(first, last, potential, energy, w_func, exp_x, unc_x, x_points, directory):
+def _input_path(path, name, confined):
+    """
+    Path of a file named in the input file, relative to its directory.
+
+    Args:
+        path (string): directory of the input file.
+        name (string): file name given in the input file.
+        confined (bool): reject names outside of the directory.
+
+    Returns:
+        path (string): path of the file
+    """
+
+    if confined and (os.path.isabs(name)
+                     or os.pardir in name.replace('\\', '/').split('/')):
+        raise InputError("The file {} is outside of the directory of the "
+                         "input file.".format(name))
+    return os.path.join(path, name)
+
+
+def _read_declarations(lines, number):
+    """
+    Splits the lines following the fifth line of the input file into the
+    table of xy declarations and the optional keyword lines. Comments and
+    blank lines are only searched for, if the table is not plain.
+
+    Args:
+        lines (list): lines after the fifth line of the input file.
+        number (int): number of xy declarations (interpol_num).
+
+    Returns:
+        decl ((number, 2)array): x and y values of the declarations
+        options (list): remaining lines with the optional keywords
+    """
+
+    if number < 2:
+        raise InputError("interpol_num has to be at least 2.")
+    table = lines[:number]
+    if len(table) == number and all(table) and '#' not in "".join(table):
+        return _parse_table(table, number), lines[number:]
+
+    table, options = [], []
+    for line in lines:
+        if not line.split('#')[0].strip():
+            continue
+        if len(table) < number:
+            table.append(line.split('#')[0])
+        else:
+            options.append(line)
+    return _parse_table(table, number), options
+
+
+def _parse_table(table, number):
+    """
+    Converts the lines of a table with two columns by a single call of the
+    compiled text parser of numpy.
+
+    Args:
+        table (list): lines of the table without comments.
+        number (int): expected number of rows.
+
+    Returns:
+        decl ((number, 2)array): x and y values of the declarations
+    """
+
+    try:
+        decl = np.loadtxt(table, ndmin=2)
+    except ValueError:
+        raise InputError("The xy declarations have to be two numbers per "
+                         "line.") from None
+    if decl.shape != (number, 2):
+        raise InputError("interpol_num is {}, but {} xy declarations are "
+                         "given.".format(number, len(decl)))
+    return decl
+
+
+def _read_table(path):
+    """
+    Reads the xy declarations from a separate file, a binary .npy file is
+    memory-mapped.
+
+    Args:
+        path (string): path of the file.
+
+    Returns:
+        decl ((n, 2)array): x and y values of the declarations
+    """
+
+    try:
+        if path.endswith('.npy'):
+            decl = np.load(path, mmap_mode='r')
+        else:
+            with open(path, 'r') as fp:
+                table = [line.split('#')[0] for line in fp.read().splitlines()
+                         if line.split('#')[0].strip()]
+            decl = _parse_table(table, len(table))
+    except InputError:
+        raise
+    except (OSError, ValueError):
+        raise InputError("The xy declarations {} can not be read."
+                         .format(path)) from None
+    if decl.ndim != 2 or decl.shape[1] != 2 or len(decl) < 2:
+        raise InputError("The xy declarations {} have to be a table of at "
+                         "least two rows with two columns.".format(path))
+    return decl
+
+
+def _read_options(lines, data):
+    """
+    Reads the optional keyword lines following the xy declarations of the
+    input file. Every line consists of a keyword and its value, e.g.:
+
+        solver sparse   # eigensolver (auto, dense, tridiagonal, sparse, sliced)
+        window -1.0 0.0 # all eigenvalues in [emin, emax) instead of first, last
+        stencil fd4     # kinetic energy stencil (fd2, fd4, fd6, numerov)
+        grid mapped 400 # non-uniform grid with 400 points, mapped to the
+                        # potential (nPoint is used for the output)
+        grid nodes x.dat  # non-uniform grid with the points in x.dat
+
+    Args:
+        lines (list): lines after the xy declarations.
+        data (dictionary): parameters of the input file, the options are added
+        with their default value, if not given.
+    """
+
+    data['solver'] = 'auto'
+    data['window'] = None
+    data['stencil'] = 'fd2'
+    data['grid'] = None
+    for line in lines:
+        words = line.split('#')[0].split()
+        if not words:
+            continue
+        try:
+            if words[0] == 'solver' and len(words) == 2:
+                data['solver'] = words[1]
+            elif words[0] == 'window' and len(words) == 3:
+                data['window'] = (float(words[1]), float(words[2]))
+            elif words[0] == 'stencil' and len(words) == 2:
+                data['stencil'] = words[1]
+            elif (words[0] == 'grid' and len(words) == 3
+                  and words[1] == 'mapped'):
+                data['grid'] = ('mapped', int(words[2]))
+            elif (words[0] == 'grid' and len(words) == 3
+                  and words[1] == 'nodes'):
+                data['grid'] = ('nodes', words[2])
+            elif _is_number(words[0]):
+                raise InputError("More xy declarations than interpol_num are "
+                                 "given: " + line.strip())
+            else:
+                raise InputError("Unknown option in schrodinger.inp: "
+                                 + line.strip())
+        except InputError:
+            raise
+        except ValueError:
+            raise InputError("Invalid value of option in schrodinger.inp: "
+                             + line.strip()) from None
+
+
+def _is_number(word):
+    """Checks if a word is a number."""
+    try:
+        float(word)
+    except ValueError:
+        return False
+    return True
+
+
+def output_data(grid, energy, w_func, exp_x, unc_x, npoint=None):
+    """
+    Collects the arrays of the output files. The wavefunctions of a
+    non-uniform grid are interpolated by cubic splines onto npoint
+    equidistant points, so the output files always have the uniform format.
+
+    Args:
+        grid (Grid): discretization points and potential.
+        energy (1d-array): calculated energy eigenvalues
+        w_func (array): normalized eigenfunctions
+        exp_x (array): expectation value of position operator
+        unc_x (1d-array): position uncertainty
+        npoint (int): number of output points for a non-uniform grid
+        (default: number of points of the grid)
+
+    Returns:
+        data (dictionary): arrays x_points, v_points, energy, w_func, exp_x
+        and unc_x
+    """
+
+    if grid.uniform:
+        x_points, v_points = grid.x_points, grid.v_points
+    else:
+        npoint = grid.npoint if npoint is None else npoint
+        x_points = np.linspace(grid.xmin, grid.xmax, npoint)
+        v_points = grid.potential(x_points)
+        # scipy.interpolate is slow to import and only needed here
+        from scipy.interpolate import CubicSpline
+        w_func = CubicSpline(grid.x_points, w_func, axis=0)(x_points)
+    return {'x_points': x_points, 'v_points': v_points, 'energy': energy,
+            'w_func': w_func, 'exp_x': exp_x, 'unc_x': unc_x}
+
+
+def data_storage(data, directory, fmt='text', dtype=np.float64, stride=1,
+                 npoint=None):
     """
     Stores potential, eigenvalues, eigenfunctions,
     expectationvalues, uncertainties into output files.
 
+    Both formats store the same tables: potential (x, V), energies,
+    wavefuncs (x followed by one column per state) and expvalues (<x>,
+    uncertainty). The text format writes them with np.savetxt into .dat
+    files, the binary format into .npy files, which can be memory-mapped by
+    read_output. Output files of the other format are removed, so a
+    directory never holds two different results.
+
+    The tables are written in blocks of rows directly from the given arrays,
+    so writing needs only little memory in addition to the wavefunctions.
+    The potential and the wavefunctions can be stored on a subset of the
+    points, either every stride-th point or npoint points evenly spread
+    over the grid (including the first and the last point).
+
     Args:
-        first (float): first eigenvalue to include
-        last (float): last eigenvalue to include
-        potential (1d-array): interpolated potential V(x)
-        energy (1d-array): energy eigenvalues
+        data (dictionary): arrays of the output files (see output_data).
+        directory (string): location for saving output file
+        fmt (string): output format, one of FORMATS.
+        dtype (dtype): floating point type of the stored values, e.g.
+        np.float32 for halving the size of the output.
+        stride (int): store every stride-th point only.
+        npoint (int): number of points to store (overrides stride).
+    """
+
+    if fmt not in FORMATS:
+        raise ValueError("Unknown output format '{}'.".format(fmt))
+    nall = len(data['x_points'])
+    if npoint is not None:
+        rows = np.unique(np.linspace(0, nall - 1, min(npoint, nall))
+                         .round().astype(int))
+    else:
+        rows = range(0, nall, stride)
+
+    tables = {'potential': ([data['x_points'], data['v_points']], rows),
+              'energies': ([data['energy']], None),
+              'wavefuncs': ([data['x_points'], data['w_func']], rows),
+              'expvalues': ([data['exp_x'], data['unc_x']], None)}
+    for name, (columns, table_rows) in tables.items():
+        path = os.path.join(directory, name + _SUFFIXES[fmt])
+        _write_table(path, fmt, columns, table_rows, np.dtype(dtype))
+        for other in set(FORMATS) - {fmt}:
+            stale = os.path.join(directory, name + _SUFFIXES[other])
+            if os.path.exists(stale):
+                os.remove(stale)
+
+
+def _write_table(path, fmt, columns, rows, dtype):
+    """
+    Writes a table in blocks of rows. The columns are 1d-arrays or 2d-arrays
+    of several columns, a single 1d-array is stored as 1d-array.
+
+    Args:
+        path (string): path of the output file.
+        fmt (string): output format, one of FORMATS.
+        columns (list): arrays with the columns of the table.
+        rows (range or 1d-array): indices of the stored rows (None for all
+        rows), a range is written from views of the arrays without copies.
+        dtype (dtype): floating point type of the stored values.
+    """
+
+    if rows is None:
+        rows = range(len(columns[0]))
+    ncol = sum(1 if np.ndim(column) == 1 else np.shape(column)[1]
+               for column in columns)
+    shape = (len(rows),) if len(columns) == 1 and np.ndim(columns[0]) == 1 \
+        else (len(rows), ncol)
+    block_rows = max(1, _BLOCK_BYTES // (ncol * dtype.itemsize))
+    digits = np.finfo(dtype).precision + 3
+
+    with open(path, 'wb') as fp:
+        if fmt == 'npy':
+            np.lib.format.write_array_header_1_0(
+                fp, {'descr': np.lib.format.dtype_to_descr(dtype),
+                     'fortran_order': False, 'shape': shape})
+        for start in range(0, len(rows), block_rows):
+            index = rows[start:start + block_rows]
+            nrow = len(index)
+            if isinstance(index, range):
+                index = slice(index.start, index.stop, index.step)
+            block = np.empty((nrow, ncol), dtype=dtype)
+            col = 0
+            for column in columns:
+                values = np.asarray(column)[index]
+                width = 1 if values.ndim == 1 else values.shape[1]
+                block[:, col:col + width] = values.reshape(nrow, width)
+                col += width
+            if fmt == 'npy':
+                fp.write(memoryview(block))
+            else:
+                np.savetxt(fp, block, fmt='%.{}e'.format(digits))
+
+
+def read_output(directory, mmap_mode='r'):
+    """
+    Reads the output files of a run in text or binary format. Binary files
+    are memory-mapped, so the wavefunctions are only read from disk when
+    they are accessed.
+
+    Args:
+        directory (string): location of the output files.
+        mmap_mode (string): memory-map mode of the binary files (see
+        np.load), None reads them completely.
+
+    Returns:
+        data (dictionary): arrays x_points, v_points, energy, w_func, exp_x
+        and unc_x (see output_data)
+    """
+
+    tables = {}
+    for name in ('potential', 'energies', 'wavefuncs', 'expvalues'):
+        path = os.path.join(directory, name + _SUFFIXES['npy'])
+        if os.path.exists(path):
+            tables[name] = np.load(path, mmap_mode=mmap_mode)
+        else:
+            path = os.path.join(directory, name + _SUFFIXES['text'])
+            tables[name] = np.loadtxt(path, ndmin=1 if name == 'energies'
+                                      else 2)
+    return {'x_points': tables['potential'][:, 0],
+            'v_points': tables['potential'][:, 1],
+            'energy': tables['energies'],
+            'w_func': tables['wavefuncs'][:, 1:],
+            'exp_x': tables['expvalues'][:, 0],
+            'unc_x': tables['expvalues'][:, 1]}
+
+
+def convert_output(directory, fmt, target=None):
+    """
+    Converts the output files of a run between text and binary format.
+
+    Args:
+        directory (string): location of the output files.
+        fmt (string): format to convert to, one of FORMATS.
+        target (string): location of the converted files, created if needed
+        (default: replace the files in directory).
+    """
+
+    target = directory if target is None else target
+    os.makedirs(target, exist_ok=True)
+    data = read_output(directory, mmap_mode='r')
+    if target == directory:
+        # the memory-mapped files are replaced
+        data = {name: np.array(value) for name, value in data.items()}
+    data_storage(data, target, fmt)
+
+
+def output_storage(grid, energy, w_func, exp_x, unc_x, directory,
+                   npoint=None):
+    """
+    Stores potential, eigenvalues, eigenfunctions,
+    expectationvalues, uncertainties into output files.
+
+    The wavefunctions of a non-uniform grid are interpolated by cubic splines
+    onto npoint equidistant points, so the output files always have the
+    uniform format.
+
+    Args:
+        grid (Grid): discretization points and potential.
+        energy (1d-array): calculated energy eigenvalues
         w_func (array): normalized eigenfunctions
         exp_x (array): expectation value of position operator
         unc_x (1d-array): position uncertainty
-        x_points (1d-array): coordinates for discretization points
         directory (string): location for saving output file
+        npoint (int): number of output points for a non-uniform grid
+        (default: number of points of the grid)
+    """
+
+    data_storage(output_data(grid, energy, w_func, exp_x, unc_x, npoint),
+                 directory)
+
+
+def states_storage(first, fingerprint, directory):
+    """
+    Stores the number of the first state and the fingerprint of the
+    Hamiltonian into the output file states.json, so the output can be
+    extended by further states later (see read_states).
+
+    Args:
+        first (int): index of the first eigenvalue.
+        fingerprint (string): fingerprint of the Hamiltonian (see
+        solver.fingerprint), None removes states.json, since the output can
+        not be extended.
+        directory (string): location for saving output file
+    """
+
+    path = os.path.join(directory, 'states.json')
+    if fingerprint is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    with open(path, 'w') as fp:
+        json.dump({'first': int(first), 'fingerprint': str(fingerprint)}, fp)
+
+
+def read_states(directory):
+    """
+    Reads the states of a previous run from its output files.
+
+    Args:
+        directory (string): location of the output files.
+
+    Returns:
+        x_points (1d-array): coordinates of the wavefunctions
+        previous (tuple): index of the first state, energies, wavefunctions
+        and fingerprint of the Hamiltonian (see solver.extend)
+        (None, if the directory holds no complete output)
+    """
+
+    try:
+        with open(os.path.join(directory, 'states.json'), 'r') as fp:
+            info = json.load(fp)
+        data = read_output(directory, mmap_mode=None)
+        # a truncated file or the file of an older version lacks entries
+        first, fingerprint = info['first'], info['fingerprint']
+    except (OSError, ValueError, KeyError):
+        return None
+    if data['w_func'].shape[1] != len(data['energy']):
+        return None
+    return data['x_points'], (first, data['energy'], data['w_func'],
+                              fingerprint)
+
+
+def convergence_storage(npoint, first, extrapolated, error, directory):
+    """
+    Stores the result of the grid convergence into the output file
+    convergence.dat.
+
+    Args:
+        npoint (int): number of discretization points of the chosen grid.
+        first (int): index of the first eigenvalue.
+        extrapolated (1d-array): extrapolated energy eigenvalues
+        error (1d-array): error estimate of the extrapolated eigenvalues
+        directory (string): location for saving output file
+    """
+
+    index = np.arange(first, first + len(extrapolated))
+    header = "nPoint = {}\nstate  extrapolated energy  error estimate".format(npoint)
+    np.savetxt(os.path.join(directory, 'convergence.dat'),
+               np.transpose(np.array([index, extrapolated, error])),
+               fmt=['%5d', '%.18e', '%.3e'], header=header)
+
+
+def read_sweep(path):
+    """
+    Reads a sweep file. Every line consists of a parameter name and the list
+    of its values, e.g.:
+
+        mass 1.0 2.0 4.0    # masses of the sweep
+        y_decl[1] -1 -2 -3  # values of the second support point
+
+    Args:
+        path (string): path of the sweep file.
+
+    Returns:
+        values (dictionary): list of values (strings) for every parameter
+    """
+
+    values = {}
+    with open(path, 'r') as fp:
+        for line in fp:
+            words = line.split('#')[0].split()
+            if words:
+                values[words[0]] = words[1:]
+    return values
+
+
+def sweep_storage(results, names, directory):
+    """
+    Stores the results of a parameter sweep into the output file sweep.dat.
+    Every result is written as soon as it is available, one line per state
+    with the number of the case, the varied parameters, the position of the
+    state in the output of the case (from 1), the energy, the expectation
+    value and the uncertainty of the position. Failed cases are recorded as
+    comment lines.
+
+    Args:
+        results (iterable): index, case, result and error of every case (see
+        sweep.sweep).
+        names (list): names of the varied parameters.
+        directory (string): location for saving output file
+
+    Returns:
+        failed (list): index and error message of every failed case
+    """
+
+    failed = []
+    header = ["case"] + list(names) + ["state", "energy", "exp_x", "unc_x"]
+    with open(os.path.join(directory, 'sweep.dat'), 'w') as fp:
+        fp.write("# " + " ".join(header) + "\n")
+        for index, case, result, error in results:
+            if error is not None:
+                failed.append((index, error))
+                fp.write("# case {} failed: {}\n".format(index, error))
+            else:
+                values = " ".join(str(case[name]) for name in names)
+                for state, row in enumerate(zip(*result)):
+                    fp.write("{} {} {} {:.18e} {:.18e} {:.18e}\n".format(
+                        index, values, state + 1, *row))
+            fp.flush()
+    return failed
+
+
+def bands_storage(kpoints, energy, directory, dtype=np.float64):
+    """
+    Stores a band structure into the binary table bands.npy, one row per
+    wavevector with the wavevector followed by the energies of the bands.
+
+    Args:
+        kpoints ((K,)array): wavevectors.
+        energy ((K, M)array): energies of the bands for every wavevector.
+        directory (string): location for saving output file
+        dtype (dtype): floating point type of the stored values, e.g.
+        np.float32 for halving the size of the table.
+    """
+
+    _write_table(os.path.join(directory, 'bands.npy'), 'npy',
+                 [kpoints, energy], None, np.dtype(dtype))
+
+
+def read_bands(directory, mmap_mode='r'):
     """
+    Reads a band structure stored by bands_storage.
+
+    Args:
+        directory (string): location of the output file.
+        mmap_mode (string): memory-map mode of the table (see np.load), None
+        reads it completely.
+
+    Returns:
+        kpoints ((K,)array): wavevectors
+        energy ((K, M)array): energies of the bands for every wavevector
+    """
+
+    table = np.load(os.path.join(directory, 'bands.npy'), mmap_mode=mmap_mode)
+    return table[:, 0], table[:, 1:]
+
+
+def propagation_storage(frames, grid, directory, snapshot_stride=1):
+    """
+    Stores a propagation in time frame by frame, so the trajectory is never
+    held in memory: potential.dat with the grid and the potential,
+    propagation.dat with time, norm, expectation value and uncertainty of
+    the position of every frame, and snapshots.npy with the wavefunction of
+    every snapshot_stride-th frame (one complex row per snapshot, starting
+    with the first frame).
+
+    Args:
+        frames (iterable): time and wavefunction of every frame (see
+        propagate.crank_nicolson and propagate.spectral).
+        grid (Grid): discretization points and potential.
+        directory (string): location for saving output file
+        snapshot_stride (int): store the wavefunction of every
+        snapshot_stride-th frame, 0 stores no wavefunctions.
+
+    Returns:
+        count (int): number of frames
+    """
+    from modules import propagate
+
+    _write_table(os.path.join(directory, 'potential.dat'), 'text',
+                 [grid.x_points, grid.v_points], None, np.dtype(np.float64))
+    snapshots = os.path.join(directory, 'snapshots.npy')
+    if os.path.exists(snapshots):
+        os.remove(snapshots)
+    dtype = np.dtype(np.complex128)
+    count = stored = 0
+    with contextlib.ExitStack() as stack:
+        fp = stack.enter_context(
+            open(os.path.join(directory, 'propagation.dat'), 'w'))
+        fp.write("# time norm exp_x unc_x\n")
+        if snapshot_stride:
+            snap = stack.enter_context(open(snapshots, 'wb'))
+            snap.write(_npy_header(dtype, (0, grid.npoint)))
+        for time, psi in frames:
+            fp.write("{:.18e} {:.18e} {:.18e} {:.18e}\n".format(
+                time, *propagate.moments(psi, grid)))
+            fp.flush()
+            if snapshot_stride and count % snapshot_stride == 0:
+                snap.write(memoryview(np.ascontiguousarray(psi, dtype=dtype)))
+                stored += 1
+            count += 1
+        if snapshot_stride:
+            # the number of snapshots is known at the end only
+            snap.seek(0)
+            snap.write(_npy_header(dtype, (stored, grid.npoint)))
+    return count
+
 
-    np.savetxt(os.path.join(directory, 'potential.dat'),
-               np.transpose(np.array([x_points, potential(x_points)])))
-    np.savetxt(os.path.join(directory, 'energies.dat'),
-               np.transpose(energy[first-1:last]))
-    x_points = np.reshape(x_points, (len(x_points), 1))
-    np.savetxt(os.path.join(directory, 'wavefuncs.dat'),
-               np.hstack((x_points, w_func)))
-    np.savetxt(os.path.join(directory, 'expvalues.dat'),
-               np.transpose(np.array([exp_x[first-1:last], unc_x[first-1:last]])))
+def _npy_header(dtype, shape):
+    """Header of a .npy file of fixed size (format version 1.0)."""
+    text = "{{'descr': {!r}, 'fortran_order': False, 'shape': {!r}, }}".format(
+        np.lib.format.dtype_to_descr(dtype), tuple(shape))
+    text = text.ljust(_NPY_HEADER_BYTES - 11) + "\n"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(text)) + text.encode()
@@ -1,30 +1,188 @@
 """Module interpolating mathematical functions out of support points"""
 
-from scipy.interpolate import interp1d, lagrange, CubicSpline
+import numpy as np
+
+# interpolation methods of the input file
+METHODS = ("linear", "polynomial", "barycentric", "chebyshev", "cspline",
+           "pchip", "akima")
+
+# number of matrix elements (points times support points) processed at once
+# by the barycentric formula, which limits the memory of the evaluation
+_BLOCK_SIZE = 2**20
+
+# relative tolerance of the positions of Chebyshev support points
+_NODE_RTOL = 1e-8
 
 
 def interpolator(x_sup, y_sup, method):
     """Interpolates a mathematical function from a given set of
-    points using either linear, polynomial or cubic spline for the
-    interpolation.
+    points using either linear, polynomial, piecewise cubic or cubic spline
+    for the interpolation.
+
+    The method "polynomial" builds the monomial form of the Lagrange
+    polynomial, which is only usable for a few support points. The methods
+    "barycentric" and "chebyshev" use the barycentric Lagrange formula
+    instead, which is evaluated in O(n) operations per point and is
+    numerically stable. For "barycentric" the weights of arbitrary support
+    points are calculated in O(n**2) operations. The method "chebyshev"
+    requires the support points to be Chebyshev points of the first or the
+    second kind (see chebyshev_nodes), whose weights are known in closed
+    form. Only on such points high polynomial degrees are well conditioned.
+
+    The piecewise cubic methods "pchip" and "akima" preserve the shape of the
+    support points and do not overshoot.
 
     Args:
         x_sup (list): x-coordinates of the function
         y_sup (list): y-coordinates of the function
-        method (string): name of the interpolation method to be used
+        method (string): name of the interpolation method to be used (see
+        METHODS)
 
     Returns:
         intfunc: interpolated function
     """
 
+    if method in ("polynomial", "cspline", "pchip", "akima"):
+        # imported on first use, it takes longer to import than most runs
+        from scipy import interpolate
+
     if method == "linear":
-        intfunc = interp1d(x_sup, y_sup, kind="linear")
+        intfunc = _linear(x_sup, y_sup)
         return intfunc
     elif method == "polynomial":
-        intfunc = lagrange(x_sup, y_sup)
+        intfunc = interpolate.lagrange(x_sup, y_sup)
+        return intfunc
+    elif method == "barycentric":
+        x_sup = np.asarray(x_sup, dtype=float)
+        intfunc = _barycentric(x_sup, y_sup, _weights(x_sup))
+        return intfunc
+    elif method == "chebyshev":
+        x_sup = np.asarray(x_sup, dtype=float)
+        intfunc = _barycentric(x_sup, y_sup, _chebyshev_weights(x_sup))
         return intfunc
     elif method == "cspline":
-        intfunc = CubicSpline(x_sup, y_sup, bc_type="natural")
+        intfunc = interpolate.CubicSpline(x_sup, y_sup, bc_type="natural")
+        return intfunc
+    elif method == "pchip":
+        intfunc = interpolate.PchipInterpolator(x_sup, y_sup)
+        return intfunc
+    elif method == "akima":
+        intfunc = interpolate.Akima1DInterpolator(x_sup, y_sup)
         return intfunc
 
     return None
+
+
+def chebyshev_nodes(xmin, xmax, number):
+    """
+    Calculates the Chebyshev points of the second kind, at which a function
+    has to be tabulated for the interpolation method "chebyshev".
+
+    Args:
+        xmin (float): left end of the interval.
+        xmax (float): right end of the interval.
+        number (int): number of points.
+
+    Returns:
+        nodes (1d-array): increasing points from xmin to xmax
+    """
+    angle = np.pi * np.arange(number) / (number - 1)
+    return xmin + 0.5 * (xmax - xmin) * (1 - np.cos(angle))
+
+
+def _linear(x_sup, y_sup):
+    """
+    Piecewise linear interpolation, which raises a ValueError outside of the
+    support points like scipy.interpolate.interp1d.
+    """
+    order = np.argsort(x_sup, kind="stable")
+    x_sup = np.asarray(x_sup, dtype=float)[order]
+    y_sup = np.asarray(y_sup, dtype=float)[order]
+
+    def intfunc(x_points):
+        x_points = np.asarray(x_points, dtype=float)
+        if np.any(x_points < x_sup[0]) or np.any(x_points > x_sup[-1]):
+            raise ValueError("A value is outside of the interpolation range "
+                             "[{}, {}].".format(x_sup[0], x_sup[-1]))
+        return np.interp(x_points, x_sup, y_sup)
+
+    return intfunc
+
+
+def _weights(x_sup):
+    """
+    Barycentric weights 1 / prod(x_j - x_k) of arbitrary support points. The
+    products are summed as logarithms of the differences scaled by the
+    capacity of the interval, so they neither overflow nor underflow.
+    """
+    if len(np.unique(x_sup)) != len(x_sup):
+        raise ValueError("The support points of a polynomial must differ.")
+    scale = 4 / (np.amax(x_sup) - np.amin(x_sup))
+    log_weights = np.empty(len(x_sup))
+    signs = np.empty(len(x_sup))
+    block = max(1, _BLOCK_SIZE // len(x_sup))
+    for start in range(0, len(x_sup), block):
+        rows = np.arange(start, min(start + block, len(x_sup)))
+        diff = (x_sup[rows, np.newaxis] - x_sup) * scale
+        diff[np.arange(len(rows)), rows] = 1.0
+        log_weights[rows] = -np.sum(np.log(np.abs(diff)), axis=1)
+        signs[rows] = 1 - 2 * (np.count_nonzero(diff < 0, axis=1) % 2)
+    return signs * np.exp(log_weights - np.amax(log_weights))
+
+
+def _chebyshev_weights(x_sup):
+    """
+    Barycentric weights of Chebyshev points of the first or second kind in
+    closed form, the support points may be increasing or decreasing.
+    """
+    number = len(x_sup)
+    order = np.argsort(x_sup)
+    x_sorted = x_sup[order]
+    tol = _NODE_RTOL * (x_sorted[-1] - x_sorted[0])
+    signs = (-1.0)**np.arange(number)
+
+    # second kind, the end points are included
+    if np.allclose(x_sorted, chebyshev_nodes(x_sorted[0], x_sorted[-1],
+                                             number), rtol=0, atol=tol):
+        weights = signs
+        weights[[0, -1]] *= 0.5
+    else:
+        # first kind, the end points are inside of the interval
+        angle = np.pi * (2 * np.arange(number) + 1) / (2 * number)
+        center = 0.5 * (x_sorted[0] + x_sorted[-1])
+        radius = 0.5 * (x_sorted[-1] - x_sorted[0]) / np.cos(angle[0])
+        if not np.allclose(x_sorted, center - radius * np.cos(angle), rtol=0,
+                           atol=tol):
+            raise ValueError("The support points of the method chebyshev "
+                             "must be Chebyshev points.")
+        weights = signs * np.sin(angle)
+    result = np.empty(number)
+    result[order] = weights
+    return result
+
+
+def _barycentric(x_sup, y_sup, weights):
+    """
+    Interpolating polynomial in the barycentric form
+    p(x) = sum(w_j y_j / (x - x_j)) / sum(w_j / (x - x_j)), evaluated
+    vectorized in blocks of points.
+    """
+    y_sup = np.asarray(y_sup, dtype=float)
+
+    def intfunc(x_points):
+        x_points = np.asarray(x_points, dtype=float)
+        flat = x_points.ravel()
+        values = np.empty(flat.shape)
+        block = max(1, _BLOCK_SIZE // len(x_sup))
+        for start in range(0, len(flat), block):
+            diff = flat[start:start + block, np.newaxis] - x_sup
+            rows, columns = np.nonzero(diff == 0)
+            diff[rows, columns] = 1.0
+            ratio = weights / diff
+            part = (ratio @ y_sup) / np.sum(ratio, axis=1)
+            # points coinciding with a support point
+            part[rows] = y_sup[columns]
+            values[start:start + block] = part
+        return values.reshape(x_points.shape)
+
+    return intfunc
@@ -0,0 +1,96 @@
+"""
+Module containing a batched engine for normalizing wavefunctions and
+calculating expectation values for all states at once.
+"""
+
+import numpy as np
+
+# observables which can be calculated by observables()
+OBSERVABLES = ("x", "x2", "sigma_x", "p2", "kinetic", "potential", "virial")
+
+
+def normalize(eigenvectors, grid):
+    """
+    Normalizes all eigenvectors in place, such that the integral over
+    abs(psi)**2 equals one for every state. Complex eigenvectors, e.g. the
+    Bloch states of solver.solv, are normalized the same way.
+
+    Args:
+        eigenvectors ((N, M)array): eigenvectors of the given qm problem,
+        overwritten with the normalized wavefunctions.
+        grid (Grid): discretization points and potential.
+
+    Returns:
+        w_func ((N, M)array): normalized wavefunctions (same array as
+        eigenvectors)
+    """
+    norm_sqr = np.einsum('i,ij,ij->j', grid.weights, _conj(eigenvectors),
+                         eigenvectors).real
+    eigenvectors /= np.sqrt(norm_sqr)
+    return eigenvectors
+
+
+def observables(w_func, grid, mass=None, which=OBSERVABLES):
+    r"""
+    Calculates expectation values of normalized wavefunctions. All position
+    and potential dependent observables are obtained from a single weighted
+    column reduction of the probability densities, the kinetic energy from
+    the three point stencil of the Hamiltonian. The integrals use the
+    quadrature weights of the grid.
+
+    The virial check is 2<T> - <x dV/dx>, which vanishes for bound states.
+
+    Args:
+        w_func ((N, M)array): normalized wavefunctions.
+        grid (Grid): discretization points and potential.
+        mass (float): particle mass, only needed for p2, kinetic and virial.
+        which (tuple): names of the observables to calculate, out of
+        OBSERVABLES.
+
+    Returns:
+        result (dictionary): (M,)array of expectation values for every name
+        in which
+    """
+    unknown = set(which) - set(OBSERVABLES)
+    if unknown:
+        raise ValueError("Unknown observables: {}".format(sorted(unknown)))
+    need_kin = bool({"p2", "kinetic", "virial"} & set(which))
+    if need_kin and mass is None:
+        raise ValueError("The mass is needed for p2, kinetic and virial.")
+
+    # weight functions of all position dependent observables, reduced
+    # with the densities by one matrix product
+    weights = {}
+    if {"x", "sigma_x"} & set(which):
+        weights["x"] = grid.x_points
+    if {"x2", "sigma_x"} & set(which):
+        weights["x2"] = grid.x_points**2
+    if "potential" in which:
+        weights["potential"] = grid.v_points
+    if "virial" in which:
+        weights["x_dv"] = grid.x_points * np.gradient(grid.v_points,
+                                                      grid.x_points)
+
+    result = {}
+    if weights:
+        density = np.square(np.abs(w_func))
+        moments = (np.array(list(weights.values())) * grid.weights) @ density
+        result = dict(zip(weights.keys(), moments))
+
+    if "sigma_x" in which:
+        result["sigma_x"] = np.sqrt(result["x2"] - result["x"]**2)
+    if need_kin:
+        # (1/2m) sum of (psi_j+1 - psi_j)**2 / h_j, psi vanishes at the walls
+        edges = np.diff(w_func, axis=0, prepend=0.0, append=0.0)
+        result["kinetic"] = np.einsum('i,ij,ij->j', 1 / grid.spacing,
+                                      _conj(edges), edges).real / (2 * mass)
+        result["p2"] = 2 * mass * result["kinetic"]
+    if "virial" in which:
+        result["virial"] = 2 * result["kinetic"] - result.pop("x_dv")
+
+    return {name: result[name] for name in which}
+
+
+def _conj(array):
+    """Complex conjugate, without copying real arrays."""
+    return np.conj(array) if np.iscomplexobj(array) else array
@@ -0,0 +1,108 @@
+"""
+Module containing the options of a solver run, which are shared by
+main_solver and main_client: the names of the eigensolvers and stencils and
+the command line arguments selecting the input, the output and the solver.
+It imports neither the solver nor scipy, so the client starts fast.
+"""
+
+import numpy as np
+from modules import in_and_out
+
+# solver methods which can be selected by the user
+METHODS = ("auto", "dense", "tridiagonal", "sparse", "sliced")
+
+# discretizations of the kinetic energy operator: central differences of
+# 2nd, 4th and 6th order and the Numerov method (4th order)
+STENCILS = ("fd2", "fd4", "fd6", "numerov")
+
+
+def add_arguments(parser):
+    """
+    Adds the arguments of a solver run to a command line parser: input and
+    output directory, output format and size, eigensolver, energy window,
+    stencil, grid convergence and non-uniform grids.
+
+    Args:
+        parser (argparse.ArgumentParser): parser of the script.
+    """
+    msg = 'Path to input file (default: .)'
+    parser.add_argument('-i', '--input', type=str, default='.', help=msg)
+    msg = 'Path to output file (default: .)'
+    parser.add_argument('-o', '--output', type=str, default='.', help=msg)
+    msg = ('Format of the output files: text (.dat) or binary (.npy, '
+           'memory-mappable) (default: text)')
+    parser.add_argument('-f', '--format', type=str, choices=in_and_out.FORMATS,
+                        default='text', help=msg)
+    msg = 'Store the output in single precision (float32)'
+    parser.add_argument('--float32', action='store_true', help=msg)
+    group = parser.add_mutually_exclusive_group()
+    msg = 'Store potential and wavefunctions on every K-th point only'
+    group.add_argument('--stride', type=int, default=1, metavar='K', help=msg)
+    msg = 'Store potential and wavefunctions on N evenly spread points only'
+    group.add_argument('--output-points', type=int, default=None,
+                       metavar='N', help=msg)
+    msg = 'Eigensolver to use (default: solver option of input file or auto)'
+    parser.add_argument('-s', '--solver', type=str, choices=METHODS,
+                        default=None, help=msg)
+    msg = 'Calculate all eigenvalues in [EMIN, EMAX) instead of first, last'
+    parser.add_argument('-w', '--window', type=float, nargs=2, default=None,
+                        metavar=('EMIN', 'EMAX'), help=msg)
+    msg = 'Kinetic energy stencil (default: stencil option of input file or fd2)'
+    parser.add_argument('--stencil', type=str, choices=STENCILS,
+                        default=None, help=msg)
+    msg = ('Refine the grid until the Richardson extrapolated eigenvalues '
+           'change by less than TOL (nPoint of the input file is ignored)')
+    parser.add_argument('--converge', type=float, default=None, metavar='TOL',
+                        help=msg)
+    group = parser.add_mutually_exclusive_group()
+    msg = ('Solve on a non-uniform grid of NPOINT points mapped to the '
+           'potential (nPoint of the input file is used for the output)')
+    group.add_argument('--mapped', type=int, default=None, metavar='NPOINT',
+                       help=msg)
+    msg = 'Solve on the non-uniform grid with the points listed in FILE'
+    group.add_argument('--nodes', type=str, default=None, metavar='FILE',
+                       help=msg)
+
+
+def read_parameter(parser, args):
+    """
+    Reads the input file and overrides its options by the parsed command
+    line arguments. Invalid input files and combinations of options end the
+    script with an error message.
+
+    Args:
+        parser (argparse.ArgumentParser): parser of the script.
+        args (argparse.Namespace): parsed arguments (see add_arguments).
+
+    Returns:
+        parameter (dictionary): parameters of the run (see
+        in_and_out.read_inp)
+    """
+    if args.stride < 1 or (args.output_points is not None
+                           and args.output_points < 1):
+        parser.error("--stride and --output-points must be positive.")
+    try:
+        parameter = in_and_out.read_inp(args.input)
+    except in_and_out.InputError as error:
+        parser.exit(1, "{}\n".format(error))
+    if args.solver is not None:
+        parameter['solver'] = args.solver
+    if args.window is not None:
+        parameter['window'] = tuple(args.window)
+    if args.stencil is not None:
+        parameter['stencil'] = args.stencil
+    if args.mapped is not None:
+        parameter['grid'] = ('mapped', args.mapped)
+    if args.nodes is not None:
+        parameter['grid'] = ('nodes', np.loadtxt(args.nodes, ndmin=1))
+
+    if args.converge is not None and parameter['window'] is not None:
+        parser.error("--converge selects the states by first and last only, "
+                     "it can not be combined with an energy window.")
+    if parameter['grid'] is not None:
+        if args.converge is not None:
+            parser.error("--converge refines uniform grids only, it can not "
+                         "be combined with a non-uniform grid.")
+        if parameter['stencil'] != 'fd2':
+            parser.error("Non-uniform grids support the fd2 stencil only.")
+    return parameter
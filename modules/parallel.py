@@ -0,0 +1,61 @@
+"""
+Module containing the pools of worker processes shared by the sweep, the
+band structure, the sliced eigensolver and the solver service. The workers
+are started fresh (spawn) with the thread limits of the BLAS libraries set
+in their environment, so the workers do not oversubscribe the cores. It
+imports neither numpy nor scipy, so the clients of the service start fast.
+"""
+
+import contextlib
+import multiprocessing
+import os
+from concurrent import futures
+
+# environment variables limiting the threads of the BLAS/OpenMP libraries
+_THREAD_VARIABLES = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+                     "MKL_NUM_THREADS", "BLIS_NUM_THREADS",
+                     "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+
+@contextlib.contextmanager
+def blas_threads(threads):
+    """
+    Sets the thread limits of the BLAS libraries for the processes started
+    in the context. The libraries read the limits when they are loaded, so
+    the limits can not be changed in a running worker. A pool (see pool)
+    starts its workers on demand, so the limits have to stay set while
+    tasks are submitted.
+
+    Args:
+        threads (int): number of BLAS threads per process.
+    """
+    saved = {name: os.environ.get(name) for name in _THREAD_VARIABLES}
+    os.environ.update({name: str(threads) for name in _THREAD_VARIABLES})
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                del os.environ[name]
+            else:
+                os.environ[name] = value
+
+
+def pool(workers, initializer=None, initargs=()):
+    """
+    Creates a pool of worker processes, which are started fresh (spawn), so
+    they take the thread limits of the environment (see blas_threads) and
+    do not inherit the state of the calling process.
+
+    Args:
+        workers (int): maximal number of worker processes.
+        initializer (function): function called by every worker at its start.
+        initargs (tuple): arguments of the initializer.
+
+    Returns:
+        pool (concurrent.futures.ProcessPoolExecutor): pool of the workers
+    """
+    return futures.ProcessPoolExecutor(workers,
+                                       multiprocessing.get_context("spawn"),
+                                       initializer=initializer,
+                                       initargs=initargs)
@@ -0,0 +1,111 @@
+"""
+Module containing the pipeline of a solver run: interpolation of the
+potential, discretization, eigensolver, normalization and expectation values.
+"""
+
+import warnings
+from modules import (convergence, grid, in_and_out, potentials, profiling,
+                     solver)
+
+
+def solve(parameter, converge=None, previous=None):
+    """
+    Runs the pipeline of interpolation, discretization, eigensolver and
+    expectation values and returns the arrays of the output files (see
+    in_and_out.output_data), together with the results of the grid
+    convergence, if requested. The states of a previous run of the same
+    Hamiltonian on the same grid (see in_and_out.read_states) are reused,
+    the states of a different Hamiltonian or of a non-uniform grid are
+    ignored with a warning.
+
+    Args:
+        parameter (dictionary): parameters of the input file (see
+        in_and_out.read_inp).
+        converge (float): tolerance of the grid convergence, None to solve
+        on the grid of the input file.
+        previous (tuple): states of a previous run, None to calculate all
+        states.
+
+    Returns:
+        data (dictionary): arrays of the output files, "fingerprint" of the
+        Hamiltonian or "conv_npoint", "extrapolated" and "error" of the grid
+        convergence
+    """
+    with profiling.stage("interpolation"):
+        int_pot = potentials.potential(parameter)
+
+    if converge is None:
+        with profiling.stage("grid"):
+            if parameter['grid'] is None:
+                disc = grid.Grid(parameter['xMin'], parameter['xMax'],
+                                 parameter['nPoint'], int_pot)
+            else:
+                disc = _non_uniform_grid(parameter, int_pot)
+            fingerprint = solver.fingerprint(disc, parameter['mass'],
+                                             parameter['stencil'])
+        if previous is not None and not disc.uniform:
+            warnings.warn("The previous states are reused on uniform grids "
+                          "only, all states are calculated.", stacklevel=2)
+            previous = None
+        elif previous is not None and (previous[1][3] != fingerprint
+                                       or len(previous[0]) != disc.npoint):
+            warnings.warn("The previous states belong to a different "
+                          "Hamiltonian or grid, all states are calculated.",
+                          stacklevel=2)
+            previous = None
+        with profiling.stage("solve"):
+            if previous is not None:
+                eigenvalue, eigenvector = solver.extend(
+                    disc, parameter['mass'], parameter['first'],
+                    parameter['last'], previous[1], parameter['solver'],
+                    parameter['stencil'])
+            else:
+                eigenvalue, eigenvector = solver.solv(
+                    disc, parameter['mass'], parameter['first'],
+                    parameter['last'], parameter['solver'],
+                    parameter['window'], stencil=parameter['stencil'])
+    else:
+        with profiling.stage("solve"):
+            disc, eigenvalue, eigenvector, extrapolated, error = \
+                convergence.converge(parameter['xMin'], parameter['xMax'],
+                                     parameter['mass'], int_pot,
+                                     parameter['first'], parameter['last'],
+                                     converge, parameter['solver'],
+                                     parameter['stencil'])
+    profiling.annotate(npoint=disc.npoint, uniform=disc.uniform)
+
+    with profiling.stage("norm"):
+        w_function = solver.norm(eigenvector, disc)
+
+    with profiling.stage("exp_val"):
+        exp_x, unc_x = solver.exp_val(w_function, disc)
+
+    with profiling.stage("output_data"):
+        data = in_and_out.output_data(disc, eigenvalue, w_function, exp_x,
+                                      unc_x, parameter['nPoint'])
+    if converge is not None:
+        data.update(conv_npoint=disc.npoint, extrapolated=extrapolated,
+                    error=error)
+    elif parameter['window'] is None:
+        data['fingerprint'] = fingerprint
+    return data
+
+
+def _non_uniform_grid(parameter, int_pot):
+    """
+    Builds the non-uniform grid selected by the grid option. A mapped grid
+    resolves the states up to the upper end of the energy window or up to
+    the last eigenvalue of a uniform grid with the same number of points.
+    """
+    kind, value = parameter['grid']
+    if kind == 'nodes':
+        return grid.from_nodes(value, int_pot)
+    if parameter['window'] is not None:
+        energy = parameter['window'][1]
+    else:
+        coarse = grid.Grid(parameter['xMin'], parameter['xMax'], value,
+                           int_pot)
+        energy = solver.solv(coarse, parameter['mass'], parameter['last'],
+                             parameter['last'], parameter['solver'])[0][-1]
+    return grid.mapped(parameter['xMin'], parameter['xMax'], value, int_pot,
+                       parameter['mass'], energy)
@@ -3,11 +3,13 @@
 import os.path
 import matplotlib.pyplot as plt
 import numpy as np
+from modules import in_and_out
 
 
 def readplotdata(direc):
     """Reads the data from the output files and returns the data
-    in arrays.
+    in arrays. Output files in binary format are memory-mapped, so only the
+    plotted eigenfunctions are read from disk.
 
     Args:
         direc (string): directory where data is located.
@@ -21,21 +23,14 @@ def readplotdata(direc):
         uncertainties (array): uncertainty values for every eigenfunction.
     """
 
-    path_en = os.path.join(direc, "energies.dat")
-    path_pot = os.path.join(direc, "potential.dat")
-    path_wfuncs = os.path.join(direc, "wavefuncs.dat")
-    path_expec_val = os.path.join(direc, "expvalues.dat")
+    data = in_and_out.read_output(direc)
 
-    energies = np.loadtxt(path_en)
-    potential = np.loadtxt(path_pot)
-    wavefuncs = np.loadtxt(path_wfuncs)
-    expvalues = np.loadtxt(path_expec_val)
-
-    x_val = potential[:, 0]
-    potential = potential[:, 1]
-    eigenfunctions = wavefuncs[:, 1:]
-    exp_values = expvalues[:, 0]
-    uncertainties = expvalues[:, 1]
+    x_val = data['x_points']
+    potential = data['v_points']
+    eigenfunctions = data['w_func']
+    energies = data['energy']
+    exp_values = data['exp_x']
+    uncertainties = data['unc_x']
 
     return x_val, potential, eigenfunctions, energies, exp_values, uncertainties
 
@@ -183,23 +178,18 @@ def plotuncertainty(potential, eigenfunctions, energies, uncertainties,
 
 def _check_dir():
     """Checks if the plottable data is located in the same folder
-    as the main function, by checking if wavefuncs.dat is present.
+    as the main function, by checking if wavefuncs.dat or wavefuncs.npy is
+    present.
 
     Returns:
         isdir (bool): is plottable data in default directory
     """
 
-    try:
-        fp = open("wavefuncs.dat", "r")
-    except FileNotFoundError:
+    isdir = os.path.exists("wavefuncs.dat") or os.path.exists("wavefuncs.npy")
+    if not isdir:
         msg = "Plottable data not found or incomplete in default directory."
         print(msg)
-        isdir = False
-        return isdir
-    else:
-        fp.close()
-        isdir = True
-        return isdir
+    return isdir
 
 
 def user_inp():
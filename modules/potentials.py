@@ -0,0 +1,141 @@
+"""
+Module containing closed-form potentials: expressions of the input file are
+compiled safely into vectorized numpy functions and common potentials are
+available by name.
+"""
+
+import ast
+import numpy as np
+from modules import interpolator
+
+# numpy functions and constants available in potential expressions
+_FUNCTIONS = {"sqrt": np.sqrt, "exp": np.exp, "log": np.log, "sin": np.sin,
+              "cos": np.cos, "tan": np.tan, "sinh": np.sinh, "cosh": np.cosh,
+              "tanh": np.tanh, "arctan": np.arctan, "abs": np.abs,
+              "minimum": np.minimum, "maximum": np.maximum,
+              "where": np.where}
+_CONSTANTS = {"pi": np.pi, "e": np.e}
+
+# syntax elements allowed in potential expressions
+_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call,
+          ast.Name, ast.Load, ast.Constant, ast.keyword, ast.Add, ast.Sub,
+          ast.Mult, ast.Div, ast.Pow, ast.USub, ast.UAdd, ast.Lt, ast.LtE,
+          ast.Gt, ast.GtE)
+
+
+def harmonic(x_points, k=1.0, x0=0.0):
+    """Harmonic oscillator 0.5 k (x - x0)**2."""
+    return 0.5 * k * (x_points - x0)**2
+
+
+def infinite_well(x_points):
+    """Infinite potential well, the walls are the ends of the grid."""
+    return np.zeros_like(x_points)
+
+
+def finite_well(x_points, depth=1.0, width=1.0, x0=0.0):
+    """Finite potential well of the given depth and width around x0."""
+    return np.where(np.abs(x_points - x0) < 0.5 * width, -depth, 0.0)
+
+
+def morse(x_points, depth=1.0, alpha=1.0, x0=0.0):
+    """Morse potential depth (1 - exp(-alpha (x - x0)))**2."""
+    return depth * (1 - np.exp(-alpha * (x_points - x0)))**2
+
+
+def poschl_teller(x_points, depth=1.0, alpha=1.0, x0=0.0):
+    """Poschl-Teller potential -depth / cosh(alpha (x - x0))**2."""
+    return -depth / np.cosh(alpha * (x_points - x0))**2
+
+
+# potentials available by name in potential expressions
+NAMED = {"harmonic": harmonic, "infinite_well": infinite_well,
+         "finite_well": finite_well, "morse": morse,
+         "poschl_teller": poschl_teller}
+
+
+def compile_expression(expression):
+    """
+    Compiles the expression of a potential, e.g. "0.5*x**2" or
+    "morse(x, depth=10, alpha=0.5) + 0.1*x", into a function evaluating it
+    on all discretization points in a single call. The expression may use
+    the coordinate x, numbers, the operators + - * / ** and comparisons, the
+    constants pi and e, elementary numpy functions (sqrt, exp, log, sin,
+    cos, tan, sinh, cosh, tanh, arctan, abs, minimum, maximum, where) and the
+    named potentials (see NAMED) with keyword parameters.
+
+    The expression is checked against this list before it is compiled, no
+    other names, attributes or statements are accepted. All numbers are
+    floats, so large powers overflow instead of exhausting the memory.
+
+    Args:
+        expression (string): potential as function of x.
+
+    Returns:
+        potential (function): vectorized potential function
+
+    Raises:
+        ValueError: if the expression is invalid or uses other elements.
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as error:
+        raise ValueError("Invalid expression '{}': {}"
+                         .format(expression, error.msg)) from None
+    namespace = dict(_FUNCTIONS, **_CONSTANTS, **NAMED)
+    for node in ast.walk(tree):
+        if not isinstance(node, _NODES):
+            raise ValueError("'{}' is not allowed in a potential expression."
+                             .format(type(node).__name__))
+        if isinstance(node, ast.Name) and node.id not in namespace \
+                and node.id != "x":
+            raise ValueError("Unknown name '{}' in the potential expression."
+                             .format(node.id))
+        if isinstance(node, ast.Call) and not (
+                isinstance(node.func, ast.Name)
+                and (node.func.id in _FUNCTIONS or node.func.id in NAMED)):
+            raise ValueError("Only functions can be called in a potential "
+                             "expression.")
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or \
+                    not isinstance(node.value, (int, float)):
+                raise ValueError("Only numbers are allowed as constants in a "
+                                 "potential expression.")
+            node.value = float(node.value)
+    code = compile(tree, "<potential>", "eval")
+
+    def kernel(x_points):
+        x_points = np.asarray(x_points, dtype=float)
+        try:
+            values = eval(code, {"__builtins__": {}},
+                          dict(namespace, x=x_points.copy()))
+        except (ArithmeticError, TypeError) as error:
+            raise ValueError("The potential expression '{}' can not be "
+                             "evaluated: {}".format(expression,
+                                                    error)) from None
+        return np.broadcast_to(np.asarray(values, dtype=float),
+                               x_points.shape).copy()
+
+    # wrong arguments of the functions and overflows of the numbers are
+    # detected by a trial evaluation
+    with np.errstate(all="ignore"):
+        kernel(np.zeros(1))
+    return kernel
+
+
+def potential(parameter):
+    """
+    Creates the potential function of an input file, either the compiled
+    expression or the interpolated xy declarations.
+
+    Args:
+        parameter (dictionary): parameters of the input file (see
+        in_and_out.read_inp).
+
+    Returns:
+        potential (function): vectorized potential function
+    """
+    if parameter.get('expression') is not None:
+        return compile_expression(parameter['expression'])
+    return interpolator.interpolator(parameter['x_decl'], parameter['y_decl'],
+                                     parameter['interpol_method'])
@@ -0,0 +1,206 @@
+"""
+Module containing the per-stage profiling of solver runs: wall time, CPU time
+and peak memory of every stage of the pipeline are recorded together with
+the size of the problem and written as one JSON line per run.
+"""
+
+import contextlib
+import json
+import sys
+import time
+import tracemalloc
+import modules
+
+try:
+    import resource
+except ImportError:  # no resource usage available (Windows)
+    resource = None
+
+# profiler of the running profile, the stages of the modules are recorded
+# by it (see stage and annotate)
+_ACTIVE = None
+
+
+class Profiler:
+    """
+    Recorder of the stages of a run. While the profiler is active (inside
+    its with block), the stages of the pipeline are recorded, which are
+    marked by stage() in the modules or by the stage method. Stages can be
+    nested, their names are joined by "/", e.g. "solve/eigensolver".
+
+    For every stage the wall time, the CPU time of the process and the peak
+    of the memory allocated by Python and numpy during the stage (traced by
+    tracemalloc) are recorded, together with the largest resident set size
+    of the process so far.
+
+    Hooks attach further measurements: every hook is called with the name
+    of a stage when the stage begins and has to return a context manager,
+    which is exited when the stage ends, e.g.
+
+        hooks=[lambda name: my_timer.time(name)]
+
+    Args:
+        hooks (list): functions returning a context manager for a stage name.
+        memory (bool): if True, the memory allocations are traced, which
+        slows down the run slightly.
+
+    Attributes:
+        hooks (list): functions returning a context manager for a stage name.
+        memory (bool): if True, the memory allocations are traced.
+        stages (list): dictionary of every finished stage, inner stages come
+        before the stages containing them
+        info (dictionary): description of the problem (see annotate)
+        total (dictionary): measurements of the whole run
+    """
+
+    def __init__(self, hooks=(), memory=True):
+        self.hooks = list(hooks)
+        self.memory = memory
+        self.stages = []
+        self.info = {}
+        self.total = {}
+        self._names = []
+        # traced memory at the beginning and largest peak of open stages
+        self._memory = []
+        self._tracing = False
+        self._previous = None
+
+    def __enter__(self):
+        global _ACTIVE
+        self._previous, _ACTIVE = _ACTIVE, self
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        self._stack = contextlib.ExitStack()
+        self._stack.enter_context(self._measure(self.total))
+        return self
+
+    def __exit__(self, *exc_info):
+        global _ACTIVE
+        self._stack.close()
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        _ACTIVE = self._previous
+        return False
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Records a stage of the run.
+
+        Args:
+            name (string): name of the stage.
+        """
+        self._names.append(name)
+        path = "/".join(self._names)
+        record = {"stage": path}
+        try:
+            with contextlib.ExitStack() as stack:
+                for hook in self.hooks:
+                    stack.enter_context(hook(path))
+                with self._measure(record):
+                    yield
+        finally:
+            self._names.pop()
+            self.stages.append(record)
+
+    @contextlib.contextmanager
+    def _measure(self, record):
+        """Measures the time and the memory of a block into record."""
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._memory:
+                self._memory[-1][1] = max(self._memory[-1][1], peak)
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            self._memory.append([current, current])
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            record["wall"] = time.perf_counter() - wall
+            record["cpu"] = time.process_time() - cpu
+            if tracing:
+                start, peak = self._memory.pop()
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                if self._memory:
+                    self._memory[-1][1] = max(self._memory[-1][1], peak)
+                record["peak_bytes"] = peak - start
+            rss = max_rss()
+            if rss is not None:
+                record["max_rss_bytes"] = rss
+
+    def record(self):
+        """
+        Collects the results of the run.
+
+        Returns:
+            record (dictionary): solver version, time of the run, description
+            of the problem, measurements of the whole run and of all stages
+        """
+        return {"version": modules.__version__,
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "info": dict(self.info), "total": dict(self.total),
+                "stages": list(self.stages)}
+
+
+def max_rss():
+    """
+    Largest resident set size of the process so far.
+
+    Returns:
+        rss (int): size in bytes, None if not available
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def stage(name):
+    """
+    Marks a stage of the pipeline, which is recorded by the active profiler
+    and costs nothing without one.
+
+    Args:
+        name (string): name of the stage.
+
+    Returns:
+        context (context manager): block of the stage
+    """
+    if _ACTIVE is None:
+        return contextlib.nullcontext()
+    return _ACTIVE.stage(name)
+
+
+def annotate(**info):
+    """
+    Adds a description of the problem (e.g. number of points, number of
+    states or the chosen solver) to the record of the active profiler.
+
+    Args:
+        info: names and JSON serializable values.
+    """
+    if _ACTIVE is not None:
+        _ACTIVE.info.update(info)
+
+
+def write_record(record, path):
+    """
+    Appends a record as one line of JSON to a file, so the records of many
+    runs can be collected in one file (NDJSON).
+
+    Args:
+        record (dictionary): record of a run (see Profiler.record).
+        path (string): file name, "-" for the standard output.
+    """
+    line = json.dumps(record, sort_keys=True) + "\n"
+    if path == "-":
+        sys.stdout.write(line)
+        return
+    # a single write, so lines of concurrent runs are not mixed
+    with open(path, "a") as fp:
+        fp.write(line)
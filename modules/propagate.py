@@ -0,0 +1,143 @@
+"""
+Module containing the propagation of wavepackets in time (atomic units,
+hbar = 1): a Crank-Nicolson stepper on the banded Hamiltonian of the solver
+and a spectral propagator in the basis of the stationary states. Both yield
+the wavefunction frame by frame, so a trajectory never has to be held in
+memory (see in_and_out.propagation_storage).
+"""
+
+import numpy as np
+from scipy import linalg
+from scipy.linalg import lapack
+from modules import observables, solver
+
+# propagation methods which can be selected by the user
+METHODS = ("crank_nicolson", "spectral")
+
+
+def gaussian(grid, x0, sigma, k0=0.0):
+    """
+    Creates a normalized Gaussian wavepacket
+    exp(-(x - x0)**2/(4 sigma**2) + i k0 x).
+
+    Args:
+        grid (Grid): discretization points and potential.
+        x0 (float): center of the wavepacket.
+        sigma (float): position uncertainty of the wavepacket.
+        k0 (float): mean momentum of the wavepacket.
+
+    Returns:
+        psi ((N,)complex array): wavefunction on the grid
+    """
+    x_points = grid.x_points
+    psi = np.exp(-((x_points - x0)/(2*sigma))**2 + 1j*k0*x_points)
+    return psi / np.sqrt(grid.weights @ np.abs(psi)**2)
+
+
+def crank_nicolson(grid, mass, psi0, dt, nsteps, stride=1, stencil="fd2"):
+    """
+    Propagates a wavefunction by the Crank-Nicolson method
+
+        (1 + i dt/2 H) psi(t + dt) = (1 - i dt/2 H) psi(t),
+
+    which is unitary and of 2nd order in the time step. The banded matrix
+    on the left side is factorized once by LAPACK, so every step costs a
+    banded product and a banded solve, O(N) for the three point stencil. On
+    non-uniform grids the symmetrized Hamiltonian of the solver is
+    propagated.
+
+    Args:
+        grid (Grid): discretization points and potential.
+        mass (float): particle mass.
+        psi0 ((N,)array): wavefunction at time 0.
+        dt (float): time step.
+        nsteps (int): number of time steps.
+        stride (int): yield every stride-th step only.
+        stencil (string): discretization of the kinetic energy, "fd2",
+        "fd4" or "fd6" (see solver.STENCILS).
+
+    Yields:
+        time (float): time of the frame, starting with 0
+        psi ((N,)complex array): wavefunction at this time
+    """
+    if stencil == "numerov":
+        raise ValueError("The propagation is not available for the Numerov "
+                         "stencil.")
+    bands = solver.hamiltonian(grid, mass, stencil)
+    width = len(bands) - 1
+    npoint = grid.npoint
+
+    # LAPACK band storage of (1 + i dt/2 H), including the width rows of
+    # fill-in created by the pivoting
+    a_band = np.zeros((3*width + 1, npoint), dtype=complex)
+    a_band[2*width] = 1 + 0.5j*dt*bands[0]
+    for kk, band in enumerate(bands[1:], 1):
+        a_band[2*width - kk, kk:] = 0.5j*dt*band
+        a_band[2*width + kk, :-kk] = 0.5j*dt*band
+    lu_band, pivots, info = lapack.zgbtrf(a_band, width, width)
+    if info != 0:
+        raise linalg.LinAlgError("Factorization of the Crank-Nicolson "
+                                 "matrix failed (info {}).".format(info))
+
+    sqrt_weights = np.sqrt(grid.weights)
+    phi = sqrt_weights * np.asarray(psi0, dtype=complex)
+    yield 0.0, phi / sqrt_weights
+    for step in range(1, nsteps + 1):
+        rhs = phi - 0.5j*dt*_apply(bands, phi)
+        phi, info = lapack.zgbtrs(lu_band, width, width, rhs, pivots,
+                                  overwrite_b=True)
+        if step % stride == 0:
+            yield step*dt, phi / sqrt_weights
+
+
+def _apply(bands, vector):
+    """Product of the symmetric banded Hamiltonian with a vector."""
+    result = bands[0] * vector
+    for kk, band in enumerate(bands[1:], 1):
+        result[kk:] += band * vector[:-kk]
+        result[:-kk] += band * vector[kk:]
+    return result
+
+
+def spectral(grid, energy, w_func, psi0, times):
+    """
+    Propagates a wavefunction exactly in time by expanding it in stationary
+    states (see solver.solv and solver.norm), whose phases evolve as
+    exp(-i E t). States outside of the basis are lost, the norm of the
+    propagated wavefunction is the norm captured by the basis.
+
+    Args:
+        grid (Grid): discretization points and potential.
+        energy ((M,)array): energy eigenvalues.
+        w_func ((N, M)array): normalized wavefunctions.
+        psi0 ((N,)array): wavefunction at time 0.
+        times (iterable): times of the frames.
+
+    Yields:
+        time (float): time of the frame
+        psi ((N,)complex array): wavefunction at this time
+    """
+    coeffs = w_func.T @ (grid.weights * psi0)
+    for time in times:
+        yield time, w_func @ (coeffs * np.exp(-1j*energy*time))
+
+
+def moments(psi, grid):
+    """
+    Calculates norm, position expectation value and position uncertainty of
+    a wavefunction, the latter two of the normalized wavefunction.
+
+    Args:
+        psi ((N,)array): wavefunction.
+        grid (Grid): discretization points and potential.
+
+    Returns:
+        norm (float): integral over abs(psi)**2
+        exp_x (float): expectation value of the position
+        unc_x (float): position uncertainty
+    """
+    density = np.abs(psi)
+    norm = grid.weights @ density**2
+    result = observables.observables((density / np.sqrt(norm))[:, np.newaxis],
+                                     grid, which=("x", "sigma_x"))
+    return norm, result["x"][0], result["sigma_x"][0]
@@ -0,0 +1,496 @@
+"""
+Module containing a persistent local solver service: an asyncio server on a
+UNIX socket or a localhost TCP port passes the requests to a pool of warm
+worker processes, so a run does not pay for starting Python and importing
+numpy and scipy. A request carries the content of an input file or its
+parsed parameters, the response streams back the eigenpairs and the
+observables as binary arrays.
+
+A message is a JSON header, preceded by its length (8 bytes, big-endian),
+followed by the raw bytes of the arrays listed in the header:
+
+    {"values": {...}, "arrays": [[name, dtype, shape], ...]}
+
+The service accepts numeric arrays only and limits the size of the header
+and of the arrays of a request.
+"""
+
+import asyncio
+import contextlib
+import json
+from concurrent.futures.process import BrokenProcessPool
+import os
+import signal
+import socket
+import stat
+import struct
+import tempfile
+import time
+import numpy as np
+from modules import in_and_out, parallel
+
+# default address of the service, in a directory accessible by its user only
+ADDRESS = os.path.join(tempfile.gettempdir(),
+                       "schrodinger_solver-{}".format(os.getuid()),
+                       "solver.sock")
+
+_LENGTH = struct.Struct("!Q")
+# largest header and largest total size of the arrays of a request, which
+# bound the memory a client can make the service allocate
+_MAX_HEADER = 2**20
+_MAX_REQUEST = 2**28
+# the arrays are written in chunks of this size, the server waits for slow
+# clients in between, so a response is never buffered as a whole
+_CHUNK = 2**20
+
+
+class ServiceError(RuntimeError):
+    """
+    Failure of a request to the solver service.
+
+    Attributes:
+        busy (bool): True, if the queue of the service was full.
+    """
+
+    def __init__(self, message, busy=False):
+        super().__init__(message)
+        self.busy = busy
+
+
+class Service:
+    """
+    Dispatcher of the requests to a pool of warm worker processes. At most
+    one request per worker is solved at a time, further requests wait in a
+    queue of limited length and requests beyond it are refused as busy, so
+    the client can retry later (backpressure).
+
+    The workers are started fresh (spawn) with the BLAS thread limit set in
+    their environment and import the modules of the solver at their start.
+    If a worker dies, e.g. killed for its memory, its request fails and the
+    pool is replaced by a new one.
+
+    Args:
+        workers (int): number of worker processes (default: number of cores).
+        queue (int): largest number of waiting requests (default: 4 per
+        worker).
+        blas_threads (int): number of BLAS threads per worker.
+
+    Attributes:
+        workers (int): number of worker processes.
+        queue (int): largest number of waiting requests.
+        blas_threads (int): number of BLAS threads per worker.
+        active (int): number of requests being solved or waiting.
+    """
+
+    def __init__(self, workers=None, queue=None, blas_threads=1):
+        self.workers = os.cpu_count() if workers is None else workers
+        self.queue = 4 * self.workers if queue is None else queue
+        self.blas_threads = blas_threads
+        self.active = 0
+        self._pool = None
+        self._slots = None
+        self._environment = None
+        # submitted requests, which are cancelled when the service stops
+        self._futures = set()
+
+    def __enter__(self):
+        # the workers are started on demand and after a crash, so the thread
+        # limits stay in the environment while the service runs
+        self._environment = contextlib.ExitStack()
+        self._environment.enter_context(parallel.blas_threads(self.blas_threads))
+        self._pool = self._new_pool()
+        return self
+
+    def __exit__(self, *exc_info):
+        for future in list(self._futures):
+            future.cancel()
+        self._pool.shutdown(wait=True)
+        self._pool = None
+        self._environment.close()
+        return False
+
+    def _new_pool(self):
+        """Starts a pool of worker processes."""
+        return parallel.pool(self.workers, _warm_up)
+
+    async def solve(self, values, arrays):
+        """
+        Solves a request on a worker.
+
+        Args:
+            values (dictionary): values of the request header.
+            arrays (dictionary): arrays of the request.
+
+        Returns:
+            values (dictionary): values of the response header.
+            arrays (dictionary): arrays of the response.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        if self.active >= self.workers + self.queue:
+            return {"error": "The solver service is busy, {} requests are "
+                             "waiting.".format(self.queue),
+                    "kind": "busy"}, {}
+        self.active += 1
+        try:
+            async with self._slots:
+                pool = self._pool
+                try:
+                    future = pool.submit(_run_request, values, arrays)
+                    self._futures.add(future)
+                    future.add_done_callback(self._futures.discard)
+                    return await asyncio.wrap_future(future)
+                except BrokenProcessPool:
+                    # the broken pool has already failed all its requests
+                    if self._pool is pool:
+                        pool.shutdown(wait=False)
+                        self._pool = self._new_pool()
+                    return {"error": "A worker of the solver service "
+                                     "terminated abruptly.",
+                            "kind": "solver"}, {}
+                except Exception as error:  # e.g. a result not picklable
+                    return {"error": "{}: {}".format(type(error).__name__,
+                                                     error),
+                            "kind": "solver"}, {}
+        finally:
+            self.active -= 1
+
+    async def handle(self, reader, writer):
+        """
+        Serves a connection: every request is answered by one response,
+        until the client closes the connection.
+
+        Args:
+            reader (asyncio.StreamReader): incoming stream.
+            writer (asyncio.StreamWriter): outgoing stream.
+        """
+        try:
+            while True:
+                try:
+                    request = await _read_message(reader)
+                except (ValueError, KeyError, TypeError) as error:
+                    await _write_message(writer, {
+                        "error": "Invalid request: {}".format(error),
+                        "kind": "request"}, {})
+                    break
+                if request is None:
+                    break
+                await _write_message(writer, *await self.solve(*request))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # the client went away
+        finally:
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+
+def _warm_up():
+    """Imports the modules of the pipeline when a worker starts."""
+    import scipy.interpolate  # noqa: F401
+    import scipy.sparse  # noqa: F401
+    from modules import pipeline  # noqa: F401
+
+
+def _run_request(values, arrays):
+    """Worker function, returns the response to a request."""
+    from modules import pipeline
+    try:
+        parameter = _parameter(values, arrays)
+        data = pipeline.solve(parameter, values.get("converge"))
+    except in_and_out.InputError as error:
+        return {"error": str(error), "kind": "input"}, {}
+    except Exception as error:  # every failure is reported to the client
+        return {"error": "{}: {}".format(type(error).__name__, error),
+                "kind": "solver"}, {}
+    return split(data)
+
+
+def _parameter(values, arrays):
+    """Parameters of a request, read from the content of an input file."""
+    if "content" in values:
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "schrodinger.inp"), "w") as fp:
+                fp.write(values["content"])
+            return in_and_out.read_inp(directory, confined=True)
+    return join(values["parameter"], arrays)
+
+
+def split(parameter):
+    """
+    Splits parameters or results into the JSON values and the arrays of a
+    message.
+
+    Args:
+        parameter (dictionary): parameters of an input file (see
+        in_and_out.read_inp) or results of a run (see pipeline.solve).
+
+    Returns:
+        values (dictionary): JSON serializable values.
+        arrays (dictionary): arrays of the parameters.
+    """
+    values, arrays = {}, {}
+    for name, value in parameter.items():
+        if isinstance(value, np.ndarray):
+            arrays[name] = value
+        elif name == 'grid' and value is not None and value[0] == 'nodes':
+            values[name] = ['nodes', None]
+            arrays[name] = np.asarray(value[1], dtype=float)
+        elif isinstance(value, np.generic):
+            values[name] = value.item()
+        else:
+            values[name] = value
+    return values, arrays
+
+
+def join(values, arrays):
+    """
+    Joins the values and the arrays of a message into parameters (the
+    inverse of split).
+
+    Args:
+        values (dictionary): JSON values of the message.
+        arrays (dictionary): arrays of the message.
+
+    Returns:
+        parameter (dictionary): parameters or results
+    """
+    parameter = dict(values)
+    parameter.update(arrays)
+    if parameter.get('window') is not None:
+        parameter['window'] = tuple(parameter['window'])
+    if parameter.get('grid') is not None:
+        kind, value = values['grid']
+        parameter['grid'] = (kind, arrays['grid'] if kind == 'nodes'
+                             else value)
+    return parameter
+
+
+def _frames(values, arrays):
+    """Header and arrays of a message as a sequence of buffers."""
+    arrays = {name: np.asarray(array, order="C")
+              for name, array in arrays.items()}
+    header = json.dumps({"values": values,
+                         "arrays": [[name, array.dtype.str, array.shape]
+                                    for name, array in arrays.items()]})
+    header = header.encode()
+    yield _LENGTH.pack(len(header)) + header
+    for array in arrays.values():
+        data = memoryview(array.reshape(-1)).cast("B")
+        for start in range(0, data.nbytes, _CHUNK):
+            yield data[start:start + _CHUNK]
+
+
+def _arrays(header, limit=None):
+    """
+    Empty arrays listed in a message header, after checking their names,
+    types and shapes.
+
+    Args:
+        header (dictionary): header of a message.
+        limit (int): largest total size of the arrays in bytes.
+
+    Returns:
+        arrays (list): name and empty array of every listed array
+    """
+    if not isinstance(header, dict) or not isinstance(header["values"], dict):
+        raise ValueError("the header is not a JSON object")
+    arrays, total = [], 0
+    for name, dtype, shape in header["arrays"]:
+        dtype = np.dtype(dtype)
+        if not isinstance(name, str) or dtype.kind not in "biufc":
+            raise ValueError("only numeric arrays are supported")
+        if not all(type(length) is int and length >= 0 for length in shape):
+            raise ValueError("invalid shape {} of {}".format(shape, name))
+        total += dtype.itemsize * int(np.prod(shape, dtype=object))
+        if limit is not None and total > limit:
+            raise ValueError("the arrays exceed {} bytes".format(limit))
+        arrays.append((name, np.empty(shape, dtype=dtype)))
+    return arrays
+
+
+async def _read_message(reader):
+    """
+    Reads a request from a stream, None if the stream is closed. The sizes
+    of the header and of the arrays are limited.
+    """
+    try:
+        size = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))[0]
+    except asyncio.IncompleteReadError as error:
+        if error.partial:
+            raise
+        return None
+    if size > _MAX_HEADER:
+        raise ValueError("the header exceeds {} bytes".format(_MAX_HEADER))
+    header = json.loads((await reader.readexactly(size)).decode())
+    arrays = {}
+    for name, array in _arrays(header, _MAX_REQUEST):
+        view = memoryview(array.reshape(-1)).cast("B")
+        view[:] = await reader.readexactly(array.nbytes)
+        arrays[name] = array
+    return header["values"], arrays
+
+
+async def _write_message(writer, values, arrays):
+    """Writes a message to a stream, waiting for slow readers."""
+    for frame in _frames(values, arrays):
+        writer.write(frame)
+        await writer.drain()
+
+
+def _tcp_address(address):
+    """Host and port of a TCP address "HOST:PORT", None for a UNIX socket."""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit() and os.sep not in address:
+        return host, int(port)
+    return None
+
+
+async def serve(address=ADDRESS, workers=None, queue=None, blas_threads=1,
+                started=None):
+    """
+    Runs the solver service until it receives SIGINT or SIGTERM.
+
+    Args:
+        address (string): path of a UNIX socket or "HOST:PORT" of a TCP
+        socket, which should be bound to localhost only.
+        workers (int): number of worker processes (default: number of cores).
+        queue (int): largest number of waiting requests (default: 4 per
+        worker).
+        blas_threads (int): number of BLAS threads per worker.
+        started (function): called without arguments, when the service
+        accepts requests.
+    """
+    tcp = _tcp_address(address)
+    if address == ADDRESS:
+        _private_directory(os.path.dirname(address))
+    if tcp is None and os.path.exists(address):
+        try:
+            _connect(address, 1.0).close()
+        except OSError:
+            pass  # a stale socket file is replaced
+        else:
+            raise OSError("A solver service is already running at "
+                          "{}.".format(address))
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        # signal handlers can be set in the main thread only
+        with contextlib.suppress(NotImplementedError, RuntimeError,
+                                 ValueError):
+            loop.add_signal_handler(signum, stop.set)
+    with Service(workers, queue, blas_threads) as service:
+        if tcp is None:
+            # the socket is created accessible by its user only
+            umask = os.umask(0o177)
+            try:
+                server = await asyncio.start_unix_server(service.handle,
+                                                         address)
+            finally:
+                os.umask(umask)
+        else:
+            server = await asyncio.start_server(service.handle, *tcp)
+        try:
+            async with server:
+                if started is not None:
+                    started()
+                await stop.wait()
+        finally:
+            if tcp is None:
+                with contextlib.suppress(OSError):
+                    os.remove(address)
+
+
+def _private_directory(directory):
+    """Creates a directory accessible by its user only, if it is missing."""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    status = os.lstat(directory)
+    if (not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid()
+            or status.st_mode & 0o077):
+        raise OSError("The directory {} of the solver service is accessible "
+                      "by other users.".format(directory))
+
+
+def _connect(address, timeout=None):
+    """Connects a socket to the service."""
+    tcp = _tcp_address(address)
+    if tcp is not None:
+        return socket.create_connection(tcp, timeout)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(address)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def _receive(sock, view):
+    """Fills a buffer from a socket."""
+    while view.nbytes:
+        count = sock.recv_into(view)
+        if count == 0:
+            raise ServiceError("The solver service closed the connection.")
+        view = view[count:]
+
+
+def _receive_message(sock):
+    """Receives a message from a socket."""
+    length = bytearray(_LENGTH.size)
+    _receive(sock, memoryview(length))
+    header = bytearray(_LENGTH.unpack(length)[0])
+    _receive(sock, memoryview(header))
+    header = json.loads(header.decode())
+    arrays = {}
+    for name, array in _arrays(header):
+        _receive(sock, memoryview(array.reshape(-1)).cast("B"))
+        arrays[name] = array
+    return header["values"], arrays
+
+
+def request(source, converge=None, address=ADDRESS, wait=60.0):
+    """
+    Solves an input file on the solver service. A busy service is asked
+    again with growing pauses.
+
+    Args:
+        source (dictionary or string): parameters of an input file (see
+        in_and_out.read_inp) or the content of an input file, whose
+        potential is not declared in a separate table file.
+        converge (float): tolerance of the grid convergence, None to solve
+        on the grid of the input file.
+        address (string): path of the UNIX socket or "HOST:PORT" of the
+        service.
+        wait (float): seconds to retry a busy service.
+
+    Returns:
+        data (dictionary): arrays of the output files and results of the grid
+        convergence (see pipeline.solve)
+
+    Raises:
+        InputError: if the input file is invalid.
+        ServiceError: if the service is busy for too long or fails.
+        OSError: if there is no service at the address.
+    """
+    if isinstance(source, str):
+        values, arrays = {"content": source}, {}
+    else:
+        values, arrays = split(source)
+        values = {"parameter": values}
+    values["converge"] = converge
+    deadline = time.monotonic() + wait
+    pause = 0.05
+    with _connect(address) as sock:
+        while True:
+            for frame in _frames(values, arrays):
+                sock.sendall(frame)
+            answer, data = _receive_message(sock)
+            if answer.get("kind") != "busy" or time.monotonic() >= deadline:
+                break
+            time.sleep(min(pause, max(0.0, deadline - time.monotonic())))
+            pause = min(2 * pause, 1.0)
+    if "error" not in answer:
+        return join(answer, data)
+    if answer["kind"] == "input":
+        raise in_and_out.InputError(answer["error"])
+    raise ServiceError(answer["error"], busy=answer["kind"] == "busy")
@@ -4,89 +4,919 @@ Schrodinger equation and calculating expectation values of operator x
 and corresponding uncertainties.
 """
 
+import hashlib
+import os
 import numpy as np
 from scipy import linalg
-from scipy import sparse
+from modules import observables, options, profiling
 
+# solver methods and discretizations of the kinetic energy operator, which
+# can be selected by the user (defined with the command line options)
+METHODS = options.METHODS
+STENCILS = options.STENCILS
 
-def solv(xmin, xmax, npoint, mass, potential, first, last):
+# coefficients of the central differences for the second derivative,
+# starting with the center point
+_FD_COEFFS = {"fd2": (-2.0, 1.0),
+              "fd4": (-30/12, 16/12, -1/12),
+              "fd6": (-490/180, 270/180, -27/180, 2/180)}
+
+# limits used by select_method() for the automatic choice of the solver. For
+# the tridiagonal Hamiltonian of the harmonic oscillator (one core, OpenBLAS)
+# the tridiagonal solver took 0.6 s for the lowest 20 of 1e5 points, sparse
+# 1.1 s, and the tridiagonal solver was faster or equal for 5 to 30 states
+# up to 1e6 points, except for 30 states on 4e5 points.
+_DENSE_MAX_POINTS = 200
+_SPARSE_MIN_POINTS = 1000000
+_SPARSE_MAX_STATES = 30
+
+# smallest fraction of requested states, for which MRRR is used by the
+# tridiagonal solver instead of bisection and inverse iteration
+_MRRR_MIN_FRACTION = 0.1
+
+# smallest number of states per slice of the sliced solver and number of
+# states on both sides of a slice edge which are searched for the largest gap
+# and checked for orthogonality (the accepted overlap is N times the machine
+# precision)
+_SLICE_MIN_STATES = 50
+_SLICE_EDGE = 8
+
+# relative tolerance for detecting mirror symmetric problems
+_SYM_TOL = 1e-10
+
+
+def solv(grid, mass, first, last, method="auto", erange=None, symmetric=None,
+         stencil="fd2", k=None):
     """
     Routine for solving stationary Schroedinger equation
     in tridiagonal maxtrix form for a given potential.
 
     Args:
-        xmin (float): left value on x-axis.
-        xmax (float): right value on x-axis.
-        npoint (int): number of discretization points for x-axis.
-        potential (function): interpolated function.
+        grid (Grid): discretization points and potential.
         mass (float): particle mass.
+        first (int): first eigenvalue to calculate (counting from 1).
+        last (int): last eigenvalue to calculate.
+        method (string): eigensolver to use, either "tridiagonal", which works
+        on the diagonals only (on the bands for the wider stencils), "sparse"
+        (shift-invert Lanczos), "dense", "sliced" (tridiagonal solver on
+        slices of the spectrum in parallel, stencil "fd2" only, see
+        slice_spectrum) or "auto" (default) for choosing one by
+        select_method().
+        erange (tuple): if given, all eigenvalues in the energy window
+        [emin, emax) are calculated instead of the eigenvalues first to last.
+        symmetric (bool): if True, the problem is split into an even and an
+        odd problem of half size, which requires a mirror symmetric potential
+        and grid. None (default) detects the symmetry by is_symmetric().
+        Only available for the stencil "fd2".
+        stencil (string): discretization of the kinetic energy, one of
+        STENCILS (default: "fd2", the three point stencil).
+        k (float): if given, the grid is one period of a periodic potential
+        and the Bloch states of wavevector k are calculated instead of the
+        states between hard walls (see bloch_bands), k = 0 gives periodic
+        boundaries. Only available on uniform grids for the central
+        difference stencils, without energy window and symmetric split.
 
     Returns:
         eigen_val ((M,)array): eigenvalue of the given problem
-        eigen_vec ((M, M)array): corresponding eigenvectors
-        x_points (1d-array): coordinates for discretization points
+        eigen_vec ((N, M)array): corresponding eigenvectors, complex for
+        Bloch states with k*period not a multiple of pi
+    """
+    if k is not None:
+        if (not grid.uniform or stencil == "numerov" or erange is not None
+                or symmetric):
+            raise ValueError("Bloch boundaries are only available on uniform "
+                             "grids for the central difference stencils, "
+                             "without energy window and symmetric split.")
+        with profiling.stage("hamiltonian"):
+            bands, order = bloch_bands(grid, mass, k, stencil)
+        # the periodic ground state of a flat potential is at its minimum,
+        # the shift of the sparse solver stays below it
+        period = grid.npoint * grid.delta
+        with profiling.stage("eigensolver"):
+            eigen_val, eigen_vec = _solv_bands(
+                bands, first, last, method,
+                np.amin(grid.v_points) - 1/(mass*period**2))
+        return eigen_val, eigen_vec[order]
+    if stencil != "fd2" and not grid.uniform:
+        raise ValueError("Non-uniform grids are only available for the "
+                         "stencil fd2.")
+    if stencil == "numerov":
+        if erange is not None or symmetric:
+            raise ValueError("Energy windows and the symmetric split are not "
+                             "available for the Numerov stencil.")
+        with profiling.stage("eigensolver"):
+            return _solv_numerov(grid, mass, first, last, method)
+
+    with profiling.stage("hamiltonian"):
+        bands = hamiltonian(grid, mass, stencil)
+
+    if erange is not None:
+        # counting the states in the window before calculating any of them
+        first = _inertia_count(bands, erange[0]) + 1
+        last = _inertia_count(bands, erange[1])
+        if last < first:
+            return np.zeros(0), np.zeros((grid.npoint, 0))
+
+    if symmetric is None:
+        symmetric = stencil == "fd2" and is_symmetric(grid)
+    profiling.annotate(symmetric=bool(symmetric))
+    with profiling.stage("eigensolver"):
+        if symmetric:
+            if stencil != "fd2":
+                raise ValueError("The symmetric split is only available for "
+                                 "the stencil fd2.")
+            eigen_val, eigen_vec = _solv_symmetric(bands[0], bands[1], first,
+                                                   last, method,
+                                                   np.amin(grid.v_points))
+        else:
+            eigen_val, eigen_vec = _solv_bands(bands, first, last, method,
+                                               np.amin(grid.v_points))
+    if not grid.uniform:
+        # back transformation of the symmetrized problem
+        eigen_vec /= np.sqrt(grid.weights)[:, np.newaxis]
+    return eigen_val, eigen_vec
+
+
+def _solv_bands(bands, first, last, method, shift=None):
+    """
+    Solves the banded eigenvalue problem with the given eigensolver.
+
+    Args:
+        bands (list): main diagonal ((N,)array) and lower diagonals
+        ((N-k,)array) of the symmetric Hamiltonian.
+        first (int): first eigenvalue to calculate (counting from 1).
+        last (int): last eigenvalue to calculate.
+        method (string): eigensolver to use (see solv).
+        shift (float): lower bound of the spectrum used by the sparse solver.
+
+    Returns:
+        eigen_val ((M,)array): eigenvalues first to last
+        eigen_vec ((N, M)array): corresponding eigenvectors
+    """
+    if method == "auto":
+        method = select_method(len(bands[0]), first, last, len(bands) - 1)
+    profiling.annotate(solver=method)
+    if method == "tridiagonal":
+        return _solv_tridiagonal(bands, first, last)
+    if method == "dense":
+        return _solv_dense(bands, first, last)
+    if method == "sparse":
+        return _solv_sparse(bands, first, last, shift)
+    if method == "sliced":
+        if len(bands) != 2:
+            raise ValueError("The sliced solver is only available for the "
+                             "stencil fd2.")
+        return slice_spectrum(bands[0], bands[1], first, last)
+    raise ValueError("Unknown solver method '{}'.".format(method))
+
+
+def select_method(npoint, first, last, width=1):
+    """
+    Chooses the eigensolver for a problem of the given size.
+
+    Very small problems are solved densely. Shift-invert Lanczos only pays off
+    on large grids, if only a few of the lowest states are requested, since it
+    has to calculate all states up to the last one. Every other problem is
+    solved by the tridiagonal solver. For wider bands the reduction to
+    tridiagonal form is expensive, so Lanczos is used on all but the small
+    grids.
+
+    Args:
+        npoint (int): number of discretization points for x-axis.
+        first (int): first eigenvalue to calculate (counting from 1).
+        last (int): last eigenvalue to calculate.
+        width (int): number of sub diagonals of the Hamiltonian.
+
+    Returns:
+        method (string): name of the solver method
+    """
+    if npoint <= _DENSE_MAX_POINTS:
+        return "dense"
+    if width > 1 and last <= _SPARSE_MAX_STATES:
+        return "sparse"
+    if npoint >= _SPARSE_MIN_POINTS and last <= _SPARSE_MAX_STATES:
+        return "sparse"
+    return "tridiagonal"
+
+
+def sturm_count(diagonal_main, diagonal_sub, value):
+    """
+    Counts the eigenvalues of a symmetric tridiagonal matrix below a given
+    value by the number of sign changes of its Sturm sequence, i.e. the
+    negative pivots of the LDL^T factorization of (T - value).
+
+    Args:
+        diagonal_main ((N,)array): main diagonal
+        diagonal_sub ((N-1,)array): sub and super diagonal
+        value (float): upper limit for the eigenvalues to count.
+
+    Returns:
+        count (int): number of eigenvalues smaller than value
+    """
+    count = 0
+    pivot = 1.0
+    sub_sqr = [0.0] + (np.asarray(diagonal_sub)**2).tolist()
+    for diag, sub in zip(np.asarray(diagonal_main).tolist(), sub_sqr):
+        pivot = diag - value - sub / pivot
+        if pivot == 0.0:
+            pivot = -np.finfo(float).tiny
+        if pivot < 0.0:
+            count += 1
+    return count
+
+
+def slice_spectrum(diagonal_main, diagonal_sub, first, last, slices=None,
+                   workers=None):
+    """
+    Solves a symmetric tridiagonal eigenvalue problem for many states by
+    spectrum slicing: the index range first to last is split into slices,
+    which are solved concurrently by the tridiagonal solver on a pool of
+    worker processes. The workers are started fresh (spawn) with one BLAS
+    thread each and write their eigenvectors directly into a shared memory
+    block, so the eigenvectors are not sent back through pipes.
+
+    Every slice edge is moved to the largest gap among the eigenvalues next
+    to it, which are located by bisection of the Sturm sequence. Inverse
+    iteration orthogonalizes the states within one slice only, their overlap
+    with the states of other slices is about machine precision times the
+    norm of the matrix over the distance of the eigenvalues. So the states
+    on both sides of every edge are checked for orthogonality. If the check
+    fails, every slice is orthogonalized against the slices below it by a
+    block Gram-Schmidt step.
+
+    Args:
+        diagonal_main ((N,)array): main diagonal
+        diagonal_sub ((N-1,)array): sub and super diagonal
+        first (int): first eigenvalue to calculate (counting from 1).
+        last (int): last eigenvalue to calculate.
+        slices (int): number of slices (default: number of workers), every
+        slice has at least _SLICE_MIN_STATES states.
+        workers (int): number of worker processes (default: number of
+        cores), a single worker solves the slices in the calling process.
+
+    Returns:
+        eigen_val ((M,)array): eigenvalues first to last
+        eigen_vec ((N, M)array): corresponding eigenvectors
+    """
+    bands = [diagonal_main, diagonal_sub]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if slices is None:
+        slices = workers
+    slices = max(1, min(slices, (last - first + 1) // _SLICE_MIN_STATES))
+    profiling.annotate(slices=slices)
+    if slices == 1:
+        return _solv_tridiagonal(bands, first, last)
+
+    nominal = np.linspace(first, last + 1, slices + 1).round().astype(int)
+    edges = ([first] + [_slice_edge(bands, edge, first, last)
+                        for edge in nominal[1:-1]] + [last + 1])
+    offsets = [edge - first for edge in edges]
+    shape = (len(diagonal_main), last - first + 1)
+    eigen_val = np.empty(shape[1])
+    if workers == 1:
+        eigen_vec = np.empty(shape)
+        for lower, upper in zip(edges, edges[1:]):
+            values, vectors = _solv_tridiagonal(bands, lower, upper - 1)
+            eigen_val[lower - first:upper - first] = values
+            eigen_vec[:, lower - first:upper - first] = vectors
+    else:
+        eigen_vec = _solv_slices(bands, edges, shape, min(workers, slices),
+                                 eigen_val)
+
+    tol = shape[0] * np.finfo(float).eps
+    if max(_edge_overlap(eigen_vec, edge, offsets)
+           for edge in offsets[1:-1]) > tol:
+        for lower, upper in zip(offsets[1:-1], offsets[2:]):
+            block = eigen_vec[:, lower:upper]
+            block -= eigen_vec[:, :lower] @ (eigen_vec[:, :lower].T @ block)
+            block /= np.linalg.norm(block, axis=0)
+    return eigen_val, eigen_vec
+
+
+def _solv_slices(bands, edges, shape, workers, eigen_val):
     """
-    # creating true symmetric tridiagonal matrix
-    x_points = np.linspace(xmin, xmax, npoint)
-    delta = np.abs(x_points[1] - x_points[0])
-    diagonal_main = np.array([1/(mass*delta**2) + potential(ii) for ii in x_points])
-    diagonal_sub = -1/(2*mass*delta**2)*np.ones(npoint, dtype=float)
-    diags = np.array([diagonal_main, diagonal_sub, diagonal_sub])
-    positions = np.array([0, -1, 1])
-    tridiagonal = sparse.spdiags(diags, positions, npoint, npoint).toarray()
+    Solves the slices between the edges on a pool of worker processes, which
+    write the eigenvectors into shared memory. The eigenvalues are stored in
+    eigen_val, the eigenvectors are returned.
+    """
+    from multiprocessing import shared_memory
+    from modules import parallel
+
+    first = edges[0]
+    memory = shared_memory.SharedMemory(create=True,
+                                        size=8 * shape[0] * shape[1])
+    try:
+        tasks = [(memory.name, shape, bands, lower, upper - 1, lower - first)
+                 for lower, upper in zip(edges, edges[1:])]
+        with parallel.pool(workers) as pool:
+            # the workers are started on demand, while the tasks are submitted
+            with parallel.blas_threads(1):
+                results = pool.map(_solv_slice, tasks)
+            for task, values in zip(tasks, results):
+                eigen_val[task[5]:task[5] + len(values)] = values
+        return np.ndarray(shape, buffer=memory.buf).copy()
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def _solv_slice(task):
+    """Worker function, solves a slice into the shared eigenvectors."""
+    from multiprocessing import shared_memory
+
+    name, shape, bands, lower, upper, offset = task
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        values, vectors = _solv_tridiagonal(bands, lower, upper)
+        target = np.ndarray(shape, buffer=memory.buf)
+        target[:, offset:offset + len(values)] = vectors
+        del target
+    finally:
+        memory.close()
+    return values
+
+
+def _slice_edge(bands, edge, first, last):
+    """
+    Moves a slice edge (the first state of the upper slice) to the largest
+    gap among the eigenvalues around it, located by Sturm sequence bisection.
+    """
+    lower = max(first + 1, edge - _SLICE_EDGE // 2)
+    upper = min(last, edge + _SLICE_EDGE // 2)
+    values = linalg.eigvalsh_tridiagonal(bands[0], bands[1], select='i',
+                                         select_range=(lower - 2, upper - 1),
+                                         lapack_driver='stebz')
+    return lower + int(np.argmax(np.diff(values)))
+
+
+def _edge_overlap(eigen_vec, edge, offsets):
+    """
+    Largest overlap of the states on both sides of a slice edge, up to
+    _SLICE_EDGE states on either side.
+    """
+    lower = max(offsets[0], edge - _SLICE_EDGE)
+    upper = min(offsets[-1], edge + _SLICE_EDGE)
+    overlap = eigen_vec[:, lower:edge].T @ eigen_vec[:, edge:upper]
+    return np.amax(np.abs(overlap))
+
+
+def _inertia_count(bands, value):
+    """
+    Counts the eigenvalues of a symmetric banded matrix below a given value
+    by the number of negative pivots of the LDL^T factorization of
+    (H - value). For tridiagonal matrices this is the Sturm sequence count.
+
+    Args:
+        bands (list): main diagonal ((N,)array) and lower diagonals
+        ((N-k,)array) of the symmetric matrix.
+        value (float): upper limit for the eigenvalues to count.
+
+    Returns:
+        count (int): number of eigenvalues smaller than value
+    """
+    if len(bands) == 2:
+        return sturm_count(bands[0], bands[1], value)
+
+    width = len(bands) - 1
+    bands = [np.asarray(band).tolist() for band in bands]
+    pivots = []
+    lower = []
+    count = 0
+    for jj in range(len(bands[0])):
+        # row jj of the unit lower triangular factor L
+        row = {}
+        for ii in range(max(0, jj - width), jj):
+            value_ji = bands[jj - ii][ii]
+            for kk in range(max(0, jj - width), ii):
+                value_ji -= row[kk] * pivots[kk] * lower[ii].get(kk, 0.0)
+            row[ii] = value_ji / pivots[ii]
+        pivot = bands[0][jj] - value
+        for ii, value_ji in row.items():
+            pivot -= value_ji**2 * pivots[ii]
+        if pivot == 0.0:
+            pivot = -np.finfo(float).tiny
+        if pivot < 0.0:
+            count += 1
+        pivots.append(pivot)
+        lower.append(row)
+    return count
+
+
+def is_symmetric(grid):
+    """
+    Checks if grid and potential are mirror symmetric, i.e. the points are
+    symmetric to x = 0 and V(x) = V(-x) on all discretization points.
 
-    # solving tridiagonal matrix
-    eigen_val, eigen_vec = linalg.eigh(tridiagonal, eigvals=(first - 1, last - 1))
-    return eigen_val, eigen_vec, x_points
+    Args:
+        grid (Grid): discretization points and potential.
+
+    Returns:
+        symmetric (bool): True if the problem is mirror symmetric
+    """
+    scale = max(np.abs(grid.xmin), np.abs(grid.xmax))
+    if not np.allclose(grid.x_points, -grid.x_points[::-1], rtol=0,
+                       atol=_SYM_TOL * scale):
+        return False
+    scale = max(1.0, np.amax(np.abs(grid.v_points)))
+    return np.allclose(grid.v_points, grid.v_points[::-1], rtol=0,
+                       atol=_SYM_TOL * scale)
 
 
-def norm(eigenvectors, xmin, xmax, npoint):
+def _solv_symmetric(diagonal_main, diagonal_sub, first, last, method,
+                    shift=None):
+    """
+    Solves the tridiagonal eigenvalue problem of a mirror symmetric potential
+    as two problems of half size, one for the even and one for the odd
+    states. The states of a 1d problem alternate between even and odd, so
+    state n is the ((n+1)/2)th even or the (n/2)th odd state.
+
+    The half problems are set up on the right half of the grid. If the center
+    point x=0 is part of the grid, it belongs to the even problem only, and
+    its coupling is scaled by sqrt(2) to keep the problem symmetric.
+    Otherwise the two center points are coupled with each other, which
+    shifts the first diagonal element of the even (odd) problem by +(-) the
+    sub diagonal.
+
+    Args:
+        diagonal_main ((N,)array): main diagonal
+        diagonal_sub ((N-1,)array): sub and super diagonal
+        first (int): first eigenvalue to calculate (counting from 1).
+        last (int): last eigenvalue to calculate.
+        method (string): eigensolver to use for the half problems.
+        shift (float): lower bound of the spectrum used by the sparse solver.
+
+    Returns:
+        eigen_val ((M,)array): eigenvalues first to last
+        eigen_vec ((N, M)array): corresponding eigenvectors
+    """
+    npoint = len(diagonal_main)
+    center = npoint // 2
+    if npoint % 2:
+        even_main = diagonal_main[center:]
+        even_sub = diagonal_sub[center:].copy()
+        even_sub[0] *= np.sqrt(2)
+        odd_main = diagonal_main[center + 1:]
+        odd_sub = diagonal_sub[center + 1:]
+    else:
+        even_main = diagonal_main[center:].copy()
+        even_main[0] += diagonal_sub[center - 1]
+        odd_main = diagonal_main[center:].copy()
+        odd_main[0] -= diagonal_sub[center - 1]
+        even_sub = odd_sub = diagonal_sub[center:]
+
+    even_val, even_half = _solv_half(even_main, even_sub, first // 2 + 1,
+                                     (last + 1) // 2, method, shift)
+    odd_val, odd_half = _solv_half(odd_main, odd_sub, (first + 1) // 2,
+                                   last // 2, method, shift)
+
+    # unfolding the half vectors onto the full grid
+    even_vec = np.empty((npoint, len(even_val)))
+    even_vec[center:] = even_half
+    odd_vec = np.zeros((npoint, len(odd_val)))
+    odd_vec[npoint - len(odd_half):] = odd_half
+    if npoint % 2:
+        even_vec[center] *= np.sqrt(2)
+        even_vec[:center] = even_half[:0:-1]
+    else:
+        even_vec[:center] = even_half[::-1]
+    odd_vec[:center] = -odd_half[::-1]
+
+    eigen_val = np.concatenate((even_val, odd_val))
+    order = np.argsort(eigen_val, kind="stable")
+    eigen_vec = np.hstack((even_vec, odd_vec))[:, order] / np.sqrt(2)
+    return eigen_val[order], eigen_vec
+
+
+def _solv_half(diagonal_main, diagonal_sub, first, last, method, shift):
+    """
+    Solves one of the half problems of _solv_symmetric, which may have no
+    state inside the requested range.
+
+    Args:
+        diagonal_main ((N,)array): main diagonal
+        diagonal_sub ((N-1,)array): sub and super diagonal
+        first (int): first eigenvalue to calculate (counting from 1).
+        last (int): last eigenvalue to calculate.
+        method (string): eigensolver to use.
+        shift (float): lower bound of the spectrum used by the sparse solver.
+
+    Returns:
+        eigen_val ((M,)array): eigenvalues first to last
+        eigen_vec ((N, M)array): corresponding eigenvectors
+    """
+    if last < first:
+        return np.zeros(0), np.zeros((len(diagonal_main), 0))
+    return _solv_bands([diagonal_main, diagonal_sub], first, last, method,
+                       shift)
+
+
+def hamiltonian(grid, mass, stencil="fd2"):
+    """
+    Creates the bands of the true symmetric Hamiltonian for a central
+    difference stencil of the kinetic energy. For the three point stencil
+    these are the main and sub diagonal of a tridiagonal matrix. The bands
+    are the input of the eigensolvers, of the continuation and of the time
+    propagation, band_matrix assembles them into a sparse matrix.
+
+    On a non-uniform grid with spacings h and quadrature weights w, the three
+    point stencil gives the generalized problem K psi + W V psi = E W psi
+    with the symmetric matrix K = (1/2m) [-1/h_j-1, 1/h_j-1 + 1/h_j, -1/h_j].
+    It is symmetrized to W^-1/2 K W^-1/2 + V for phi = W^1/2 psi.
+
+    The wider stencils reach beyond the hard walls at xmin - delta and
+    xmax + delta. The wavefunction is continued there as odd mirror image,
+    which keeps the order of the stencil up to the walls.
+
+    Args:
+        grid (Grid): discretization points and potential.
+        mass (float): particle mass.
+        stencil (string): "fd2", "fd4" or "fd6".
+
+    Returns:
+        bands (list): main diagonal ((N,)array) and lower diagonals
+        ((N-k,)array)
+    """
+    try:
+        coeffs = _FD_COEFFS[stencil]
+    except KeyError:
+        raise ValueError("Unknown stencil '{}'.".format(stencil)) from None
+    if not grid.uniform:
+        inverse = 1/(2*mass*grid.spacing)
+        sqrt_weights = np.sqrt(grid.weights)
+        diagonal_main = (inverse[:-1] + inverse[1:])/grid.weights + grid.v_points
+        diagonal_sub = -inverse[1:-1]/(sqrt_weights[:-1]*sqrt_weights[1:])
+        return [diagonal_main, diagonal_sub]
+
+    npoint = grid.npoint
+    kinetic = -1/(2*mass*grid.delta**2)
+    bands = [kinetic*coeffs[0] + grid.v_points]
+    for kk, coeff in enumerate(coeffs[1:], 1):
+        bands.append(kinetic*coeff*np.ones(npoint - kk, dtype=float))
+
+    # point jj - kk <= -2 is the mirror image of point kk - jj - 2 >= 0
+    for kk in range(2, len(coeffs)):
+        for jj in range(kk - 1):
+            mirror = kk - jj - 2
+            if mirror <= jj:
+                bands[jj - mirror][mirror] -= kinetic*coeffs[kk]
+                bands[jj - mirror][npoint - 1 - jj] -= kinetic*coeffs[kk]
+    return bands
+
+
+def bloch_bands(grid, mass, k, stencil="fd2"):
+    """
+    Creates the bands of the Hamiltonian of a periodic potential with Bloch
+    boundaries psi(x + L) = exp(i k L) psi(x). The grid is one period
+    L = N*delta of the potential, so the point after the last one is the
+    first point of the next period (see bands.periodic_grid).
+
+    The stencil couples the points at both ends of the period with the Bloch
+    phase, which makes the matrix cyclic. Interleaving the points from both
+    ends in the order 0, N-1, 1, N-2, ... turns it into a Hermitian band
+    matrix of twice the width, which is solved like the bands of the hard
+    wall problem without setting up a dense matrix.
+
+    Args:
+        grid (Grid): discretization points and potential of one period.
+        mass (float): particle mass.
+        k (float): wavevector of the Bloch states.
+        stencil (string): "fd2", "fd4" or "fd6".
+
+    Returns:
+        bands (list): main diagonal ((N,)array) and lower diagonals
+        ((N-k,)array) of the interleaved Hamiltonian, complex unless k*L is a
+        multiple of pi
+        order ((N,)int array): position of every grid point in the
+        interleaved order
+    """
+    try:
+        coeffs = _FD_COEFFS[stencil]
+    except KeyError:
+        raise ValueError("Unknown stencil '{}'.".format(stencil)) from None
+    npoint = grid.npoint
+    width = len(coeffs) - 1
+    if npoint <= 2*width:
+        raise ValueError("A period needs more than {} points for the stencil "
+                         "{}.".format(2*width, stencil))
+    phase = np.exp(1j*k*npoint*grid.delta)
+    if abs(phase.imag) < 1e-14:
+        phase = np.sign(phase.real)
+
+    half = (npoint + 1) // 2
+    order = np.empty(npoint, dtype=int)
+    order[:half] = 2*np.arange(half)
+    order[half:] = 2*np.arange(npoint - half)[::-1] + 1
+
+    kinetic = -1/(2*mass*grid.delta**2)
+    bands = [np.empty(npoint)]
+    bands[0][order] = kinetic*coeffs[0] + grid.v_points
+    bands += [np.zeros(npoint - kk, dtype=np.result_type(phase, float))
+              for kk in range(1, 2*width + 1)]
+    for kk, coeff in enumerate(coeffs[1:], 1):
+        # couplings H[j + kk, j] inside the period and H[j, j + kk - N]
+        # to the next period
+        rows = np.concatenate((np.arange(kk, npoint),
+                               np.arange(npoint - kk, npoint)))
+        cols = np.concatenate((np.arange(npoint - kk),
+                               np.arange(kk)))
+        values = np.full(npoint, kinetic*coeff, dtype=bands[1].dtype)
+        values[npoint - kk:] *= phase
+        rows, cols = order[rows], order[cols]
+        lower = rows > cols
+        values = np.where(lower, values, np.conj(values))
+        rows, cols = np.where(lower, rows, cols), np.where(lower, cols, rows)
+        for distance in np.unique(rows - cols):
+            select = rows - cols == distance
+            bands[distance][cols[select]] = values[select]
+    return bands, order
+
+
+def _solv_tridiagonal(bands, first, last):
+    """
+    Solves the tridiagonal eigenvalue problem directly on its diagonals,
+    without setting up the full matrix. SciPy's MRRR driver allocates a
+    full N x N workspace for the eigenvectors, so it is only used if a large
+    part of the spectrum is requested. Otherwise the states are calculated
+    by bisection and inverse iteration. Wider banded problems are reduced to
+    tridiagonal form by LAPACK and solved by bisection.
+
+    Args:
+        bands (list): main diagonal ((N,)array) and lower diagonals
+        ((N-k,)array) of the symmetric Hamiltonian.
+        first (int): first eigenvalue to calculate (counting from 1).
+        last (int): last eigenvalue to calculate.
+
+    Returns:
+        eigen_val ((M,)array): eigenvalues first to last
+        eigen_vec ((N, M)array): corresponding eigenvectors
+    """
+    npoint = len(bands[0])
+    if len(bands) == 2:
+        if last - first + 1 >= _MRRR_MIN_FRACTION * npoint:
+            driver = 'stemr'
+        else:
+            driver = 'stebz'
+        return linalg.eigh_tridiagonal(bands[0], bands[1], select='i',
+                                       select_range=(first - 1, last - 1),
+                                       lapack_driver=driver)
+    a_band = np.zeros((len(bands), npoint), dtype=np.result_type(*bands))
+    for kk, band in enumerate(bands):
+        a_band[kk, :npoint - kk] = band
+    return linalg.eig_banded(a_band, lower=True, select='i',
+                             select_range=(first - 1, last - 1))
+
+
+def _solv_dense(bands, first, last):
+    """
+    Solves the banded eigenvalue problem as a dense matrix.
+
+    Args:
+        bands (list): main diagonal ((N,)array) and lower diagonals
+        ((N-k,)array) of the symmetric Hamiltonian.
+        first (int): first eigenvalue to calculate (counting from 1).
+        last (int): last eigenvalue to calculate.
+
+    Returns:
+        eigen_val ((M,)array): eigenvalues first to last
+        eigen_vec ((N, M)array): corresponding eigenvectors
+    """
+    hamiltonian = band_matrix(bands).toarray()
+    return linalg.eigh(hamiltonian, subset_by_index=[first - 1, last - 1])
+
+
+def _solv_sparse(bands, first, last, shift=None):
+    """
+    Solves the banded eigenvalue problem in sparse form with
+    shift-invert Lanczos. The shift has to be placed below the lowest
+    eigenvalue, so the lowest eigenvalues are found first. The kinetic
+    energy operators are positive, so the potential minimum is a sharp
+    choice. Without a given shift, the lower Gershgorin bound of the
+    spectrum is used.
+
+    Args:
+        bands (list): main diagonal ((N,)array) and lower diagonals
+        ((N-k,)array) of the symmetric Hamiltonian.
+        first (int): first eigenvalue to calculate (counting from 1).
+        last (int): last eigenvalue to calculate.
+        shift (float): lower bound of the spectrum.
+
+    Returns:
+        eigen_val ((M,)array): eigenvalues first to last
+        eigen_vec ((N, M)array): corresponding eigenvectors
+    """
+    # scipy.sparse is imported on first use of the sparse solvers only
+    from scipy.sparse import linalg as sparse_linalg
+
+    hamiltonian = band_matrix(bands, "csc")
+    if shift is None:
+        radius = np.zeros(len(bands[0]))
+        for kk, band in enumerate(bands[1:], 1):
+            radius[:-kk] += np.abs(band)
+            radius[kk:] += np.abs(band)
+        shift = np.amin(bands[0] - radius)
+    eigen_val, eigen_vec = sparse_linalg.eigsh(hamiltonian, k=last,
+                                               sigma=shift, which="LM")
+    order = np.argsort(eigen_val)[first - 1:]
+    return eigen_val[order], eigen_vec[:, order]
+
+
+def band_matrix(bands, fmt=None):
+    """
+    Creates the sparse symmetric (Hermitian) matrix of the given bands, e.g.
+    of the Hamiltonian (see hamiltonian) or of the Bloch Hamiltonian (see
+    bloch_bands).
+
+    Args:
+        bands (list): main diagonal ((N,)array) and lower diagonals
+        ((N-k,)array) of the symmetric (Hermitian) matrix.
+        fmt (string): sparse format of the matrix.
+
+    Returns:
+        matrix (sparse matrix): symmetric (Hermitian) (N, N) matrix
+    """
+    from scipy import sparse
+
+    npoint = len(bands[0])
+    offsets = list(range(-len(bands) + 1, len(bands)))
+    upper = [np.conj(band) for band in bands[1:]]
+    return sparse.diags(bands[:0:-1] + bands[:1] + upper, offsets,
+                        shape=(npoint, npoint), format=fmt)
+
+
+def _solv_numerov(grid, mass, first, last, method):
+    """
+    Solves the Schroedinger equation with the Numerov method. With the
+    tridiagonal matrices A = (1, -2, 1)/delta**2 and B = (1, 10, 1)/12 it
+    reads as the generalized eigenvalue problem
+
+        (-A/(2*mass) + B V) psi = E B psi,
+
+    which is equivalent to the symmetric standard problem
+    (-B^-1 A/(2*mass) + V) psi = E psi, since A and B commute. Only A and B
+    are stored, the shift-invert Lanczos iteration solves with the sparse
+    LU factorization of the tridiagonal pencil.
+
+    Args:
+        grid (Grid): discretization points and potential.
+        mass (float): particle mass.
+        first (int): first eigenvalue to calculate (counting from 1).
+        last (int): last eigenvalue to calculate.
+        method (string): "sparse", "dense" or "auto" for sparse, if not more
+        than a few states are requested.
+
+    Returns:
+        eigen_val ((M,)array): eigenvalues first to last
+        eigen_vec ((N, M)array): corresponding eigenvectors
+    """
+    from scipy import sparse
+    from scipy.sparse import linalg as sparse_linalg
+
+    npoint = grid.npoint
+    v_points = grid.v_points
+    kinetic = -1/(2*mass*grid.delta**2)
+    kin_bands = [-2*kinetic*np.ones(npoint), kinetic*np.ones(npoint - 1)]
+    num_bands = [10/12*np.ones(npoint), 1/12*np.ones(npoint - 1)]
+    num_ab = np.array([np.append(0.0, num_bands[1]), num_bands[0],
+                       np.append(num_bands[1], 0.0)])
+    kin_matrix = band_matrix(kin_bands, "csc")
+
+    if method == "auto":
+        method = "sparse" if last <= _SPARSE_MAX_STATES else "dense"
+    profiling.annotate(solver=method)
+    if method == "dense":
+        hamiltonian = linalg.solve_banded((1, 1), num_ab, kin_matrix.toarray())
+        hamiltonian = 0.5 * (hamiltonian + hamiltonian.T)
+        hamiltonian[np.diag_indices(npoint)] += v_points
+        return linalg.eigh(hamiltonian, subset_by_index=[first - 1, last - 1])
+    if method != "sparse":
+        raise ValueError("The Numerov stencil can only be solved by the "
+                         "dense or sparse solver.")
+
+    # B^-1 A is positive, so the potential minimum is below the spectrum
+    shift = np.amin(v_points)
+    num_matrix = band_matrix(num_bands, "csc")
+    pencil = sparse_linalg.splu(
+        (kin_matrix + num_matrix @ sparse.diags(v_points - shift)).tocsc())
+
+    def matvec(vec):
+        vec = np.ravel(vec)
+        return linalg.solve_banded((1, 1), num_ab, kin_matrix @ vec) + v_points * vec
+
+    def opinv_matvec(vec):
+        return pencil.solve(num_matrix @ np.ravel(vec))
+
+    hamiltonian = sparse_linalg.LinearOperator((npoint, npoint), matvec=matvec,
+                                               dtype=float)
+    opinv = sparse_linalg.LinearOperator((npoint, npoint), matvec=opinv_matvec,
+                                         dtype=float)
+    eigen_val, eigen_vec = sparse_linalg.eigsh(hamiltonian, k=last,
+                                               sigma=shift, which="LM",
+                                               OPinv=opinv)
+    order = np.argsort(eigen_val)[first - 1:]
+    return eigen_val[order], eigen_vec[:, order]
+
+
+def fingerprint(grid, mass, stencil="fd2"):
+    """
+    Calculates a fingerprint of the Hamiltonian, the SHA-256 hash of the
+    discretization points, the potential at these points, the mass and the
+    stencil.
+
+    Args:
+        grid (Grid): discretization points and potential.
+        mass (float): particle mass.
+        stencil (string): discretization of the kinetic energy.
+
+    Returns:
+        fingerprint (string): hexadecimal hash of the Hamiltonian
+    """
+    sha = hashlib.sha256()
+    sha.update(np.ascontiguousarray(grid.x_points, dtype=float).tobytes())
+    sha.update(np.ascontiguousarray(grid.v_points, dtype=float).tobytes())
+    sha.update(float(mass).hex().encode())
+    sha.update(stencil.encode())
+    return sha.hexdigest()
+
+
+def extend(grid, mass, first, last, previous, method="auto", stencil="fd2"):
+    """
+    Calculates the eigenvalues first to last by reusing the eigenpairs of a
+    previous solution of the same Hamiltonian. Only the missing states below
+    and above the previous range are calculated with the index selection of
+    the eigensolver, and they are orthogonalized against the reused states,
+    which matters for nearly degenerate states at the borders of the ranges.
+
+    Args:
+        grid (Grid): discretization points and potential.
+        mass (float): particle mass.
+        first (int): first eigenvalue to calculate (counting from 1).
+        last (int): last eigenvalue to calculate.
+        previous (tuple): first index (int), eigenvalues ((K,)array),
+        eigenvectors ((N, K)array) and Hamiltonian fingerprint (string, see
+        fingerprint) of the previous solution.
+        method (string): eigensolver to use (see solv).
+        stencil (string): discretization of the kinetic energy (see solv).
+
+    Returns:
+        eigen_val ((M,)array): eigenvalues first to last
+        eigen_vec ((N, M)array): corresponding eigenvectors, normalized as
+        by norm
+    """
+    prev_first, prev_val, prev_vec, prev_print = previous
+    if prev_print != fingerprint(grid, mass, stencil):
+        raise ValueError("The previous solution belongs to a different "
+                         "Hamiltonian.")
+    low = max(first, prev_first)
+    high = min(last, prev_first + len(prev_val) - 1)
+    if high < low:
+        return solv(grid, mass, first, last, method, stencil=stencil)
+
+    keep = slice(low - prev_first, high - prev_first + 1)
+    reused = observables.normalize(np.array(prev_vec[:, keep], dtype=float),
+                                   grid)
+    values, vectors = [], []
+    for part_first, part_last in ((first, low - 1), (high + 1, last)):
+        if part_first > part_last:
+            continue
+        part_val, part_vec = solv(grid, mass, part_first, part_last, method,
+                                  stencil=stencil)
+        part_vec -= reused @ (reused.T @ (grid.weights[:, np.newaxis]
+                                          * part_vec))
+        values.append(part_val)
+        vectors.append(observables.normalize(part_vec, grid))
+    values.insert(int(first < low), prev_val[keep])
+    vectors.insert(int(first < low), reused)
+    return np.concatenate(values), np.hstack(vectors)
+
+
+def norm(eigenvectors, grid):
     """
     Routine for normalizing the eigenvectors of the given qm problem.
+    The eigenvectors are normalized in place.
 
     Args:
         eigenvectors (array): eigenvectors of the given qm problem.
-        xmin (float): left value on x-axis.
-        xmax (float): right value on x-axis.
-        npoint (int): number of discretization points for x-axis.
+        grid (Grid): discretization points and potential.
 
     Returns:
         w_func (array): corresponding normalized wavefunctions
     """
-    x_points = np.linspace(xmin, xmax, npoint)
-    delta = np.abs(x_points[1] - x_points[0])
-    w_func = np.ones(eigenvectors.shape, dtype=float)
-    for ii in range(0, len(eigenvectors[0])):
-        norm_factor = 1/np.sqrt(sum(np.abs(eigenvectors[:, ii])**2)*delta)
-        w_func[:, ii] = np.array([norm_factor*eigenvectors[:, ii]])
-
-    return w_func
+    return observables.normalize(eigenvectors, grid)
 
 
-def exp_val(w_func, xmin, xmax, npoint):
+def exp_val(w_func, grid):
     r"""
     Routine for calculating expectation values $\Delta x$ and
     position uncertainty $\sigma$.
 
         Args:
             w_func (array): normalized eigenvectors.
-            xmin (float): left value on x-axis.
-            xmax (float): right value on x-axis.
-            npoint (int): number of discretization points for x-axis.
+            grid (Grid): discretization points and potential.
 
         Returns:
             exp_x (1d-array): expectation values
             unc_x (1d-array): position uncertainty
     """
-    x_points = np.linspace(xmin, xmax, npoint)
-    delta = np.abs(x_points[1] - x_points[0])
-    exp_x = np.ones(len(w_func[0]))
-    exp_x_sqrt = np.ones(len(w_func[0]))
-
-    for ii in range(0, len(w_func[0])):
-        exp_x[ii] = delta * np.sum(w_func[:, ii] * x_points * w_func[:, ii])
-        exp_x_sqrt[ii] = delta * np.sum(w_func[:, ii]**2 * x_points**2)
-
-    unc_x = np.sqrt(exp_x_sqrt - exp_x**2)
-
-    return exp_x, unc_x
+    result = observables.observables(w_func, grid, which=("x", "sigma_x"))
+    return result["x"], result["sigma_x"]
@@ -0,0 +1,177 @@
+"""
+Module containing a parameter sweep, which solves many variants of one input
+file on a pool of worker processes.
+"""
+
+import copy
+import itertools
+import os
+import re
+from concurrent import futures
+import numpy as np
+from modules import grid, parallel, potentials, solver
+
+# parameters of the input file which can be varied, support points are
+# addressed as x_decl[i] and y_decl[i]
+PARAMETERS = ("mass", "xMin", "xMax", "nPoint", "first", "last",
+              "interpol_method", "solver", "stencil")
+_SUPPORT_POINT = re.compile(r"^([xy]_decl)\[(\d+)\]$")
+
+# base parameters of the sweep in a worker process (see _set_base)
+_base_parameter = None
+
+
+def expand(values):
+    """
+    Expands a parameter grid into the list of all combinations.
+
+    Args:
+        values (dictionary): list of values for every parameter name.
+
+    Returns:
+        cases (list): dictionary of parameter values for every combination,
+        the last parameter varies fastest
+    """
+    names = list(values)
+    return [dict(zip(names, combination))
+            for combination in itertools.product(*values.values())]
+
+
+def convert(parameter, name, value):
+    """
+    Converts a value given as string to the type of the parameter.
+
+    Args:
+        parameter (dictionary): parameters of the base input file.
+        name (string): parameter name (see PARAMETERS) or support point.
+        value (string): value of the parameter.
+
+    Returns:
+        value: value of the parameter with the type of the base input
+    """
+    if _SUPPORT_POINT.match(name):
+        return float(value)
+    if name not in PARAMETERS:
+        raise ValueError("Parameter '{}' can not be varied.".format(name))
+    return type(parameter[name])(value)
+
+
+def apply_case(parameter, case):
+    """
+    Creates the parameters of one case of the sweep.
+
+    Args:
+        parameter (dictionary): parameters of the base input file.
+        case (dictionary): values of the varied parameters.
+
+    Returns:
+        parameter (dictionary): copy of the base parameters with the values of
+        the case
+    """
+    parameter = copy.copy(parameter)
+    for name, value in case.items():
+        match = _SUPPORT_POINT.match(name)
+        if match:
+            # the declarations may be a read-only memory-mapped table
+            decl = np.array(parameter[match.group(1)], dtype=float)
+            decl[int(match.group(2))] = value
+            parameter[match.group(1)] = decl
+        elif name in PARAMETERS:
+            parameter[name] = value
+        else:
+            raise ValueError("Parameter '{}' can not be varied.".format(name))
+    return parameter
+
+
+def solve_case(parameter):
+    """
+    Solves one case on a uniform grid and calculates the expectation values.
+
+    Args:
+        parameter (dictionary): parameters of the case (see in_and_out.read_inp).
+
+    Returns:
+        energy ((M,)array): energy eigenvalues
+        exp_x ((M,)array): expectation values of the position
+        unc_x ((M,)array): position uncertainties
+    """
+    if parameter.get('grid') is not None:
+        raise ValueError("The sweep supports uniform grids only.")
+    int_pot = potentials.potential(parameter)
+    disc = grid.Grid(parameter['xMin'], parameter['xMax'], parameter['nPoint'],
+                     int_pot)
+    energy, eigenvector = solver.solv(disc, parameter['mass'],
+                                      parameter['first'], parameter['last'],
+                                      parameter['solver'],
+                                      parameter['window'],
+                                      stencil=parameter['stencil'])
+    w_function = solver.norm(eigenvector, disc)
+    exp_x, unc_x = solver.exp_val(w_function, disc)
+    return energy, exp_x, unc_x
+
+
+def _set_base(parameter):
+    """Worker initializer, keeps the base parameters of the sweep."""
+    global _base_parameter
+    _base_parameter = parameter
+
+
+def _run_case(task, parameter=None):
+    """
+    Worker function, returns the result or the error message of a case. The
+    base parameters default to the ones passed to the worker at its start.
+    """
+    index, case = task
+    if parameter is None:
+        parameter = _base_parameter
+    try:
+        return index, case, solve_case(apply_case(parameter, case)), None
+    except Exception as error:  # every failure is reported per case
+        return index, case, None, "{}: {}".format(type(error).__name__, error)
+
+
+def sweep(parameter, cases, workers=None, blas_threads=1):
+    """
+    Solves all cases of a parameter sweep on a pool of worker processes. The
+    results are yielded as soon as a case is finished, so the order differs
+    from the order of the cases. A failing case does not stop the sweep, its
+    error message is returned instead of the result.
+
+    The workers are started fresh (spawn) with the BLAS thread limit set in
+    their environment, so the workers do not oversubscribe the cores. The
+    base parameters, including the tables of the potential, are sent to every
+    worker once at its start, the tasks carry only the varied values.
+
+    Args:
+        parameter (dictionary): parameters of the base input file.
+        cases (list): dictionary of varied parameter values for every case
+        (see expand).
+        workers (int): number of worker processes (default: number of cores),
+        a single worker solves all cases in the calling process.
+        blas_threads (int): number of BLAS threads per worker.
+
+    Yields:
+        index (int): number of the case in cases
+        case (dictionary): varied parameter values of the case
+        result (tuple): energy, exp_x and unc_x (see solve_case), None if the
+        case failed
+        error (string): error message of a failed case, None otherwise
+    """
+    tasks = list(enumerate(cases))
+    if workers is None:
+        workers = os.cpu_count()
+    if workers == 1:
+        for task in tasks:
+            yield _run_case(task, parameter)
+        return
+    with parallel.pool(min(workers, max(1, len(tasks))), _set_base,
+                       (parameter,)) as pool:
+        # the workers are started on demand, while the tasks are submitted
+        with parallel.blas_threads(blas_threads):
+            pending = [pool.submit(_run_case, task) for task in tasks]
+        try:
+            for future in futures.as_completed(pending):
+                yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
@@ -6,6 +6,14 @@ solution. Calculations of reference eigenvalues for infinite square well and
 the harmonic oscillator are based on known analytic solution. Other reference
 files were numerically calculated.
 """
+import asyncio
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
 import numpy as np
 import pytest
 import modules
@@ -16,6 +24,21 @@ EXAMPLES = ['infinite_potential_well', 'finite_potential_well',
 
 _TOLERANCE = 1e-15
 
+# Relative tolerances of the energies. The references of the infinite well
+# and of the harmonic oscillator are the analytic continuum values, which the
+# 3-point discretization reproduces only up to a relative error of 2e-3 and
+# 1.4e-5. The other references are numerical and agree up to 1e-10.
+_ENERGY_RTOL = {'infinite_potential_well': 5e-3,
+                'finite_potential_well': 1e-9,
+                'double_linear': 1e-9,
+                'harmonic_potential_well': 5e-5,
+                'double_cubic_spline': 1e-9,
+                'asym_potential_well': 1e-9}
+
+# The norm of the Hamiltonians is about 1/(mass*delta**2) ~ 1e5 Hartree,
+# eigenvalues of different solvers agree up to a few 1e-10 Hartree.
+_EIGEN_ATOL = 1e-8
+
 
 @pytest.mark.parametrize("example", EXAMPLES)
 def test_potential(example):
@@ -30,10 +53,10 @@ def test_potential(example):
     intfunc = modules.interpolator.interpolator(parameter['x_decl'],
                                                 parameter['y_decl'],
                                                 parameter['interpol_method'])
-    x_points = np.linspace(parameter['xMin'],
-                           parameter['xMax'],
-                           parameter['nPoint'])
-    comp_potential = [intfunc(ii) for ii in x_points]
+    comp_potential = modules.grid.Grid(parameter['xMin'],
+                                       parameter['xMax'],
+                                       parameter['nPoint'],
+                                       intfunc).v_points
     assert np.all(ref_potential - comp_potential < _TOLERANCE)
 
 
@@ -50,11 +73,1012 @@ def test_energy(example):
     intfunc = modules.interpolator.interpolator(parameter['x_decl'],
                                                 parameter['y_decl'],
                                                 parameter['interpol_method'])
-    comp_energy = modules.solver.solv(parameter['xMin'],
-                                      parameter['xMax'],
-                                      parameter['nPoint'],
+    grid = modules.grid.Grid(parameter['xMin'],
+                             parameter['xMax'],
+                             parameter['nPoint'],
+                             intfunc)
+    comp_energy = modules.solver.solv(grid,
                                       parameter['mass'],
-                                      intfunc,
                                       parameter['first'],
                                       parameter['last'])[0]
-    np.allclose(ref_energy, comp_energy)
+    assert np.allclose(ref_energy, comp_energy, rtol=_ENERGY_RTOL[example],
+                       atol=0.0)
+
+
+@pytest.mark.parametrize("example", EXAMPLES)
+def test_tridiagonal_dense(example):
+    """
+    Tests if the tridiagonal solver gives the same eigenpairs as the dense
+    solver.
+    """
+    path = "./application_examples/{}/".format(example)
+    parameter = modules.in_and_out.read_inp(path)
+    intfunc = modules.interpolator.interpolator(parameter['x_decl'],
+                                                parameter['y_decl'],
+                                                parameter['interpol_method'])
+    grid = modules.grid.Grid(parameter['xMin'], parameter['xMax'],
+                             parameter['nPoint'], intfunc)
+    args = (grid, parameter['mass'], parameter['first'], parameter['last'])
+    tri_val, tri_vec = modules.solver.solv(*args, method="tridiagonal")
+    den_val, den_vec = modules.solver.solv(*args, method="dense")
+    assert np.allclose(tri_val, den_val, rtol=0, atol=_EIGEN_ATOL)
+    # eigenvectors of (near) degenerate doublets are only defined up to a
+    # rotation, therefore the spanned subspaces are compared
+    overlap = np.linalg.svd(tri_vec.T @ den_vec, compute_uv=False)
+    assert np.allclose(overlap, 1.0, atol=1e-6)
+
+
+@pytest.mark.parametrize("example", EXAMPLES)
+def test_sparse(example):
+    """
+    Tests if the shift-invert Lanczos solver finds the same eigenvalues as the
+    tridiagonal solver.
+    """
+    path = "./application_examples/{}/".format(example)
+    parameter = modules.in_and_out.read_inp(path)
+    intfunc = modules.interpolator.interpolator(parameter['x_decl'],
+                                                parameter['y_decl'],
+                                                parameter['interpol_method'])
+    grid = modules.grid.Grid(parameter['xMin'], parameter['xMax'],
+                             parameter['nPoint'], intfunc)
+    args = (grid, parameter['mass'], parameter['first'], parameter['last'])
+    tri_val = modules.solver.solv(*args, method="tridiagonal")[0]
+    spa_val, spa_vec = modules.solver.solv(*args, method="sparse")
+    assert spa_vec.shape == (parameter['nPoint'], len(tri_val))
+    assert np.allclose(tri_val, spa_val, rtol=0, atol=_EIGEN_ATOL)
+
+
+def test_select_method():
+    """Tests the automatic choice of the eigensolver."""
+    assert modules.solver.select_method(100, 1, 5) == "dense"
+    assert modules.solver.select_method(1999, 1, 5) == "tridiagonal"
+    assert modules.solver.select_method(100000, 1, 20) == "tridiagonal"
+    assert modules.solver.select_method(1000000, 1, 20) == "sparse"
+    assert modules.solver.select_method(100000, 1, 500) == "tridiagonal"
+
+
+def test_read_options(tmp_path):
+    """Tests reading the optional keyword lines of the input file."""
+    path = "./application_examples/harmonic_potential_well/"
+    with open(path + "schrodinger.inp") as fp:
+        content = fp.read()
+    (tmp_path / "schrodinger.inp").write_text(content + "\nsolver sparse  # x\n")
+    parameter = modules.in_and_out.read_inp(str(tmp_path))
+    assert parameter['solver'] == "sparse"
+    assert len(parameter['x_decl']) == parameter['interpol_num']
+    assert modules.in_and_out.read_inp(path)['solver'] == "auto"
+
+    np.savetxt(str(tmp_path / "x.dat"), np.linspace(-5.0, 5.0, 11))
+    (tmp_path / "schrodinger.inp").write_text(content + "\ngrid nodes x.dat\n")
+    parameter = modules.in_and_out.read_inp(str(tmp_path))
+    assert parameter['grid'][0] == "nodes"
+    assert np.allclose(parameter['grid'][1], np.linspace(-5.0, 5.0, 11))
+
+
+@pytest.mark.parametrize("example", EXAMPLES)
+def test_energy_window(example):
+    """
+    Tests if the energy window selection returns exactly the eigenvalues of
+    the full spectrum which lie inside the window.
+    """
+    path = "./application_examples/{}/".format(example)
+    parameter = modules.in_and_out.read_inp(path)
+    intfunc = modules.interpolator.interpolator(parameter['x_decl'],
+                                                parameter['y_decl'],
+                                                parameter['interpol_method'])
+    grid = modules.grid.Grid(parameter['xMin'], parameter['xMax'],
+                             parameter['nPoint'], intfunc)
+    args = (grid, parameter['mass'], parameter['first'], parameter['last'])
+    ref_val = modules.solver.solv(*args)[0]
+    emin = 0.5 * (ref_val[0] + ref_val[-1])
+    emax = ref_val[-1] + 1e-6
+    all_val = modules.solver.solv(*args[:2], 1, parameter['nPoint'])[0]
+    win_val = all_val[(all_val >= emin) & (all_val < emax)]
+    comp_val, comp_vec = modules.solver.solv(*args, erange=(emin, emax))
+    assert np.allclose(comp_val, win_val, rtol=0, atol=_EIGEN_ATOL)
+    assert comp_vec.shape == (parameter['nPoint'], len(win_val))
+    empty_val = modules.solver.solv(*args, erange=(all_val[0] - 2.0,
+                                                   all_val[0] - 1.0))[0]
+    assert len(empty_val) == 0
+
+
+def test_sturm_count():
+    """Tests the Sturm sequence count against a dense diagonalization."""
+    rng = np.random.default_rng(42)
+    diagonal_main = rng.normal(size=50)
+    diagonal_sub = rng.normal(size=49)
+    matrix = (np.diag(diagonal_main) + np.diag(diagonal_sub, 1)
+              + np.diag(diagonal_sub, -1))
+    eigen_val = np.linalg.eigvalsh(matrix)
+    for value in np.linspace(-4.0, 4.0, 17):
+        count = modules.solver.sturm_count(diagonal_main, diagonal_sub, value)
+        assert count == np.sum(eigen_val < value)
+
+
+def test_slice_spectrum():
+    """
+    Tests the spectrum slicing on the double well against a single call of
+    the tridiagonal solver: the slices give the same eigenvalues, the states
+    are orthonormal across the slice edges and the edges do not split the
+    nearly degenerate pairs of the double well.
+    """
+    path = "./application_examples/double_linear/"
+    parameter = modules.in_and_out.read_inp(path)
+    grid = modules.grid.Grid(parameter['xMin'], parameter['xMax'], 4000,
+                             modules.potentials.potential(parameter))
+    bands = modules.solver.hamiltonian(grid, parameter['mass'])
+    ref_val, ref_vec = modules.solver.solv(grid, parameter['mass'], 1, 240,
+                                           "tridiagonal", symmetric=False)
+    eigen_val, eigen_vec = modules.solver.slice_spectrum(
+        bands[0], bands[1], 1, 240, slices=4, workers=2)
+    assert np.allclose(eigen_val, ref_val, rtol=0, atol=_EIGEN_ATOL)
+    # the overlap accepted across the slice edges
+    assert np.allclose(eigen_vec.T @ eigen_vec, np.eye(240), rtol=0,
+                       atol=grid.npoint * np.finfo(float).eps)
+    overlap = np.linalg.svd(ref_vec.T @ eigen_vec, compute_uv=False)
+    assert np.allclose(overlap, 1.0, atol=1e-6)
+
+    edge = modules.solver._slice_edge(bands, 61, 1, 240)
+    gaps = np.diff(ref_val)
+    assert gaps[edge - 2] == np.amax(gaps[55:64])
+
+    sliced = modules.solver.solv(grid, parameter['mass'], 101, 200, "sliced")
+    assert np.allclose(sliced[0], ref_val[100:200], rtol=0, atol=_EIGEN_ATOL)
+    with pytest.raises(ValueError):
+        modules.solver.solv(grid, parameter['mass'], 1, 100, "sliced",
+                            symmetric=False, stencil="fd4")
+
+
+def test_observables():
+    """
+    Tests the observables of the harmonic oscillator against the analytic
+    values <x> = 0, <T> = <V> = E/2 and the virial theorem.
+    """
+    path = "./application_examples/harmonic_potential_well/"
+    parameter = modules.in_and_out.read_inp(path)
+    intfunc = modules.interpolator.interpolator(parameter['x_decl'],
+                                                parameter['y_decl'],
+                                                parameter['interpol_method'])
+    grid = modules.grid.Grid(parameter['xMin'], parameter['xMax'],
+                             parameter['nPoint'], intfunc)
+    mass = parameter['mass']
+    energy, eigenvector = modules.solver.solv(grid, mass, parameter['first'],
+                                              parameter['last'])
+    w_func = modules.solver.norm(eigenvector, grid)
+    assert w_func is eigenvector
+    assert np.allclose(grid.delta * np.sum(w_func**2, axis=0), 1.0)
+
+    result = modules.observables.observables(w_func, grid, mass)
+    assert set(result) == set(modules.observables.OBSERVABLES)
+    # V = x**2 / 2, therefore <V> = <x2> / 2 and <T> = <V> = E / 2
+    assert np.allclose(result["potential"], 0.5 * result["x2"])
+    assert np.allclose(result["kinetic"] + result["potential"], energy)
+    assert np.allclose(result["kinetic"], 0.5 * energy, rtol=1e-3)
+    assert np.allclose(result["virial"], 0.0, atol=1e-3)
+    assert np.allclose(result["x"], 0.0, atol=1e-8)
+    assert np.allclose(result["p2"], 2 * mass * result["kinetic"])
+
+    exp_x, unc_x = modules.solver.exp_val(w_func, grid)
+    assert np.allclose(exp_x, result["x"])
+    assert np.allclose(unc_x, result["sigma_x"])
+    assert list(modules.observables.observables(w_func, grid,
+                                                which=("x2",))) == ["x2"]
+    with pytest.raises(ValueError):
+        modules.observables.observables(w_func, grid, which=("kinetic",))
+
+
+@pytest.mark.parametrize("example", EXAMPLES)
+@pytest.mark.parametrize("npoint", [1999, 2000])
+def test_symmetric(example, npoint):
+    """
+    Tests if the even/odd splitting of mirror symmetric problems gives the
+    same eigenpairs as the full problem, for grids with and without a
+    center point.
+    """
+    path = "./application_examples/{}/".format(example)
+    parameter = modules.in_and_out.read_inp(path)
+    intfunc = modules.interpolator.interpolator(parameter['x_decl'],
+                                                parameter['y_decl'],
+                                                parameter['interpol_method'])
+    grid = modules.grid.Grid(parameter['xMin'], parameter['xMax'], npoint,
+                             intfunc)
+    symmetric = modules.solver.is_symmetric(grid)
+    assert symmetric == (example != 'asym_potential_well')
+    if not symmetric:
+        return
+    args = (grid, parameter['mass'], 1, parameter['last'])
+    full_val, full_vec = modules.solver.solv(*args, symmetric=False)
+    sym_val, sym_vec = modules.solver.solv(*args, symmetric=True)
+    assert np.allclose(full_val, sym_val, rtol=0, atol=_EIGEN_ATOL)
+    overlap = np.linalg.svd(full_vec.T @ sym_vec, compute_uv=False)
+    assert np.allclose(overlap, 1.0, atol=1e-6)
+    # every state of the split problem is either even or odd
+    parity = np.sum(sym_vec * sym_vec[::-1], axis=0)
+    assert np.allclose(np.abs(parity), 1.0)
+    part_val = modules.solver.solv(grid, parameter['mass'], 2,
+                                   parameter['last'] - 1, symmetric=True)[0]
+    assert np.allclose(part_val, sym_val[1:-1], rtol=0, atol=_EIGEN_ATOL)
+
+
+@pytest.mark.parametrize("stencil", ["fd4", "fd6", "numerov"])
+@pytest.mark.parametrize("method", ["tridiagonal", "dense", "sparse"])
+def test_stencil(stencil, method):
+    """
+    Tests if the higher order stencils reproduce the analytic eigenvalues of
+    the harmonic oscillator with a fifth of the discretization points more
+    accurately than the three point stencil (error 3.2e-5).
+    """
+    path = "./application_examples/harmonic_potential_well/"
+    ref_energy = np.loadtxt(path + "energy.ref")
+    parameter = modules.in_and_out.read_inp(path)
+    intfunc = modules.interpolator.interpolator(parameter['x_decl'],
+                                                parameter['y_decl'],
+                                                parameter['interpol_method'])
+    grid = modules.grid.Grid(parameter['xMin'], parameter['xMax'],
+                             parameter['nPoint'] // 5, intfunc)
+    args = (grid, parameter['mass'], parameter['first'], parameter['last'])
+    if stencil == "numerov" and method == "tridiagonal":
+        with pytest.raises(ValueError):
+            modules.solver.solv(*args, method=method, stencil=stencil)
+        return
+    comp_energy = modules.solver.solv(*args, method=method, stencil=stencil)[0]
+    assert np.allclose(ref_energy, comp_energy, rtol=0, atol=2e-6)
+
+
+@pytest.mark.parametrize("stencil", ["fd4", "fd6"])
+def test_stencil_window(stencil):
+    """Tests the energy window selection for the banded stencils."""
+    path = "./application_examples/double_cubic_spline/"
+    parameter = modules.in_and_out.read_inp(path)
+    intfunc = modules.interpolator.interpolator(parameter['x_decl'],
+                                                parameter['y_decl'],
+                                                parameter['interpol_method'])
+    grid = modules.grid.Grid(parameter['xMin'], parameter['xMax'], 300,
+                             intfunc)
+    all_val = modules.solver.solv(grid, parameter['mass'], 1, 300, "dense",
+                                  stencil=stencil)[0]
+    # window boundaries between the doublets of the double well
+    erange = (0.5 * (all_val[1] + all_val[2]), 0.5 * (all_val[9] + all_val[10]))
+    comp_val = modules.solver.solv(grid, parameter['mass'], 1, 1,
+                                   erange=erange, stencil=stencil)[0]
+    assert np.allclose(comp_val, all_val[2:10], rtol=0, atol=_EIGEN_ATOL)
+
+
+@pytest.mark.parametrize("stencil", ["fd2", "fd4"])
+def test_converge(stencil):
+    """
+    Tests if the grid convergence reaches the analytic eigenvalues of the
+    harmonic oscillator within the tolerance.
+    """
+    path = "./application_examples/harmonic_potential_well/"
+    ref_energy = np.loadtxt(path + "energy.ref")
+    parameter = modules.in_and_out.read_inp(path)
+    intfunc = modules.interpolator.interpolator(parameter['x_decl'],
+                                                parameter['y_decl'],
+                                                parameter['interpol_method'])
+    tol = 1e-8
+    grid, energy, eigenvector, extrapolated, error = \
+        modules.convergence.converge(parameter['xMin'], parameter['xMax'],
+                                     parameter['mass'], intfunc,
+                                     parameter['first'], parameter['last'],
+                                     tol, stencil=stencil)
+    assert np.all(error < tol)
+    assert np.allclose(extrapolated, ref_energy, rtol=0, atol=tol)
+    assert eigenvector.shape == (grid.npoint, len(ref_energy))
+    assert np.allclose(energy, ref_energy, rtol=0, atol=1e-4)
+
+
+def test_converge_hard_wall():
+    """
+    Tests if the grid convergence reaches the analytic eigenvalues of the
+    infinite well, whose error is dominated by the position of the walls,
+    and warns if the largest grid is reached before the tolerance.
+    """
+    path = "./application_examples/infinite_potential_well/"
+    ref_energy = np.loadtxt(path + "energy.ref")
+    parameter = modules.in_and_out.read_inp(path)
+    intfunc = modules.interpolator.interpolator(parameter['x_decl'],
+                                                parameter['y_decl'],
+                                                parameter['interpol_method'])
+    arguments = (parameter['xMin'], parameter['xMax'], parameter['mass'],
+                 intfunc, parameter['first'], parameter['last'])
+    tol = 1e-6
+    grid, _, _, extrapolated, error = modules.convergence.converge(*arguments,
+                                                                   tol)
+    assert np.all(error < tol)
+    assert grid.npoint < 2000
+    assert np.allclose(extrapolated, ref_energy, rtol=0, atol=tol)
+    with pytest.warns(modules.convergence.ConvergenceWarning):
+        modules.convergence.converge(*arguments, 1e-14, max_points=1000)
+
+
+def test_non_uniform(tmp_path):
+    """
+    Tests the non-uniform grids: equidistant nodes reproduce the uniform grid,
+    a mapped grid is more accurate than a uniform grid of the same size and
+    the output is interpolated onto the uniform grid.
+    """
+    path = "./application_examples/double_cubic_spline/"
+    ref_energy = np.loadtxt(path + "energy.ref")
+    parameter = modules.in_and_out.read_inp(path)
+    intfunc = modules.interpolator.interpolator(parameter['x_decl'],
+                                                parameter['y_decl'],
+                                                parameter['interpol_method'])
+    mass, first, last = parameter['mass'], parameter['first'], parameter['last']
+    uniform = modules.grid.Grid(parameter['xMin'], parameter['xMax'], 300,
+                                intfunc)
+    nodes = modules.grid.from_nodes(uniform.x_points, intfunc)
+    uni_val, uni_vec = modules.solver.solv(uniform, mass, first, last)
+    node_val, node_vec = modules.solver.solv(nodes, mass, first, last)
+    assert not nodes.uniform
+    assert np.allclose(node_val, uni_val, rtol=0, atol=_EIGEN_ATOL)
+    overlap = np.linalg.svd(uni_vec.T @ (node_vec * np.sqrt(nodes.weights[0])),
+                            compute_uv=False)
+    assert np.allclose(overlap, 1.0, atol=1e-6)
+
+    mapped = modules.grid.mapped(parameter['xMin'], parameter['xMax'], 300,
+                                 intfunc, mass, uni_val[-1])
+    map_val, map_vec = modules.solver.solv(mapped, mass, first, last)
+    assert (np.amax(np.abs(map_val - ref_energy))
+            < 0.5 * np.amax(np.abs(uni_val - ref_energy)))
+
+    w_func = modules.solver.norm(map_vec, mapped)
+    exp_x, unc_x = modules.solver.exp_val(w_func, mapped)
+    modules.in_and_out.output_storage(mapped, map_val, w_func, exp_x, unc_x,
+                                      str(tmp_path), parameter['nPoint'])
+    wavefuncs = np.loadtxt(str(tmp_path / "wavefuncs.dat"))
+    x_out = np.linspace(parameter['xMin'], parameter['xMax'],
+                        parameter['nPoint'])
+    assert np.allclose(wavefuncs[:, 0], x_out)
+    norm_sqr = np.sum(wavefuncs[:, 1:]**2, axis=0) * (x_out[1] - x_out[0])
+    assert np.allclose(norm_sqr, 1.0, atol=1e-3)
+
+
+def test_sweep(tmp_path):
+    """
+    Tests the parameter sweep on a process pool: the results match the single
+    cases and failing cases are reported without stopping the sweep.
+    """
+    path = "./application_examples/harmonic_potential_well/"
+    parameter = modules.in_and_out.read_inp(path)
+    values = {"mass": ["1.0", "4.0"], "nPoint": ["0", "300"]}
+    values = {name: [modules.sweep.convert(parameter, name, value)
+                     for value in value_list]
+              for name, value_list in values.items()}
+    cases = modules.sweep.expand(values)
+    assert cases[1] == {"mass": 1.0, "nPoint": 300}
+    results = modules.sweep.sweep(parameter, cases, workers=2)
+    failed = modules.in_and_out.sweep_storage(results, list(values),
+                                              str(tmp_path))
+    assert sorted(index for index, _ in failed) == [0, 2]
+
+    table = np.loadtxt(str(tmp_path / "sweep.dat"), ndmin=2)
+    for index in (1, 3):
+        rows = table[table[:, 0] == index]
+        case = modules.sweep.apply_case(parameter, cases[index])
+        energy = modules.sweep.solve_case(case)[0]
+        assert np.allclose(rows[:, 4], energy, rtol=0, atol=_TOLERANCE * 1e3)
+        assert np.all(rows[:, 1] == cases[index]["mass"])
+    # a single worker solves the cases in the calling process
+    (index, case, result, error), = modules.sweep.sweep(parameter, cases[1:2],
+                                                        workers=1)
+    assert index == 0 and case == cases[1] and error is None
+    assert np.allclose(result[0], table[table[:, 0] == 1][:, 4], rtol=1e-12)
+
+
+def test_parallel(monkeypatch):
+    """
+    Tests that the workers of a pool are started with the BLAS thread limit
+    and that the environment of the calling process is restored.
+    """
+    monkeypatch.setenv("OMP_NUM_THREADS", "7")
+    monkeypatch.delenv("OPENBLAS_NUM_THREADS", raising=False)
+    with modules.parallel.pool(1) as pool:
+        with modules.parallel.blas_threads(2):
+            future = pool.submit(os.getenv, "OPENBLAS_NUM_THREADS")
+        assert future.result() == "2"
+    assert os.environ["OMP_NUM_THREADS"] == "7"
+    assert "OPENBLAS_NUM_THREADS" not in os.environ
+
+
+def test_continuation():
+    """
+    Tests the warm-started continuation on a scan of the depth of a narrow
+    well next to a harmonic oscillator. The eigenvalues agree with solv and
+    the state localized in the narrow well keeps its column, while it crosses
+    the oscillator states.
+    """
+    def potential(depth):
+        return lambda x: 0.5 * x**2 - depth * np.exp(-(x - 6.0)**2 / 0.5)
+
+    steps = [(modules.grid.Grid(-8.0, 8.0, 1000, potential(depth)), 1.0)
+             for depth in np.linspace(16.0, 21.0, 26)]
+    localized = []
+    for (grid, mass), (energy, eigenvector) in \
+            zip(steps, modules.continuation.continuation(steps, 1, 6)):
+        ref_energy = modules.solver.solv(grid, mass, 1, 6)[0]
+        assert np.allclose(np.sort(energy), ref_energy, rtol=0,
+                           atol=_EIGEN_ATOL)
+        # unit vectors like the eigenvectors of solv on every step
+        assert np.allclose(np.sum(eigenvector**2, axis=0), 1.0, rtol=0,
+                           atol=1e-12)
+        density = eigenvector[np.abs(grid.x_points - 6.0) < 1.0]**2
+        localized.append((np.argmax(density.sum(axis=0)), energy))
+    assert all(column == localized[0][0] for column, _ in localized)
+    # the localized state started above and ended below the oscillator states
+    assert np.argsort(localized[0][1])[-1] == localized[0][0]
+    assert np.argsort(localized[-1][1])[1] == localized[0][0]
+
+
+def test_cache(tmp_path):
+    """
+    Tests the keys of the result cache, the lookup of stored results, the
+    eviction of the least recently used result and the statistics.
+    """
+    path = "./application_examples/harmonic_potential_well/"
+    parameter = modules.in_and_out.read_inp(path)
+    key = modules.cache.cache_key(parameter, {"converge": None})
+    assert key == modules.cache.cache_key(modules.in_and_out.read_inp(path),
+                                          {"converge": None})
+    parameter['y_decl'][0] += 1e-12
+    assert key != modules.cache.cache_key(parameter, {"converge": None})
+    assert key != modules.cache.cache_key(parameter, {"converge": 1e-6})
+
+    # tables of a million support points are hashed by their bytes
+    table = dict(parameter, x_decl=np.linspace(0.0, 1.0, 10**6),
+                 y_decl=np.cos(np.linspace(0.0, 1.0, 10**6)))
+    start = time.perf_counter()
+    large_key = modules.cache.cache_key(table)
+    assert time.perf_counter() - start < 1.0
+    assert large_key == modules.cache.cache_key(
+        {name: np.copy(value) if isinstance(value, np.ndarray) else value
+         for name, value in reversed(list(table.items()))})
+    table['y_decl'][-1] += 1e-15
+    assert large_key != modules.cache.cache_key(table)
+
+    data = {"energy": np.arange(5.0), "w_func": np.ones((1000, 5))}
+    store = modules.cache.Cache(str(tmp_path))
+    assert store.get("a") is None
+    for age, name in enumerate(("a", "b")):
+        store.put(name, data)
+        os.utime(str(tmp_path / (name + ".npz")), (age, age))
+    # room for two results
+    store.max_bytes = int(2.5 * os.path.getsize(str(tmp_path / "a.npz")))
+    assert np.array_equal(store.get("a")["w_func"], data["w_func"])
+    store.put("c", data)
+    assert store.get("b") is None
+    assert store.get("a") is not None and store.get("c") is not None
+    assert store.stats()["hits"] == 3 and store.stats()["misses"] == 2
+    assert store.stats()["entries"] == 2
+
+
+def test_extend(tmp_path):
+    """
+    Tests extending a previous solution to a larger range of states, from
+    memory and from the output files, against a full solution.
+    """
+    path = "./application_examples/harmonic_potential_well/"
+    parameter = modules.in_and_out.read_inp(path)
+    intfunc = modules.interpolator.interpolator(parameter['x_decl'],
+                                                parameter['y_decl'],
+                                                parameter['interpol_method'])
+    grid = modules.grid.Grid(parameter['xMin'], parameter['xMax'],
+                             parameter['nPoint'], intfunc)
+    mass = parameter['mass']
+    ref_val, ref_vec = modules.solver.solv(grid, mass, 1, 8)
+    ref_vec = modules.solver.norm(ref_vec, grid)
+
+    fingerprint = modules.solver.fingerprint(grid, mass)
+    eigen_val, eigen_vec = modules.solver.solv(grid, mass, 3, 5)
+    w_func = modules.solver.norm(eigen_vec, grid)
+    exp_x, unc_x = modules.solver.exp_val(w_func, grid)
+    modules.in_and_out.output_storage(grid, eigen_val, w_func, exp_x, unc_x,
+                                      str(tmp_path))
+    modules.in_and_out.states_storage(3, fingerprint, str(tmp_path))
+    x_points, previous = modules.in_and_out.read_states(str(tmp_path))
+    assert np.allclose(x_points, grid.x_points)
+
+    for prev in (previous, (3, eigen_val, eigen_vec, fingerprint)):
+        ext_val, ext_vec = modules.solver.extend(grid, mass, 1, 8, prev)
+        assert np.allclose(ext_val, ref_val, rtol=0, atol=_EIGEN_ATOL)
+        overlap = np.abs(ext_vec.T @ (grid.weights[:, np.newaxis] * ref_vec))
+        assert np.allclose(overlap, np.eye(8), atol=1e-6)
+
+    with pytest.raises(ValueError):
+        modules.solver.extend(grid, 2 * mass, 1, 8, previous)
+
+    # the pipeline ignores the states of a different Hamiltonian
+    parameter['mass'] = 2 * mass
+    with pytest.warns(UserWarning, match="different Hamiltonian"):
+        data = modules.pipeline.solve(parameter, previous=(x_points,
+                                                           previous))
+    assert len(data['energy']) == parameter['last'] - parameter['first'] + 1
+    # and the states on a non-uniform grid
+    parameter['grid'] = ('mapped', len(x_points))
+    with pytest.warns(UserWarning, match="uniform grids only"):
+        modules.pipeline.solve(parameter, previous=(x_points, previous))
+
+    # a states file without fingerprint holds no reusable states
+    (tmp_path / "states.json").write_text(json.dumps({"first": 3}))
+    assert modules.in_and_out.read_states(str(tmp_path)) is None
+
+
+def test_binary_output(tmp_path):
+    """
+    Tests the binary output format, its memory-mapped reading and the
+    conversion to the text format.
+    """
+    path = "./application_examples/harmonic_potential_well/"
+    parameter = modules.in_and_out.read_inp(path)
+    intfunc = modules.interpolator.interpolator(parameter['x_decl'],
+                                                parameter['y_decl'],
+                                                parameter['interpol_method'])
+    grid = modules.grid.Grid(parameter['xMin'], parameter['xMax'],
+                             parameter['nPoint'], intfunc)
+    eigen_val, eigen_vec = modules.solver.solv(grid, parameter['mass'],
+                                               parameter['first'],
+                                               parameter['last'])
+    w_func = modules.solver.norm(eigen_vec, grid)
+    exp_x, unc_x = modules.solver.exp_val(w_func, grid)
+    data = modules.in_and_out.output_data(grid, eigen_val, w_func, exp_x,
+                                          unc_x)
+    binary, text = tmp_path / "binary", tmp_path / "text"
+    binary.mkdir()
+    modules.in_and_out.data_storage(data, str(binary), "npy")
+
+    read = modules.plot.readplotdata(str(binary))
+    assert isinstance(read[2].base, np.memmap)
+    for array, name in zip(read, ("x_points", "v_points", "w_func", "energy",
+                                  "exp_x", "unc_x")):
+        assert np.array_equal(array, data[name])
+
+    modules.in_and_out.convert_output(str(binary), "text", str(text))
+    assert not list(text.glob("*.npy"))
+    read = modules.in_and_out.read_output(str(text))
+    for name in data:
+        assert np.array_equal(read[name], data[name])
+
+
+@pytest.mark.parametrize("fmt", ["text", "npy"])
+def test_streaming_output(tmp_path, fmt):
+    """
+    Tests that writing the output needs only little memory in addition to
+    the wavefunctions and the single precision and downsampled output.
+    """
+    x_points = np.linspace(-1.0, 1.0, 20001)
+    w_func = np.random.default_rng(0).standard_normal((len(x_points), 50))
+    data = {"x_points": x_points, "v_points": x_points**2,
+            "energy": np.arange(50.0), "w_func": w_func,
+            "exp_x": np.zeros(50), "unc_x": np.ones(50)}
+    tracemalloc.start()
+    modules.in_and_out.data_storage(data, str(tmp_path), fmt)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert peak < 0.5 * w_func.nbytes
+    read = modules.in_and_out.read_output(str(tmp_path))
+    assert np.array_equal(read["w_func"], w_func)
+
+    modules.in_and_out.data_storage(data, str(tmp_path), fmt, np.float32,
+                                    npoint=101)
+    read = modules.in_and_out.read_output(str(tmp_path))
+    assert np.allclose(read["x_points"], np.linspace(-1.0, 1.0, 101))
+    assert np.allclose(read["w_func"], w_func[::200], rtol=1e-6, atol=0)
+    modules.in_and_out.data_storage(data, str(tmp_path), fmt, stride=1000)
+    assert np.array_equal(modules.in_and_out.read_output(str(tmp_path))
+                          ["w_func"], w_func[::1000])
+
+
+def test_read_inp(tmp_path):
+    """
+    Tests the input file: interpol_num and the interpolation method are
+    validated, comments are allowed in the table, errors are raised as
+    exceptions and a binary table given on the fifth line is memory-mapped.
+    """
+    path = "./application_examples/double_linear/"
+    with open(path + "schrodinger.inp") as fp:
+        lines = fp.read().splitlines()
+    reference = modules.in_and_out.read_inp(path)
+
+    def read(content):
+        (tmp_path / "schrodinger.inp").write_text("\n".join(content) + "\n")
+        return modules.in_and_out.read_inp(str(tmp_path))
+
+    commented = lines[:6] + ["# comment", ""] + lines[6:] + ["solver dense"]
+    parameter = read(commented)
+    assert np.array_equal(parameter['y_decl'], reference['y_decl'])
+    assert parameter['solver'] == "dense"
+
+    invalid = [lines[:4] + ["9"] + lines[5:],
+               lines[:4] + ["7"] + lines[5:],
+               lines[:6] + ["-19.0 1.0 2.0"] + lines[7:],
+               lines[:6] + ["-19.0 a"] + lines[7:],
+               lines[:3] + ["spline"] + lines[4:],
+               lines[:2]]
+    for content in invalid:
+        with pytest.raises(modules.in_and_out.InputError):
+            read(content)
+
+    np.save(str(tmp_path / "potential.npy"),
+            np.column_stack((reference['x_decl'], reference['y_decl'])))
+    parameter = read(lines[:4] + ["potential.npy  # binary table"])
+    assert isinstance(parameter['x_decl'], np.memmap)
+    assert parameter['interpol_num'] == reference['interpol_num']
+    assert np.array_equal(parameter['y_decl'], reference['y_decl'])
+
+
+@pytest.mark.parametrize("method", ["barycentric", "chebyshev", "pchip",
+                                    "akima"])
+def test_interpolator(method):
+    """
+    Tests the interpolation methods: the polynomial methods reproduce a
+    smooth function from many Chebyshev points to machine precision, the
+    piecewise cubic methods do not overshoot a step.
+    """
+    if method in ("barycentric", "chebyshev"):
+        x_sup = modules.interpolator.chebyshev_nodes(-1.0, 1.0, 301)
+        intfunc = modules.interpolator.interpolator(
+            x_sup[::-1], 1 / (1 + 25 * x_sup[::-1]**2), method)
+        x_points = np.linspace(-1.0, 1.0, 1999)
+        assert np.allclose(intfunc(x_points), 1 / (1 + 25 * x_points**2),
+                           rtol=0, atol=1e-13)
+        assert intfunc(x_sup[1]) == 1 / (1 + 25 * x_sup[1]**2)
+    else:
+        x_sup = np.linspace(-1.0, 1.0, 11)
+        intfunc = modules.interpolator.interpolator(x_sup, x_sup > 0, method)
+        values = intfunc(np.linspace(-1.0, 1.0, 1999))
+        assert np.amin(values) >= 0.0 and np.amax(values) <= 1.0
+    with pytest.raises(ValueError):
+        modules.interpolator.interpolator(np.linspace(-1.0, 1.0, 11),
+                                          np.zeros(11), "chebyshev")
+
+
+def test_expression(tmp_path):
+    """
+    Tests closed-form potentials: the named potentials reproduce the
+    reference potentials and the eigenvalues of expression potentials match
+    the analytic eigenvalues of the Morse and Poschl-Teller potentials.
+    """
+    named = (("finite_potential_well", "finite_well(x, depth=10)"),
+             ("harmonic_potential_well", "harmonic(x)"))
+    for example, name in named:
+        path = "./application_examples/{}/".format(example)
+        parameter = modules.in_and_out.read_inp(path)
+        disc = modules.grid.Grid(parameter['xMin'], parameter['xMax'],
+                                 parameter['nPoint'],
+                                 modules.potentials.compile_expression(name))
+        ref_potential = np.loadtxt(path + "potential.ref")
+        assert np.array_equal(disc.v_points, ref_potential)
+
+    mass, depth, alpha = 2.0, 8.0, 0.5
+    omega = alpha * np.sqrt(2 * depth / mass)
+    lam = 0.5 * (np.sqrt(1 + 8 * mass * depth / alpha**2) - 1)
+    nn = np.arange(4) + 0.5
+    cases = (("morse(x, depth=8, alpha=0.5, x0=-4)", -10.0, 20.0,
+              omega * nn - (omega * nn)**2 / (4 * depth)),
+             ("-8/cosh(0.5*x)**2", -30.0, 30.0,
+              -alpha**2 / (2 * mass) * (lam - nn + 0.5)**2))
+    for expression, xmin, xmax, ref in cases:
+        (tmp_path / "schrodinger.inp").write_text(
+            "{}\n{} {} 3001\n1 4\nexpression\n{}  # potential\nstencil fd4\n"
+            .format(mass, xmin, xmax, expression))
+        parameter = modules.in_and_out.read_inp(str(tmp_path))
+        assert parameter['interpol_num'] == 0
+        disc = modules.grid.Grid(xmin, xmax, 3001,
+                                 modules.potentials.potential(parameter))
+        energy = modules.solver.solv(disc, mass, 1, 4, stencil="fd4")[0]
+        assert np.allclose(energy, ref, rtol=0, atol=1e-6)
+
+    for expression in ("__import__('os')", "x.real", "y", "1/0",
+                       "morse(x, width=1)"):
+        with pytest.raises(ValueError):
+            modules.potentials.compile_expression(expression)
+
+
+def test_profiling(tmp_path):
+    """
+    Tests the profiler: the stages of the solver are recorded with their
+    time and peak memory, hooks are called for every stage and the records
+    of several runs are appended to one file.
+    """
+    calls = []
+
+    def hook(name):
+        calls.append(name)
+        return contextlib.nullcontext()
+
+    intfunc = modules.potentials.compile_expression("harmonic(x)")
+    disc = modules.grid.Grid(-5.0, 5.0, 1001, intfunc)
+    path = str(tmp_path / "profile.ndjson")
+    for _ in range(2):
+        with modules.profiling.Profiler(hooks=[hook]) as profiler:
+            with modules.profiling.stage("solve"):
+                modules.solver.solv(disc, 1.0, 1, 5, "dense")
+            with modules.profiling.stage("alloc"):
+                np.ones(10**6).sum()
+        modules.profiling.write_record(profiler.record(), path)
+    # without an active profiler nothing is recorded
+    with modules.profiling.stage("solve"):
+        modules.profiling.annotate(solver="dense")
+
+    assert calls == ["solve", "solve/hamiltonian", "solve/eigensolver",
+                     "alloc"] * 2
+    with open(path) as fp:
+        records = [json.loads(line) for line in fp]
+    assert len(records) == 2
+    stages = {stage["stage"]: stage for stage in records[-1]["stages"]}
+    assert list(stages) == ["solve/hamiltonian", "solve/eigensolver",
+                            "solve", "alloc"]
+    assert records[-1]["info"] == {"solver": "dense", "symmetric": True}
+    assert stages["solve"]["wall"] >= stages["solve/eigensolver"]["wall"]
+    assert stages["alloc"]["peak_bytes"] >= 8 * 10**6
+    assert stages["solve"]["peak_bytes"] >= \
+        stages["solve/eigensolver"]["peak_bytes"]
+    assert records[-1]["total"]["peak_bytes"] >= 8 * 10**6
+
+
+def test_lazy_imports(tmp_path):
+    """
+    Tests that a run of main_solver does not import the plotting module and
+    the parts of scipy it does not use.
+    """
+    script = ("import runpy, sys\n"
+              "sys.argv = ['main_solver', '-i', sys.argv[1],\n"
+              "            '-o', sys.argv[2]]\n"
+              "runpy.run_path('main_solver', run_name='__main__')\n"
+              "print(' '.join(sys.modules))\n")
+    result = subprocess.run([sys.executable, "-c", script,
+                             "./application_examples/double_linear/",
+                             str(tmp_path)], stdout=subprocess.PIPE,
+                            universal_newlines=True, check=True)
+    imported = result.stdout.split()
+    assert "modules.solver" in imported
+    unused = ("matplotlib", "modules.plot", "scipy.interpolate",
+              "scipy.optimize", "scipy.sparse")
+    assert not [name for name in imported if name.startswith(unused)]
+    assert os.path.isfile(str(tmp_path / "energies.dat"))
+
+
+def test_options(tmp_path):
+    """
+    Tests the command line options shared by main_solver and main_client:
+    both reject unknown solvers and stencils and output strides below one,
+    and the client parses them without importing scipy.
+    """
+    for script in ("main_solver", "main_client"):
+        for option in ("--stencil", "-s"):
+            result = subprocess.run([sys.executable, script, option, "fd3"],
+                                    stderr=subprocess.PIPE,
+                                    universal_newlines=True)
+            assert result.returncode == 2
+            assert "invalid choice" in result.stderr
+        for option in (["--stride", "0"], ["--stride", "-2"],
+                       ["--output-points", "0"]):
+            result = subprocess.run([sys.executable, script, "-i",
+                                     "./application_examples/double_linear/",
+                                     "-o", str(tmp_path)] + option,
+                                    stderr=subprocess.PIPE,
+                                    universal_newlines=True)
+            assert result.returncode == 2
+            assert "must be positive" in result.stderr
+    script = ("import runpy, sys\n"
+              "sys.argv = ['main_client', '-h']\n"
+              "try:\n"
+              "    runpy.run_path('main_client', run_name='__main__')\n"
+              "except SystemExit:\n"
+              "    print(' '.join(sys.modules))\n")
+    result = subprocess.run([sys.executable, "-c", script],
+                            stdout=subprocess.PIPE, universal_newlines=True,
+                            check=True)
+    assert not [name for name in result.stdout.split()
+                if name.startswith(("scipy", "modules.solver"))]
+
+
+def test_service(tmp_path):
+    """
+    Tests the solver service: parameters and the content of an input file
+    give the results of the pipeline, input errors reach the client and a
+    full queue refuses requests as busy.
+    """
+    path = "./application_examples/harmonic_potential_well/"
+    parameter = modules.in_and_out.read_inp(path)
+    parameter['grid'] = ('nodes', np.linspace(parameter['xMin'],
+                                              parameter['xMax'], 400))
+    values, arrays = modules.service.split(parameter)
+    json.dumps(values)
+    joined = modules.service.join(values, arrays)
+    assert joined['grid'][0] == 'nodes'
+    assert np.array_equal(joined['grid'][1], parameter['grid'][1])
+    parameter['grid'] = None
+
+    address = str(tmp_path / "solver.sock")
+    server = subprocess.Popen([sys.executable, "main_service", "-a", address,
+                               "-j", "1"], stdout=subprocess.PIPE,
+                              universal_newlines=True)
+    try:
+        assert server.stdout.readline().startswith("Solver service listening")
+        assert os.stat(address).st_mode & 0o777 == 0o600
+        data = modules.service.request(parameter, address=address)
+        reference = modules.pipeline.solve(parameter)
+        assert sorted(data) == sorted(reference)
+        for name in ('x_points', 'v_points', 'energy', 'w_func', 'exp_x',
+                     'unc_x'):
+            assert np.array_equal(data[name], reference[name])
+        assert data['fingerprint'] == reference['fingerprint']
+
+        with open(os.path.join(path, "schrodinger.inp")) as fp:
+            content = fp.read()
+        data = modules.service.request(content, converge=1e-3,
+                                       address=address)
+        assert np.allclose(data['energy'], reference['energy'], rtol=1e-3)
+        assert 'extrapolated' in data
+        with pytest.raises(modules.in_and_out.InputError):
+            modules.service.request("1.0\n", address=address)
+        # the service reads no files outside of the input directory
+        lines = content.splitlines()
+        for name in (os.path.abspath(path + "schrodinger.inp"),
+                     "../schrodinger.inp"):
+            lines[4] = name
+            with pytest.raises(modules.in_and_out.InputError,
+                               match="outside"):
+                modules.service.request("\n".join(lines), address=address)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        server.stdout.close()
+    assert not os.path.exists(address)
+
+    # the frames of a request are checked before anything is allocated
+    def read(header, data=b""):
+        async def run():
+            reader = asyncio.StreamReader()
+            encoded = json.dumps(header).encode()
+            reader.feed_data(len(encoded).to_bytes(8, "big") + encoded + data)
+            reader.feed_eof()
+            return await modules.service._read_message(reader)
+        return asyncio.run(run())
+
+    values, arrays = read({"values": {"a": 1}, "arrays": [["x", "<f8", [2]]]},
+                          np.arange(2.0).tobytes())
+    assert values == {"a": 1} and np.array_equal(arrays["x"], [0.0, 1.0])
+    for spec in (["x", "<f8", [2**40]], ["x", "|O", [1]], ["x", "<f8", [-1]],
+                 ["x", "<f8", [1.5]]):
+        with pytest.raises((ValueError, TypeError)):
+            read({"values": {}, "arrays": [spec]})
+    with pytest.raises(ValueError):
+        read({"values": {}, "arrays": [], "pad": "x" * 2**20})
+    with pytest.raises(asyncio.IncompleteReadError):
+        read({"values": {}, "arrays": [["x", "<f8", [2]]]}, b"\0" * 8)
+
+    private = str(tmp_path / "private")
+    modules.service._private_directory(private)
+    assert os.stat(private).st_mode & 0o777 == 0o700
+    os.chmod(private, 0o755)
+    with pytest.raises(OSError):
+        modules.service._private_directory(private)
+
+    service = modules.service.Service(workers=1, queue=0)
+    service.active = 1
+    values, arrays = asyncio.run(service.solve({}, {}))
+    assert values['kind'] == 'busy' and arrays == {}
+
+    # a killed worker fails its request and the pool is replaced
+    values, arrays = modules.service.split(parameter)
+    request = ({"parameter": values}, arrays)
+
+    async def crash(service):
+        answer = await service.solve(*request)
+        assert 'error' not in answer[0]
+        for process in list(service._pool._processes.values()):
+            process.kill()
+            process.join()
+        answer = await service.solve(*request)
+        assert answer[0]['kind'] == 'solver'
+        answer = await service.solve(*request)
+        assert np.array_equal(answer[1]['energy'], reference['energy'])
+
+    with modules.service.Service(workers=1) as service:
+        asyncio.run(crash(service))
+
+
+def test_propagate(tmp_path):
+    """
+    Tests the propagation of a coherent state of the harmonic oscillator:
+    <x>(t) oscillates as x0 cos(omega t) with constant width, Crank-Nicolson
+    conserves the norm and agrees with the spectral propagation, and the
+    frames are stored while they are propagated.
+    """
+    path = "./application_examples/harmonic_potential_well/"
+    parameter = modules.in_and_out.read_inp(path)
+    mass = parameter['mass']
+    grid = modules.grid.Grid(parameter['xMin'], parameter['xMax'],
+                             parameter['nPoint'],
+                             modules.potentials.potential(parameter))
+    omega = np.sqrt(1.0 / mass)
+    psi0 = modules.propagate.gaussian(grid, 1.0, np.sqrt(0.5 / (mass * omega)))
+
+    frames = modules.propagate.crank_nicolson(grid, mass, psi0, 0.005, 1200,
+                                              stride=100)
+    count = modules.in_and_out.propagation_storage(frames, grid,
+                                                   str(tmp_path), 3)
+    assert count == 13
+    table = np.loadtxt(str(tmp_path / "propagation.dat"))
+    assert np.allclose(table[:, 0], 0.5 * np.arange(13))
+    assert np.allclose(table[:, 1], 1.0, rtol=0, atol=1e-12)
+    assert np.allclose(table[:, 2], np.cos(omega * table[:, 0]), atol=1e-3)
+    assert np.allclose(table[:, 3], table[0, 3], atol=1e-4)
+
+    snapshots = np.load(str(tmp_path / "snapshots.npy"))
+    assert snapshots.shape == (5, grid.npoint)
+    energy, eigenvector = modules.solver.solv(grid, mass, 1, 30)
+    w_func = modules.solver.norm(eigenvector, grid)
+    spectral = modules.propagate.spectral(grid, energy, w_func, psi0,
+                                          table[::3, 0])
+    for snapshot, (_, psi) in zip(snapshots, spectral):
+        assert np.allclose(snapshot, psi, rtol=0, atol=1e-3)
+    with pytest.raises(ValueError):
+        next(modules.propagate.crank_nicolson(grid, mass, psi0, 0.01, 1,
+                                              stencil="numerov"))
+
+
+@pytest.mark.parametrize("stencil", ["fd2", "fd4"])
+def test_bands(tmp_path, stencil):
+    """
+    Tests the periodic boundary conditions on a flat potential, whose bands
+    are the folded dispersion of the discretized free particle: the band
+    structure of the worker pool, the Bloch states of all eigensolvers and
+    the stored table.
+    """
+    period, npoint, mass = 2.0, 200, 0.5
+    grid = modules.bands.periodic_grid(0.0, period, npoint,
+                                       lambda x: np.full_like(x, 1.0))
+    assert np.isclose(grid.delta, period / npoint)
+    kpoints = modules.bands.k_mesh(period, 9)
+    energy = modules.bands.band_structure(grid, mass, kpoints, 2, 6, stencil,
+                                          workers=1)
+    assert energy.shape == (9, 5)
+    # dispersion of the stencil for the plane waves exp(i q x)
+    weights = {"fd2": [1.0, -1.0], "fd4": [5/4, -4/3, 1/12]}[stencil]
+    shifts = 2 * np.pi / period * np.arange(-8, 9)
+    phase = (kpoints[:, np.newaxis] + shifts) * grid.delta
+    reference = 1.0 + sum(
+        weight * np.cos(index * phase) for index, weight
+        in enumerate(weights)) / (mass * grid.delta**2)
+    reference = np.sort(reference, axis=1)[:, 1:6]
+    assert np.allclose(energy, reference, rtol=1e-10, atol=0)
+    pooled = modules.bands.band_structure(grid, mass, kpoints, 2, 6, stencil,
+                                          workers=2)
+    assert np.array_equal(pooled, energy)
+
+    # cyclic Hamiltonian in the order of the grid points
+    bands, order = modules.solver.bloch_bands(grid, mass, kpoints[3], stencil)
+    hamiltonian = np.diag(bands[0]).astype(complex)
+    for kk, band in enumerate(bands[1:], 1):
+        hamiltonian += np.diag(band, -kk) + np.diag(np.conj(band), kk)
+    hamiltonian = hamiltonian[np.ix_(order, order)]
+    assert hamiltonian[0, -1] != 0
+    for method in ("dense", "sparse", "tridiagonal"):
+        eigen_val, eigen_vec = modules.solver.solv(grid, mass, 2, 6, method,
+                                                   stencil=stencil,
+                                                   k=kpoints[3])
+        assert np.allclose(eigen_val, energy[3], rtol=1e-10, atol=0)
+        residual = hamiltonian @ eigen_vec - eigen_vec * eigen_val
+        assert np.abs(residual).max() < 1e-10 * np.abs(eigen_val).max()
+        w_func = modules.solver.norm(eigen_vec, grid)
+        assert np.iscomplexobj(w_func)
+        assert np.allclose(grid.weights @ np.abs(w_func)**2, 1.0)
+        result = modules.observables.observables(w_func, grid, mass,
+                                                 ("x", "sigma_x", "kinetic"))
+        assert np.all((result["x"] > 0) & (result["x"] < period))
+        assert np.all(np.isreal(result["kinetic"]))
+    with pytest.raises(ValueError):
+        modules.solver.solv(grid, mass, 1, 2, stencil="numerov", k=0.0)
+
+    modules.in_and_out.bands_storage(kpoints, energy, str(tmp_path),
+                                     np.float32)
+    stored_k, stored = modules.in_and_out.read_bands(str(tmp_path))
+    assert stored.dtype == np.float32
+    assert np.allclose(stored_k, kpoints, rtol=1e-6)
+    assert np.allclose(stored, energy, rtol=1e-6)